@@ -1,12 +1,18 @@
+import math
 import os
 import traceback
+from typing import Optional
 
 import mysql.connector
 import streamlit as st
 from dotenv import load_dotenv
 
+from bulk_sync import TAMANHO_BLOCO, aplicar_diferencas
 from capas import gerar_capas_automaticas
-from sync_livros import garantir_tabela, map_db_por_relativo, scan_pasta_livros
+from catalog_version import ler_versao
+from file_registry_sync import registrar_arquivos
+from migrations import aplicar_migracoes
+from sync_livros import calcular_diferencas, map_alias_por_relativo, map_db_por_relativo, scan_pasta_livros
 
 
 load_dotenv()
@@ -24,6 +30,9 @@ DEFAULT_DATABASE = os.getenv('DATABASE', '')
 DEFAULT_PASTA = os.getenv('PASTA_BIBLIOTECA', r'E:\BIBLIOTECA')
 DEFAULT_SUBPASTA = os.getenv('SUBPASTA_BIBLIOTECA', '')
 
+# Varreduras guardadas na sessao (pasta e banco), as mais antigas saem primeiro
+MAX_VARREDURAS_EM_CACHE = 4
+
 
 def abrir_conexao(cfg: dict):
     return mysql.connector.connect(
@@ -34,9 +43,28 @@ def abrir_conexao(cfg: dict):
     )
 
 
-def listar_subpastas_em_arvore(pasta_raiz: str) -> list[tuple[str, int]]:
+def mtime_pasta(caminho: str) -> int:
+    try:
+        return os.stat(caminho).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def versao_manifesto_pasta(pasta_raiz: str, subpasta_relativa: str = '') -> tuple:
+    """
+    Versao barata da pasta para a arvore de subpastas: mtime da raiz e da pasta do
+    escopo, mais um contador que o botao "Varrer a pasta de novo" incrementa
+    (mudancas em niveis mais fundos nao alteram o mtime da raiz).
+    """
+    escopo = os.path.join(pasta_raiz, subpasta_relativa) if subpasta_relativa else pasta_raiz
+    return (mtime_pasta(pasta_raiz), mtime_pasta(escopo), st.session_state.get('geracao_varredura', 0))
+
+
+@st.cache_data(ttl=600, max_entries=8, show_spinner=False)
+def listar_subpastas_em_arvore(pasta_raiz: str, versao: tuple = ()) -> list[tuple[str, int]]:
     """
     Retorna lista de (relativo, profundidade) para renderizar a arvore de pastas.
+    Fica em cache por (pasta_raiz, versao) para nao percorrer a arvore a cada rerun.
     """
     if not os.path.isdir(pasta_raiz):
         return []
@@ -52,6 +80,35 @@ def listar_subpastas_em_arvore(pasta_raiz: str) -> list[tuple[str, int]]:
     return saida
 
 
+def _em_cache(nome: str, chave: tuple, calcular):
+    cache = st.session_state.setdefault(nome, {})
+    if chave not in cache:
+        while len(cache) >= MAX_VARREDURAS_EM_CACHE:
+            cache.pop(next(iter(cache)))
+        cache[chave] = calcular()
+    return cache[chave]
+
+
+def varrer_pasta(cfg: dict, progresso=None, reaproveitar: bool = False) -> dict:
+    """
+    scan_pasta_livros do escopo. Por padrao sempre varre de novo (arquivos mudados em
+    subpastas nao alteram o mtime da raiz); `reaproveitar` usa a ultima varredura do
+    mesmo escopo, para aplicar o que acabou de ser analisado sem varrer outra vez.
+    """
+    pasta, sub = cfg['pasta_biblioteca'], cfg.get('subpasta_relativa', '')
+    chave = (pasta, sub)
+    if not reaproveitar:
+        st.session_state.get('cache_varredura_pasta', {}).pop(chave, None)
+    return _em_cache('cache_varredura_pasta', chave, lambda: scan_pasta_livros(pasta, subpasta_relativa=sub, progresso=progresso))
+
+
+def mapear_banco(cfg: dict, cursor, versao_catalogo: int) -> dict:
+    """map_db_por_relativo com cache por (banco, raiz, subpasta, versao do catalogo)."""
+    pasta, sub = cfg['pasta_biblioteca'], cfg.get('subpasta_relativa', '')
+    chave = (cfg['host'], cfg['database'], pasta, sub, versao_catalogo)
+    return _em_cache('cache_varredura_banco', chave, lambda: map_db_por_relativo(cursor, pasta, subpasta_relativa=sub))
+
+
 def label_arvore_ascii(rel: str, depth: int) -> str:
     nome = os.path.basename(rel)
     if depth <= 0:
@@ -59,24 +116,24 @@ def label_arvore_ascii(rel: str, depth: int) -> str:
     return f"{'|   ' * depth}|-- {nome}"
 
 
-def analisar(cfg: dict) -> dict:
+def analisar(cfg: dict, progresso=None, reaproveitar_varredura: bool = False) -> dict:
     if not os.path.isdir(cfg['pasta_biblioteca']):
         raise FileNotFoundError(f"Pasta nao encontrada: {cfg['pasta_biblioteca']}")
 
     conn = abrir_conexao(cfg)
+    aplicar_migracoes(conn, verbose=False)
     cursor = conn.cursor()
 
     try:
-        garantir_tabela(cursor)
-
-        fs_map = scan_pasta_livros(cfg['pasta_biblioteca'], subpasta_relativa=cfg.get('subpasta_relativa', ''))
-        db_map = map_db_por_relativo(cursor, cfg['pasta_biblioteca'], subpasta_relativa=cfg.get('subpasta_relativa', ''))
+        versao_catalogo = ler_versao(cursor)
+        fs_map = varrer_pasta(cfg, progresso=progresso, reaproveitar=reaproveitar_varredura)
+        db_map = mapear_banco(cfg, cursor, versao_catalogo)
+        alias_map = map_alias_por_relativo(cursor, cfg['pasta_biblioteca'], subpasta_relativa=cfg.get('subpasta_relativa', ''))
 
         fs_keys = set(fs_map.keys())
         db_keys = set(db_map.keys())
 
-        para_excluir_keys = sorted(db_keys - fs_keys)
-        para_inserir_keys = sorted(fs_keys - db_keys)
+        para_excluir_keys, para_inserir_keys = map(sorted, calcular_diferencas(fs_map, db_map, alias_map))
 
         para_excluir = [
             {
@@ -101,57 +158,81 @@ def analisar(cfg: dict) -> dict:
 
         return {
             'escopo': cfg.get('subpasta_relativa', '') or '(raiz completa)',
+            'pasta_biblioteca': cfg['pasta_biblioteca'],
+            'subpasta_relativa': cfg.get('subpasta_relativa', ''),
+            'versao_catalogo': versao_catalogo,
             'total_pasta': len(fs_keys),
             'total_banco': len(db_keys),
             'total_excluir': len(para_excluir),
             'total_inserir': len(para_inserir),
             'para_excluir': para_excluir,
             'para_inserir': para_inserir,
+            # Caminhos absolutos da varredura, para o registro de arquivos
+            'arquivos_pasta': [item[2] for item in fs_map.values()],
         }
     finally:
         cursor.close()
         conn.close()
 
 
-def executar_sincronizacao(cfg: dict, gerar_capas: bool = False) -> dict:
-    diagnostico = analisar(cfg)
+def diagnostico_vale_para(diagnostico: Optional[dict], cfg: dict) -> bool:
+    return bool(diagnostico) and (
+        diagnostico.get('pasta_biblioteca') == cfg['pasta_biblioteca']
+        and diagnostico.get('subpasta_relativa') == cfg.get('subpasta_relativa', '')
+    )
+
 
+def executar_sincronizacao(cfg: dict, diagnostico: Optional[dict] = None, gerar_capas: bool = False,
+                           progresso=None, progresso_aplicacao=None, tamanho_bloco: Optional[int] = None) -> tuple[dict, dict]:
+    """
+    Aplica o diagnostico ja calculado em "Analisar diferencas". So analisa de novo
+    se nao houver diagnostico para este escopo ou se o catalogo mudou desde entao
+    (nesse caso reaproveita a varredura da pasta feita na analise).
+    As alteracoes sao gravadas em blocos (bulk_sync), com commit por bloco.
+    Retorna (resultado, diagnostico apos a sincronizacao).
+    """
     conn = abrir_conexao(cfg)
     cursor = conn.cursor()
 
     try:
-        excluidos = 0
-        inseridos = 0
-
-        if diagnostico['para_excluir']:
-            ids = [(item['id'],) for item in diagnostico['para_excluir']]
-            cursor.executemany('DELETE FROM listaleitura WHERE livro_id = %s', ids)
-            cursor.executemany('DELETE FROM anotacoes WHERE livro_id = %s', ids)
-            cursor.executemany('DELETE FROM livros WHERE id = %s', ids)
-            excluidos = cursor.rowcount
-
-        if diagnostico['para_inserir']:
-            payload = [
-                (item['titulo'], item['area'], item['caminho'])
-                for item in diagnostico['para_inserir']
-            ]
-            cursor.executemany(
-                'INSERT INTO livros (titulo, area, caminho) VALUES (%s, %s, %s)',
-                payload,
-            )
-            inseridos = cursor.rowcount
+        if not diagnostico_vale_para(diagnostico, cfg) or ler_versao(cursor) != diagnostico['versao_catalogo']:
+            diagnostico = analisar(cfg, progresso=progresso, reaproveitar_varredura=True)
+            conn.rollback()  # encerra a transacao aberta pela leitura da versao
+
+        aplicacao = aplicar_diferencas(
+            conn,
+            [item['id'] for item in diagnostico['para_excluir']],
+            [(item['titulo'], item['area'], item['caminho']) for item in diagnostico['para_inserir']],
+            tamanho_bloco=tamanho_bloco,
+            progresso=progresso_aplicacao,
+        )
+
+        registrados = registrar_arquivos(cursor, diagnostico['arquivos_pasta'])
+        versao_catalogo = ler_versao(cursor)
 
         conn.commit()
 
+        depois_banco = diagnostico['total_banco'] - diagnostico['total_excluir'] + diagnostico['total_inserir']
         resultado = {
-            'excluidos': excluidos,
-            'inseridos': inseridos,
+            **aplicacao,
+            'arquivos_registrados': registrados,
             'antes_banco': diagnostico['total_banco'],
-            'depois_banco': diagnostico['total_banco'] - diagnostico['total_excluir'] + diagnostico['total_inserir'],
+            'depois_banco': depois_banco,
         }
         if gerar_capas:
             resultado['capas'] = gerar_capas_automaticas()
-        return resultado
+
+        # Banco e pasta agora batem: o novo diagnostico sai do anterior, sem varrer de novo
+        diagnostico_final = dict(
+            diagnostico,
+            total_banco=depois_banco,
+            total_excluir=0,
+            total_inserir=0,
+            para_excluir=[],
+            para_inserir=[],
+            versao_catalogo=versao_catalogo,
+        )
+        return resultado, diagnostico_final
     except Exception:
         conn.rollback()
         raise
@@ -182,7 +263,7 @@ with st.sidebar:
     st.subheader('Escopo de sincronizacao')
     st.caption('Use busca + selecao unica. Se nada for selecionado, usa a raiz completa.')
 
-    arvore = listar_subpastas_em_arvore(pasta_biblioteca)
+    arvore = listar_subpastas_em_arvore(pasta_biblioteca, versao_manifesto_pasta(pasta_biblioteca))
     if not arvore and not os.path.isdir(pasta_biblioteca):
         st.warning('PASTA_BIBLIOTECA nao encontrada.')
     elif not arvore:
@@ -218,6 +299,10 @@ with st.sidebar:
     if st.button('Limpar selecao (usar raiz)'):
         st.session_state['selected_subpasta'] = ''
 
+    if st.button('Varrer a pasta de novo', help='Atualiza a arvore de subpastas (use se criou ou removeu pastas)'):
+        st.session_state['geracao_varredura'] = st.session_state.get('geracao_varredura', 0) + 1
+        st.session_state.pop('cache_varredura_pasta', None)
+
 
 cfg = {
     'host': host,
@@ -229,12 +314,41 @@ cfg = {
 }
 
 
+def progresso_na_tela(aviso):
+    def progresso(pastas, arquivos, pasta_atual):
+        aviso.caption(f'Varrendo: {pastas} pastas, {arquivos} arquivos - {pasta_atual}')
+    return progresso
+
+
+def tabela_paginada(linhas: list[dict], chave: str):
+    """Mostra so uma pagina por vez (diffs com 100k linhas travariam o navegador)."""
+    c1, c2, c3 = st.columns([2, 1, 1])
+    filtro = c1.text_input('Filtrar por caminho', key=f'{chave}_filtro').strip().lower()
+    if filtro:
+        linhas = [linha for linha in linhas if filtro in linha['relativo'].lower()]
+    por_pagina = c2.selectbox('Linhas por pagina', (100, 250, 500, 1000), index=1, key=f'{chave}_por_pagina')
+    paginas = max(1, math.ceil(len(linhas) / por_pagina))
+    chave_pagina = f'{chave}_pagina'
+    if st.session_state.get(chave_pagina, 1) > paginas:
+        st.session_state[chave_pagina] = paginas
+    pagina = c3.number_input(f'Pagina (de {paginas})', min_value=1, max_value=paginas, value=1, step=1, key=chave_pagina)
+
+    inicio = (pagina - 1) * por_pagina
+    trecho = linhas[inicio:inicio + por_pagina]
+    st.dataframe(trecho, use_container_width=True, height=300)
+    if trecho:
+        st.caption(f'Linhas {inicio + 1}-{inicio + len(trecho)} de {len(linhas)}')
+
+
 col_a, col_b = st.columns([1, 1])
 
 with col_a:
     if st.button('Analisar diferencas', type='primary', use_container_width=True):
         try:
-            st.session_state['diagnostico'] = analisar(cfg)
+            aviso = st.empty()
+            with st.spinner('Analisando...'):
+                st.session_state['diagnostico'] = analisar(cfg, progresso=progresso_na_tela(aviso))
+            aviso.empty()
             st.session_state['cfg'] = cfg
             st.success('Analise concluida.')
         except Exception as exc:
@@ -244,12 +358,23 @@ with col_a:
 with col_b:
     confirm = st.checkbox('Confirmo que quero aplicar alteracoes no banco')
     gerar_capas_pos_sync = st.checkbox('Gerar capas ao final (somente livros sem capa)')
+    tamanho_bloco = st.number_input('Linhas por bloco (commit a cada bloco)', min_value=50, max_value=20000, value=TAMANHO_BLOCO, step=50)
     if st.button('Executar sincronizacao', use_container_width=True, disabled=not confirm):
         try:
-            resultado = executar_sincronizacao(cfg, gerar_capas=gerar_capas_pos_sync)
+            aviso = st.empty()
+            barra = st.progress(0.0)
+            with st.spinner('Sincronizando...'):
+                resultado, st.session_state['diagnostico'] = executar_sincronizacao(
+                    cfg,
+                    diagnostico=st.session_state.get('diagnostico'),
+                    gerar_capas=gerar_capas_pos_sync,
+                    progresso=progresso_na_tela(aviso),
+                    progresso_aplicacao=lambda feitos, total: barra.progress(feitos / total, text=f'{feitos} de {total} linhas'),
+                    tamanho_bloco=int(tamanho_bloco),
+                )
+            aviso.empty()
             st.success('Sincronizacao executada com sucesso.')
             st.json(resultado)
-            st.session_state['diagnostico'] = analisar(cfg)
             st.session_state['cfg'] = cfg
         except Exception as exc:
             st.error(f'Falha na sincronizacao: {exc}')
@@ -268,13 +393,13 @@ if diagnostico:
 
     st.subheader('Arquivos para inserir')
     if diagnostico['para_inserir']:
-        st.dataframe(diagnostico['para_inserir'], use_container_width=True, height=300)
+        tabela_paginada(diagnostico['para_inserir'], 'inserir')
     else:
         st.info('Nenhum arquivo novo para inserir.')
 
     st.subheader('Registros para excluir')
     if diagnostico['para_excluir']:
-        st.dataframe(diagnostico['para_excluir'], use_container_width=True, height=300)
+        tabela_paginada(diagnostico['para_excluir'], 'excluir')
     else:
         st.info('Nenhum registro para excluir.')
 else:
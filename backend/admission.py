@@ -0,0 +1,207 @@
+"""
+Controle de admissao por classe de endpoint (middleware ASGI).
+
+Rotas caras (traducao, download de PDF, busca no texto, importacoes de admin) tem
+um limite de execucoes simultaneas e uma fila curta, atendida em rodizio entre
+usuarios para que um leitor com muitas requisicoes nao bloqueie os outros.
+Sem vaga: 429 (usuario ja tem requisicoes demais na fila) ou 503 (fila cheia
+ou espera esgotada), sempre com Retry-After. Rotas baratas nao passam por aqui.
+
+Cada classe pode ser ajustada por env: ADMISSION_<CLASSE>_LIMITE, _FILA,
+_POR_USUARIO, _ESPERA e _RETRY_AFTER (ex.: ADMISSION_TRADUCAO_LIMITE=8).
+"""
+
+import asyncio
+import json
+import os
+import re
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+from jose import jwt
+
+# nome -> (metodos, regex do caminho, limite, fila, por_usuario, espera_s, retry_after_s)
+CLASSES_PADRAO = {
+    "traducao": ({"POST"}, r"^/documents/\d+/page/\d+/translate(/stream)?$", 4, 32, 2, 20.0, 5),
+    "arquivo": ({"GET"}, r"^/documents/\d+/file$", 8, 64, 4, 10.0, 2),
+    "busca": ({"GET"}, r"^/(documents/\d+/search|search/content)$", 4, 32, 2, 10.0, 3),
+    "admin": ({"POST", "PUT"}, r"^/(documents/import|documents/batch-update)$", 1, 2, 1, 5.0, 30),
+}
+
+
+class Rejeitado(Exception):
+    def __init__(self, status: int, retry_after: int, detalhe: str):
+        self.status = status
+        self.retry_after = retry_after
+        self.detalhe = detalhe
+
+
+class FilaJusta:
+    """
+    Semaforo com fila por usuario atendida em rodizio. Roda dentro de um unico
+    event loop (um por worker), entao dispensa travas.
+    """
+
+    def __init__(self, nome: str, limite: int, max_fila: int, max_por_usuario: int, espera: float, retry_after: int):
+        self.nome = nome
+        self.limite = limite
+        self.max_fila = max_fila
+        self.max_por_usuario = max_por_usuario
+        self.espera = espera
+        self.retry_after = retry_after
+        self.ativos = 0
+        self.na_fila = 0
+        self._filas: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self.metricas = {"admitidas": 0, "enfileiradas": 0, "rejeitadas_429": 0, "rejeitadas_503": 0}
+
+    async def entrar(self, usuario: str):
+        if self.ativos < self.limite and self.na_fila == 0:
+            self.ativos += 1
+            self.metricas["admitidas"] += 1
+            return
+
+        if self.na_fila >= self.max_fila:
+            self.metricas["rejeitadas_503"] += 1
+            raise Rejeitado(503, self.retry_after, "Servidor ocupado, tente novamente em instantes")
+        fila = self._filas.setdefault(usuario, deque())
+        if len(fila) >= self.max_por_usuario:
+            self.metricas["rejeitadas_429"] += 1
+            raise Rejeitado(429, self.retry_after, "Muitas requisições simultâneas")
+
+        futuro = asyncio.get_running_loop().create_future()
+        fila.append(futuro)
+        self.na_fila += 1
+        self.metricas["enfileiradas"] += 1
+        try:
+            await asyncio.wait_for(futuro, self.espera)
+        except BaseException as e:
+            if futuro.done() and not futuro.cancelled():
+                # A vaga chegou junto com o cancelamento (cliente desconectou): devolve
+                self.sair()
+            else:
+                self._retirar(usuario, futuro)
+            if isinstance(e, asyncio.TimeoutError):
+                self.metricas["rejeitadas_503"] += 1
+                raise Rejeitado(503, self.retry_after, "Tempo de espera esgotado, tente novamente")
+            raise
+        self.metricas["admitidas"] += 1
+
+    def _retirar(self, usuario: str, futuro: asyncio.Future):
+        fila = self._filas.get(usuario)
+        if fila is None or futuro not in fila:
+            return
+        fila.remove(futuro)
+        self.na_fila -= 1
+        if not fila:
+            del self._filas[usuario]
+
+    def sair(self):
+        self.ativos -= 1
+        while self.ativos < self.limite and self._filas:
+            # Rodizio: o primeiro usuario da vez e atendido e vai para o fim
+            usuario, fila = self._filas.popitem(last=False)
+            futuro = fila.popleft()
+            self.na_fila -= 1
+            if fila:
+                self._filas[usuario] = fila
+            if futuro.done():
+                continue
+            self.ativos += 1
+            futuro.set_result(True)
+
+    def estado(self) -> dict:
+        return {"limite": self.limite, "ativos": self.ativos, "na_fila": self.na_fila, **self.metricas}
+
+
+@dataclass
+class ClasseEndpoint:
+    nome: str
+    metodos: set
+    caminho: "re.Pattern"
+    fila: FilaJusta
+
+
+def carregar_classes() -> List[ClasseEndpoint]:
+    classes = []
+    for nome, (metodos, padrao, limite, fila, por_usuario, espera, retry_after) in CLASSES_PADRAO.items():
+        prefixo = f"ADMISSION_{nome.upper()}_"
+        classes.append(ClasseEndpoint(
+            nome=nome,
+            metodos=metodos,
+            caminho=re.compile(padrao),
+            fila=FilaJusta(
+                nome,
+                limite=int(os.getenv(prefixo + "LIMITE", limite)),
+                max_fila=int(os.getenv(prefixo + "FILA", fila)),
+                max_por_usuario=int(os.getenv(prefixo + "POR_USUARIO", por_usuario)),
+                espera=float(os.getenv(prefixo + "ESPERA", espera)),
+                retry_after=int(os.getenv(prefixo + "RETRY_AFTER", retry_after)),
+            ),
+        ))
+    return classes
+
+
+def identificar_usuario(scope) -> str:
+    """Chave de justica: `sub` do token (sem validar; a rota valida) ou o IP do cliente."""
+    for nome, valor in scope.get("headers", []):
+        if nome == b"authorization":
+            partes = valor.decode("latin-1").split(" ", 1)
+            if len(partes) == 2 and partes[0].lower() == "bearer":
+                try:
+                    sub = jwt.get_unverified_claims(partes[1]).get("sub")
+                    if sub:
+                        return f"u:{sub}"
+                except Exception:
+                    pass
+            break
+    cliente: Optional[Tuple[str, int]] = scope.get("client")
+    return f"ip:{cliente[0]}" if cliente else "anonimo"
+
+
+_classes_ativas: List[ClasseEndpoint] = []
+
+
+def estado_admissao() -> Dict[str, dict]:
+    return {classe.nome: classe.fila.estado() for classe in _classes_ativas}
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, classes: Optional[List[ClasseEndpoint]] = None):
+        self.app = app
+        self.classes = classes if classes is not None else carregar_classes()
+        _classes_ativas[:] = self.classes
+
+    def _classificar(self, scope) -> Optional[ClasseEndpoint]:
+        for classe in self.classes:
+            if scope["method"] in classe.metodos and classe.caminho.match(scope["path"]):
+                return classe
+        return None
+
+    async def __call__(self, scope, receive, send):
+        classe = self._classificar(scope) if scope["type"] == "http" else None
+        if classe is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await classe.fila.entrar(identificar_usuario(scope))
+        except Rejeitado as r:
+            corpo = json.dumps({"detail": r.detalhe}, ensure_ascii=False).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": r.status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(corpo)).encode()),
+                    (b"retry-after", str(r.retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": corpo})
+            return
+
+        # A vaga fica ocupada ate o fim da resposta (inclusive streaming)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            classe.fila.sair()
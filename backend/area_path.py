@@ -0,0 +1,24 @@
+"""
+Area do livro como caminho hierarquico ("Direito / Penal / Processo").
+
+Um unico jeito de quebrar a area em niveis, usado pela arvore de areas, pelas
+facetas do catalogo e pelos livros semelhantes: separa em "/" com ou sem espacos
+em volta ("A/B", "A / B" e "A /B" sao a mesma area). Sem dependencias, para ser
+importado tambem pelos scripts.
+"""
+
+from typing import List, Optional
+
+SEPARADOR_AREA = " / "
+
+
+def partes_area(area: Optional[str]) -> List[str]:
+    """'Direito / Penal / Processo' -> ['Direito', 'Penal', 'Processo']"""
+    if not area:
+        return []
+    return [parte.strip() for parte in area.split("/") if parte.strip()]
+
+
+def juntar_area(partes: List[str]) -> str:
+    """Forma canonica da area (niveis separados por SEPARADOR_AREA)."""
+    return SEPARADOR_AREA.join(partes)
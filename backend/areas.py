@@ -0,0 +1,120 @@
+import threading
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from area_path import SEPARADOR_AREA, juntar_area, partes_area
+from catalog import get_catalog_version
+from models import Livro
+
+
+class NoArea:
+    __slots__ = ("nome", "caminho", "total", "direto", "filhos")
+
+    def __init__(self, nome: str, caminho: str):
+        self.nome = nome
+        self.caminho = caminho
+        self.total = 0   # livros nesta pasta e em todas as subpastas
+        self.direto = 0  # livros diretamente nesta pasta
+        self.filhos: Dict[str, "NoArea"] = {}
+
+    def to_dict(self, profundidade: int) -> dict:
+        dados = {
+            "nome": self.nome,
+            "caminho": self.caminho,
+            "total": self.total,
+            "direto": self.direto,
+            "tem_filhos": bool(self.filhos),
+        }
+        if profundidade > 0:
+            dados["filhos"] = [
+                filho.to_dict(profundidade - 1)
+                for filho in sorted(self.filhos.values(), key=lambda no: no.nome.lower())
+            ]
+        return dados
+
+
+class AreaTree:
+    """
+    Trie de areas com contagem de livros por no.
+    Mantem as contagens por area exata para aplicar apenas a diferenca entre versoes.
+    """
+
+    def __init__(self):
+        self.raiz = NoArea("", "")
+        self.contagens: Dict[str, int] = {}
+        self.versao: Optional[int] = None
+
+    def _ajustar(self, partes: list, delta: int):
+        no = self.raiz
+        no.total += delta
+        caminho = []
+        for parte in partes:
+            caminho.append(parte)
+            filho = no.filhos.get(parte)
+            if filho is None:
+                filho = NoArea(parte, SEPARADOR_AREA.join(caminho))
+                no.filhos[parte] = filho
+            filho.total += delta
+            if filho.total <= 0:
+                # Subarvore inteira ficou vazia
+                del no.filhos[parte]
+                return
+            no = filho
+        no.direto += delta
+
+    def aplicar_contagens(self, novas: Dict[str, int]) -> int:
+        """Aplica apenas as areas cuja contagem mudou. Retorna quantas areas foram tocadas."""
+        alteradas = 0
+        for area in set(self.contagens) | set(novas):
+            delta = novas.get(area, 0) - self.contagens.get(area, 0)
+            if delta:
+                self._ajustar(partes_area(area), delta)
+                alteradas += 1
+        self.contagens = novas
+        return alteradas
+
+    def localizar(self, caminho: Optional[str]) -> Optional[NoArea]:
+        no = self.raiz
+        for parte in partes_area(caminho):
+            no = no.filhos.get(parte)
+            if no is None:
+                return None
+        return no
+
+
+_arvore_lock = threading.Lock()
+_arvore = AreaTree()
+
+
+def _contagens_por_area(session: Session) -> Dict[str, int]:
+    contagens: Dict[str, int] = {}
+    for area, total in session.exec(select(Livro.area, func.count()).group_by(Livro.area)).all():
+        # Normaliza variacoes de espacos para que chaves equivalentes somem juntas
+        chave = juntar_area(partes_area(area))
+        contagens[chave] = contagens.get(chave, 0) + total
+    return contagens
+
+
+def get_area_tree(session: Session) -> AreaTree:
+    """Arvore de areas da versao atual do catalogo (atualizada incrementalmente)."""
+    versao = get_catalog_version(session)
+    if _arvore.versao == versao:
+        return _arvore
+
+    with _arvore_lock:
+        if _arvore.versao != versao:
+            _arvore.aplicar_contagens(_contagens_por_area(session))
+            _arvore.versao = versao
+    return _arvore
+
+
+def get_area_subtree(session: Session, caminho: Optional[str] = None, profundidade: int = 1) -> dict:
+    arvore = get_area_tree(session)
+    with _arvore_lock:
+        no = arvore.localizar(caminho)
+        if no is None:
+            raise HTTPException(status_code=404, detail="Área não encontrada")
+        return {"versao": arvore.versao, **no.to_dict(profundidade)}
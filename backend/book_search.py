@@ -0,0 +1,171 @@
+import bisect
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from services import PDFService
+
+# Texto extraido fica em disco por impressao digital do arquivo (caminho+tamanho+mtime)
+CACHE_DIR = os.getenv("BOOK_TEXT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "textos"))
+MAX_INDICES_EM_MEMORIA = int(os.getenv("BOOK_SEARCH_MAX_INDICES", "32"))
+TAMANHO_SNIPPET = 160
+
+RE_TOKEN = re.compile(r"\w+")
+
+
+def impressao_digital(file_path: str) -> str:
+    st = os.stat(file_path)
+    base = f"{os.path.abspath(file_path)}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(base.encode("utf-8")).hexdigest()
+
+
+def normalizar(texto: str) -> str:
+    """
+    Minusculas e sem acentos, mantendo o mesmo tamanho do texto original
+    (cada caractere vira exatamente um), para que os offsets continuem valendo.
+    """
+    saida = []
+    for c in texto:
+        decomposto = unicodedata.normalize("NFKD", c)
+        base = next((d for d in decomposto if not unicodedata.combining(d)), c)
+        saida.append(base.lower() if len(base.lower()) == 1 else c)
+    return "".join(saida)
+
+
+def tokenizar(texto: str) -> Iterator[Tuple[str, int, int]]:
+    """(termo_normalizado, inicio, fim) com offsets no texto original."""
+    for m in RE_TOKEN.finditer(normalizar(texto)):
+        yield m.group(0), m.start(), m.end()
+
+
+def _caminho_cache(digital: str) -> str:
+    return os.path.join(CACHE_DIR, digital[:2], f"{digital}.json.gz")
+
+
+def textos_em_cache(file_path: str) -> Optional[List[str]]:
+    """Texto ja extraido por carregar_textos, sem extrair: None se o arquivo ainda nao passou por la."""
+    try:
+        with gzip.open(_caminho_cache(impressao_digital(file_path)), "rt", encoding="utf-8") as f:
+            return json.load(f)["paginas"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def carregar_textos(pdf_service: PDFService, file_path: str, digital: Optional[str] = None) -> List[str]:
+    """Texto de todas as paginas, extraido uma unica vez por versao do arquivo."""
+    digital = digital or impressao_digital(file_path)
+    caminho = _caminho_cache(digital)
+    try:
+        with gzip.open(caminho, "rt", encoding="utf-8") as f:
+            return json.load(f)["paginas"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    paginas = pdf_service.extract_all_text(file_path)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with gzip.open(temporario, "wt", encoding="utf-8") as f:
+        json.dump({"arquivo": os.path.basename(file_path), "paginas": paginas}, f, ensure_ascii=False)
+    os.replace(temporario, caminho)
+    return paginas
+
+
+class IndiceLivro:
+    """Indice posicional de um livro: termo -> [(pagina, inicio, fim), ...]."""
+
+    def __init__(self, paginas: List[str]):
+        self.paginas = paginas
+        self.postings: Dict[str, List[Tuple[int, int, int]]] = {}
+        for numero, texto in enumerate(paginas, start=1):
+            for termo, inicio, fim in tokenizar(texto):
+                self.postings.setdefault(termo, []).append((numero, inicio, fim))
+        self.vocabulario = sorted(self.postings)
+
+    def _ocorrencias(self, termo: str, prefixo: bool) -> List[Tuple[int, int, int]]:
+        if not prefixo:
+            return self.postings.get(termo, [])
+        encontrados = []
+        i = bisect.bisect_left(self.vocabulario, termo)
+        while i < len(self.vocabulario) and self.vocabulario[i].startswith(termo):
+            encontrados.extend(self.postings[self.vocabulario[i]])
+            i += 1
+        return encontrados
+
+    def buscar(self, q: str, limite: int = 50) -> dict:
+        termos = [termo for termo, _, _ in tokenizar(q)]
+        if not termos:
+            return {"total_paginas": 0, "resultados": []}
+
+        # Termos com 3+ letras casam por prefixo (busca enquanto digita)
+        por_pagina: Dict[int, list] = {}
+        paginas_validas = None
+        for termo in termos:
+            ocorrencias = self._ocorrencias(termo, prefixo=len(termo) >= 3)
+            paginas_termo = {pagina for pagina, _, _ in ocorrencias}
+            paginas_validas = paginas_termo if paginas_validas is None else paginas_validas & paginas_termo
+            for pagina, inicio, fim in ocorrencias:
+                por_pagina.setdefault(pagina, []).append((inicio, fim))
+
+        resultados = []
+        for pagina in sorted(paginas_validas or []):
+            ocorrencias = sorted(por_pagina[pagina])
+            resultados.append({
+                "pagina": pagina,
+                "total": len(ocorrencias),
+                "ocorrencias": [[inicio, fim] for inicio, fim in ocorrencias],
+                **self._snippet(self.paginas[pagina - 1], ocorrencias),
+            })
+
+        return {"total_paginas": len(resultados), "resultados": resultados[:limite]}
+
+    @staticmethod
+    def _snippet(texto: str, ocorrencias: list) -> dict:
+        primeiro_inicio, primeiro_fim = ocorrencias[0]
+        inicio = max(0, primeiro_inicio - TAMANHO_SNIPPET // 2)
+        fim = min(len(texto), inicio + TAMANHO_SNIPPET)
+        trecho = texto[inicio:fim].replace("\n", " ")
+        prefixo = "…" if inicio > 0 else ""
+        return {
+            "snippet": prefixo + trecho + ("…" if fim < len(texto) else ""),
+            # Offsets dos termos encontrados dentro de `snippet`
+            "destaques": [
+                [a - inicio + len(prefixo), b - inicio + len(prefixo)]
+                for a, b in ocorrencias
+                if a >= inicio and b <= fim
+            ],
+        }
+
+
+_indices_lock = threading.Lock()
+_indices: "OrderedDict[str, IndiceLivro]" = OrderedDict()
+_construindo: Dict[str, threading.Lock] = {}
+
+
+def get_indice_livro(pdf_service: PDFService, file_path: str) -> IndiceLivro:
+    """Indice em memoria (LRU); na falta, monta a partir do texto em cache ou do PDF."""
+    digital = impressao_digital(file_path)
+    with _indices_lock:
+        indice = _indices.get(digital)
+        if indice is not None:
+            _indices.move_to_end(digital)
+            return indice
+        trava = _construindo.setdefault(digital, threading.Lock())
+
+    # Um unico build por arquivo, mesmo com buscas simultaneas
+    with trava:
+        with _indices_lock:
+            if digital in _indices:
+                return _indices[digital]
+        indice = IndiceLivro(carregar_textos(pdf_service, file_path, digital))
+        with _indices_lock:
+            _indices[digital] = indice
+            while len(_indices) > MAX_INDICES_EM_MEMORIA:
+                _indices.popitem(last=False)
+            _construindo.pop(digital, None)
+    return indice
@@ -0,0 +1,98 @@
+"""
+Aplicacao em massa das diferencas pasta x banco (usada por sync_livros e admin_livros).
+
+- Exclusoes com `DELETE ... WHERE id IN (...)` em blocos. listaleitura, anotacoes e
+  livros_arquivos saem junto por ON DELETE CASCADE (migracoes 003 e 005).
+- Insercoes com um INSERT de varias linhas (`VALUES (...), (...), ...`) por bloco.
+- Commit a cada bloco (com a versao do catalogo incrementada na mesma transacao),
+  para nao segurar locks em `livros` durante a sincronizacao inteira. Se falhar no
+  meio, os blocos anteriores ficam gravados; rodar a sincronizacao de novo aplica o
+  restante, porque a diferenca e recalculada.
+
+Tamanho do bloco: SYNC_TAMANHO_BLOCO (padrao 1000 linhas).
+"""
+
+import os
+import time
+from typing import Optional
+
+from catalog_version import incrementar_versao
+
+TAMANHO_BLOCO = int(os.getenv('SYNC_TAMANHO_BLOCO', '1000'))
+
+
+def _blocos(itens: list, tamanho: int):
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+
+def _placeholders(quantidade: int, colunas: int = 1) -> str:
+    linha = '%s' if colunas == 1 else '(' + ', '.join(['%s'] * colunas) + ')'
+    return ', '.join([linha] * quantidade)
+
+
+def excluir_livros(conn, cursor, ids: list, tamanho_bloco: int, progresso=None) -> int:
+    excluidos = 0
+    for bloco in _blocos(list(ids), tamanho_bloco):
+        cursor.execute(f'DELETE FROM livros WHERE id IN ({_placeholders(len(bloco))})', tuple(bloco))
+        excluidos += cursor.rowcount
+        incrementar_versao(cursor)
+        conn.commit()
+        if progresso:
+            progresso(len(bloco))
+    return excluidos
+
+
+def inserir_livros(conn, cursor, registros: list, tamanho_bloco: int, progresso=None) -> int:
+    """`registros`: tuplas (titulo, area, caminho)."""
+    inseridos = 0
+    for bloco in _blocos(list(registros), tamanho_bloco):
+        valores = [valor for registro in bloco for valor in registro]
+        cursor.execute(
+            f'INSERT INTO livros (titulo, area, caminho) VALUES {_placeholders(len(bloco), 3)}',
+            tuple(valores),
+        )
+        inseridos += cursor.rowcount
+        incrementar_versao(cursor)
+        conn.commit()
+        if progresso:
+            progresso(len(bloco))
+    return inseridos
+
+
+def aplicar_diferencas(conn, ids_para_excluir: list, registros_para_inserir: list, tamanho_bloco: Optional[int] = None, progresso=None) -> dict:
+    """
+    Exclui e insere em blocos, com commit por bloco. `progresso(feitos, total)` e
+    chamado apos cada bloco. Retorna contagens, tempo e linhas por segundo.
+    """
+    tamanho_bloco = max(1, tamanho_bloco or TAMANHO_BLOCO)
+    total = len(ids_para_excluir) + len(registros_para_inserir)
+    feitos = 0
+
+    def avancar(linhas: int):
+        nonlocal feitos
+        feitos += linhas
+        if progresso:
+            progresso(feitos, total)
+
+    cursor = conn.cursor()
+    inicio = time.perf_counter()
+    try:
+        excluidos = excluir_livros(conn, cursor, ids_para_excluir, tamanho_bloco, avancar)
+        inseridos = inserir_livros(conn, cursor, registros_para_inserir, tamanho_bloco, avancar)
+    except Exception:
+        # So o bloco em andamento e desfeito; os anteriores ja foram gravados
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    segundos = time.perf_counter() - inicio
+    return {
+        'excluidos': excluidos,
+        'inseridos': inseridos,
+        'tamanho_bloco': tamanho_bloco,
+        'blocos': -(-len(ids_para_excluir) // tamanho_bloco) + -(-len(registros_para_inserir) // tamanho_bloco),
+        'segundos': round(segundos, 3),
+        'linhas_por_segundo': round((excluidos + inseridos) / segundos, 1) if segundos > 0 else None,
+    }
@@ -1,29 +1,41 @@
+import hashlib
 import os
-from typing import Optional
+from typing import Callable, Optional
 
 import fitz  # PyMuPDF
 from dotenv import load_dotenv
+from sqlalchemy import delete, update
 from sqlmodel import Session, select
 
-from database import engine
-from models import Livro
+from catalog import bump_catalog_version
+from database import engine, upsert
+from lqip import blurhash_da_imagem
+from models import Capa, Livro
 
 
 load_dotenv()
 
 
-def gerar_capas_automaticas(base_pdf_path: Optional[str] = None, commit_lote: int = 200):
+def gerar_capas_automaticas(
+    base_pdf_path: Optional[str] = None,
+    commit_lote: int = 200,
+    progresso: Optional[Callable[[int, int], None]] = None,
+):
     """
     Gera capas para livros sem capa.
     - Usa PDF_SOURCE_DIR do .env como fallback para caminhos relativos.
     - Realiza commit em lote para reduzir overhead.
+    - Imagens vao para a tabela `capas` (chave = SHA-256); o livro guarda apenas o hash
+      e o placeholder (BlurHash) que vai na listagem do catalogo.
+    - Livros com capa mas sem placeholder (capas antigas) sao completados no final.
+    - `progresso(feitos, total)` e chamado a cada commit (usado pelos jobs).
     """
     base_path = base_pdf_path or os.getenv("PDF_SOURCE_DIR", "")
     if base_path:
         base_path = os.path.normpath(base_path)
 
     with Session(engine) as session:
-        statement = select(Livro).where(Livro.caminho != None, Livro.capa == None)
+        statement = select(Livro.id, Livro.titulo, Livro.caminho).where(Livro.caminho != None, Livro.capa_hash == None)
         livros = session.exec(statement).all()
 
         print(f"Processando {len(livros)} livros sem capa...")
@@ -65,30 +77,84 @@ def gerar_capas_automaticas(base_pdf_path: Optional[str] = None, commit_lote: in
                 img_bytes = pix.tobytes("jpg")
                 doc.close()
 
-                livro.capa = img_bytes
-                session.add(livro)
+                capa_hash = hashlib.sha256(img_bytes).hexdigest()
+                # Mesma imagem (ex.: PDFs duplicados) reaproveita a linha existente
+                upsert(
+                    session, Capa,
+                    {"hash": capa_hash, "dados": img_bytes, "tamanho": len(img_bytes)},
+                    chaves=("hash",),
+                    atualizar=("hash",),
+                )
+                session.execute(
+                    update(Livro).where(Livro.id == livro.id)
+                    .values(capa_hash=capa_hash, capa_blurhash=blurhash_da_imagem(img_bytes))
+                )
                 geradas += 1
                 pendentes_commit += 1
 
                 if pendentes_commit >= commit_lote:
+                    # O placeholder aparece no snapshot do catalogo
+                    bump_catalog_version(session)
                     session.commit()
                     pendentes_commit = 0
+                    if progresso:
+                        progresso(geradas + ignorados + erros, len(livros))
             except Exception as e:
                 print(f"Erro ao processar {livro.titulo}: {e}")
                 erros += 1
 
         if pendentes_commit > 0:
+            bump_catalog_version(session)
             session.commit()
 
+        placeholders = preencher_placeholders(session, commit_lote)
+        orfas = limpar_capas_orfas(session)
+
         resumo = {
             "total_sem_capa": len(livros),
             "geradas": geradas,
             "ignorados": ignorados,
             "erros": erros,
+            "placeholders_preenchidos": placeholders,
+            "orfas_removidas": orfas,
         }
         print(f"Resumo capas: {resumo}")
         return resumo
 
 
+def preencher_placeholders(session: Session, commit_lote: int = 200) -> int:
+    """
+    Gera o BlurHash das capas ja existentes que ainda nao tem (por hash: capas
+    repetidas sao decodificadas uma vez so). Le as imagens em lotes para nao
+    carregar todos os BLOBs de uma vez. Falha de decodificacao grava "" para nao
+    tentar de novo a cada execucao.
+    """
+    hashes = session.exec(
+        select(Livro.capa_hash).where(Livro.capa_hash != None, Livro.capa_blurhash == None).distinct()
+    ).all()
+    preenchidos = 0
+    for inicio in range(0, len(hashes), commit_lote):
+        lote = hashes[inicio:inicio + commit_lote]
+        for capa_hash, dados in session.exec(select(Capa.hash, Capa.dados).where(Capa.hash.in_(lote))).all():
+            resultado = session.execute(
+                update(Livro).where(Livro.capa_hash == capa_hash, Livro.capa_blurhash == None)
+                .values(capa_blurhash=blurhash_da_imagem(dados) or "")
+            )
+            preenchidos += resultado.rowcount or 0
+        bump_catalog_version(session)
+        session.commit()
+    if hashes:
+        print(f"Placeholders de capa preenchidos: {preenchidos}")
+    return preenchidos
+
+
+def limpar_capas_orfas(session: Session) -> int:
+    """Remove capas que nenhum livro referencia mais (ex.: apos exclusoes no sync)."""
+    em_uso = select(Livro.capa_hash).where(Livro.capa_hash != None)
+    resultado = session.execute(delete(Capa).where(Capa.hash.not_in(em_uso)))
+    session.commit()
+    return resultado.rowcount or 0
+
+
 if __name__ == "__main__":
     gerar_capas_automaticas()
@@ -0,0 +1,216 @@
+import gzip
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import func, or_, text
+from sqlmodel import Session, select
+
+from area_path import partes_area
+from catalog_version import SQL_INCREMENTAR_VERSAO, SQL_LER_VERSAO
+from models import Livro, LivroRead
+
+try:
+    import brotli
+except ImportError:  # brotli e opcional; sem ele servimos gzip/identity
+    brotli = None
+
+# Tempo (s) em que a versao lida do banco e considerada fresca neste worker.
+# Escritas feitas pelo proprio worker invalidam imediatamente.
+VERSAO_TTL = float(os.getenv("CATALOGO_VERSAO_TTL", "2"))
+
+_versao_lock = threading.Lock()
+_versao_cache = {"valor": None, "lido_em": 0.0}
+
+
+def get_catalog_version(session: Session) -> int:
+    """Versao atual do catalogo, consultando o banco no maximo a cada VERSAO_TTL segundos."""
+    agora = time.monotonic()
+    with _versao_lock:
+        if _versao_cache["valor"] is not None and agora - _versao_cache["lido_em"] < VERSAO_TTL:
+            return _versao_cache["valor"]
+
+    row = session.execute(text(SQL_LER_VERSAO)).first()
+    valor = int(row[0]) if row else 0
+    with _versao_lock:
+        _versao_cache["valor"] = valor
+        _versao_cache["lido_em"] = agora
+    return valor
+
+
+def bump_catalog_version(session: Session):
+    """
+    Incrementa a versao do catalogo na transacao corrente.
+    Chamar antes do commit de qualquer escrita que altere dados listados em /documents.
+    """
+    session.execute(text(SQL_INCREMENTAR_VERSAO))
+    invalidate_catalog_version()
+
+
+def invalidate_catalog_version():
+    with _versao_lock:
+        _versao_cache["valor"] = None
+
+
+class CatalogSnapshot:
+    """Catalogo serializado (e pre-comprimido) para uma versao especifica."""
+
+    def __init__(self, versao: int, corpo: bytes):
+        self.versao = versao
+        self.etag = f'"catalogo-{versao}"'
+        self.corpos = {"identity": corpo, "gzip": gzip.compress(corpo, compresslevel=6)}
+        if brotli is not None:
+            self.corpos["br"] = brotli.compress(corpo, quality=5)
+
+    def _escolher_encoding(self, accept_encoding: str) -> str:
+        aceitos = {parte.split(";")[0].strip().lower() for parte in accept_encoding.split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in aceitos and encoding in self.corpos:
+                return encoding
+        return "identity"
+
+    def response(self, request: Request) -> Response:
+        encoding = self._escolher_encoding(request.headers.get("accept-encoding", ""))
+        # Um ETag forte por representacao (os corpos comprimidos sao outros bytes)
+        etag = self.etag if encoding == "identity" else f'{self.etag[:-1]}-{encoding}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=self.corpos[encoding], media_type="application/json", headers=headers)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidatos = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidatos
+
+
+def _serializar_catalogo(session: Session) -> bytes:
+    # Seleciona apenas as colunas expostas (evita trazer a capa junto)
+    colunas = [getattr(Livro, campo) for campo in LivroRead.model_fields]
+    rows = session.execute(select(*colunas).order_by(Livro.id)).all()
+    campos = list(LivroRead.model_fields)
+    livros = [dict(zip(campos, row)) for row in rows]
+    return json.dumps(livros, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+_snapshot_lock = threading.Lock()
+_snapshot: Optional[CatalogSnapshot] = None
+
+
+def get_catalog_snapshot(session: Session) -> CatalogSnapshot:
+    """Retorna o snapshot da versao atual, reconstruindo apenas quando a versao muda."""
+    global _snapshot
+    versao = get_catalog_version(session)
+    atual = _snapshot
+    if atual is not None and atual.versao == versao:
+        return atual
+
+    with _snapshot_lock:
+        # Outra thread pode ter reconstruido enquanto esperavamos o lock
+        if _snapshot is not None and _snapshot.versao == versao:
+            return _snapshot
+        _snapshot = CatalogSnapshot(versao, _serializar_catalogo(session))
+        return _snapshot
+
+
+# --- FACETAS ---
+
+FACETAS_CACHE_MAX = int(os.getenv("FACETAS_CACHE_MAX", "256"))
+
+_facetas_lock = threading.Lock()
+_facetas_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+
+
+def _filtros_livro(q=None, genero=None, idioma=None, area=None, decada=None, ignorar=None) -> list:
+    """Monta as condicoes WHERE; `ignorar` omite o filtro da propria faceta."""
+    condicoes = []
+    if q and q.strip():
+        termo = f"%{q.strip()}%"
+        condicoes.append(or_(Livro.titulo.like(termo), Livro.autor.like(termo)))
+    if genero and ignorar != "genero":
+        condicoes.append(Livro.genero == genero)
+    if idioma and ignorar != "idioma":
+        condicoes.append(Livro.idioma == idioma)
+    if area and ignorar != "area":
+        # Subareas com qualquer espacamento em volta da "/" (mesma regra de partes_area)
+        condicoes.append(or_(Livro.area == area, Livro.area.like(f"{area}/%"), Livro.area.like(f"{area} /%")))
+    if decada is not None and ignorar != "ano":
+        condicoes.append(Livro.ano.between(decada, decada + 9))
+    return condicoes
+
+
+def _contar_por(session: Session, coluna, condicoes: list) -> list:
+    stmt = select(coluna, func.count()).where(coluna.is_not(None), *condicoes).group_by(coluna)
+    return session.execute(stmt).all()
+
+
+def _ordenar(contagens: dict) -> list:
+    return [
+        {"valor": valor, "total": total}
+        for valor, total in sorted(contagens.items(), key=lambda item: (-item[1], str(item[0])))
+    ]
+
+
+def _calcular_facetas(session: Session, filtros: dict) -> dict:
+    genero = {valor: total for valor, total in _contar_por(session, Livro.genero, _filtros_livro(**filtros, ignorar="genero")) if valor}
+    idioma = {valor: total for valor, total in _contar_por(session, Livro.idioma, _filtros_livro(**filtros, ignorar="idioma")) if valor}
+
+    # ano e area sao agrupados pelo valor exato (poucos distintos) e consolidados aqui
+    decadas = {}
+    for ano, total in _contar_por(session, Livro.ano, _filtros_livro(**filtros, ignorar="ano")):
+        decada = (int(ano) // 10) * 10
+        decadas[decada] = decadas.get(decada, 0) + total
+
+    areas = {}
+    for area, total in _contar_por(session, Livro.area, _filtros_livro(**filtros, ignorar="area")):
+        partes = partes_area(area)
+        if partes:
+            areas[partes[0]] = areas.get(partes[0], 0) + total
+
+    total = session.execute(select(func.count()).select_from(Livro).where(*_filtros_livro(**filtros))).scalar_one()
+
+    return {
+        "total": total,
+        "genero": _ordenar(genero),
+        "idioma": _ordenar(idioma),
+        "ano": [{"valor": decada, "total": decadas[decada]} for decada in sorted(decadas)],
+        "area": _ordenar(areas),
+    }
+
+
+def get_catalog_facets(session: Session, q=None, genero=None, idioma=None, area=None, decada=None) -> dict:
+    """Contagens por genero/idioma/decada/area de topo, em cache por versao do catalogo."""
+    filtros = {"q": (q or "").strip() or None, "genero": genero, "idioma": idioma, "area": area, "decada": decada}
+    versao = get_catalog_version(session)
+    chave = (versao, tuple(sorted(filtros.items())))
+
+    with _facetas_lock:
+        if chave in _facetas_cache:
+            _facetas_cache.move_to_end(chave)
+            return _facetas_cache[chave]
+
+    facetas = {"versao": versao, "filtros": filtros, **_calcular_facetas(session, filtros)}
+
+    with _facetas_lock:
+        # Descarta entradas de versoes anteriores de uma vez
+        for antiga in [k for k in _facetas_cache if k[0] != versao]:
+            del _facetas_cache[antiga]
+        _facetas_cache[chave] = facetas
+        while len(_facetas_cache) > FACETAS_CACHE_MAX:
+            _facetas_cache.popitem(last=False)
+    return facetas
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Edicao de metadados em lote e importacao de CSV/NDJSON.
+
+As alteracoes sao agrupadas em blocos (um commit por bloco) e, dentro de cada
+bloco, em um UPDATE executemany por conjunto de colunas alteradas.
+
+Uso (linha de comando):
+    python catalog_import.py metadados.csv
+    python catalog_import.py metadados.ndjson
+"""
+
+import csv
+import io
+import json
+import os
+import sys
+import time
+from typing import Iterable, Iterator, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import bindparam, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session, select
+
+from catalog import bump_catalog_version
+from models import Livro, LivroPatch
+
+TAMANHO_LOTE = int(os.getenv("IMPORT_TAMANHO_LOTE", "500"))
+
+
+def _aplicar_bloco(session: Session, patches: list) -> tuple:
+    """
+    Aplica um bloco de patches validados. Retorna (atualizados, ids_nao_encontrados,
+    ids_com_falha, erro): se o banco recusar o bloco, nada dele e gravado (rollback)
+    e os ids existentes voltam em `ids_com_falha` com a mensagem em `erro`.
+    """
+    ids = [patch["id"] for patch in patches]
+    existentes = set(session.exec(select(Livro.id).where(Livro.id.in_(ids))).all())
+
+    # Agrupa por conjunto de colunas para um executemany por grupo
+    grupos = {}
+    for patch in patches:
+        if patch["id"] not in existentes:
+            continue
+        colunas = tuple(sorted(k for k in patch if k != "id"))
+        if colunas:
+            grupos.setdefault(colunas, []).append(patch)
+
+    nao_encontrados = [i for i in ids if i not in existentes]
+    atualizados = 0
+    try:
+        for colunas, itens in grupos.items():
+            stmt = (
+                update(Livro.__table__)
+                .where(Livro.__table__.c.id == bindparam("_id"))
+                .values({col: bindparam(col) for col in colunas})
+            )
+            params = [{"_id": item["id"], **{col: item[col] for col in colunas}} for item in itens]
+            session.execute(stmt, params)
+            atualizados += len(itens)
+
+        if atualizados:
+            bump_catalog_version(session)
+        session.commit()
+    except SQLAlchemyError as e:
+        session.rollback()
+        return 0, nao_encontrados, [i for i in ids if i in existentes], str(getattr(e, "orig", None) or e)
+    return atualizados, nao_encontrados, [], None
+
+
+def aplicar_patches(session: Session, patches: Iterable[LivroPatch], tamanho_lote: int = TAMANHO_LOTE) -> dict:
+    """Aplica patches de metadados em transacoes por bloco; um bloco recusado nao impede os demais."""
+    atualizados = 0
+    nao_encontrados = []
+    falhas = []
+
+    def aplicar(bloco):
+        nonlocal atualizados
+        feitos, faltando, com_falha, erro = _aplicar_bloco(session, bloco)
+        atualizados += feitos
+        nao_encontrados.extend(faltando)
+        if com_falha:
+            falhas.append({"ids": com_falha, "erro": erro})
+
+    bloco = []
+    for patch in patches:
+        bloco.append(patch.model_dump(exclude_unset=True))
+        if len(bloco) >= tamanho_lote:
+            aplicar(bloco)
+            bloco = []
+    if bloco:
+        aplicar(bloco)
+
+    return {"atualizados": atualizados, "nao_encontrados": nao_encontrados, "falhas": falhas}
+
+
+# --- Leitura de arquivos (streaming, memoria constante) ---
+
+def ler_csv(arquivo_binario) -> Iterator[dict]:
+    texto = io.TextIOWrapper(arquivo_binario, encoding="utf-8-sig", newline="")
+    for linha in csv.DictReader(texto):
+        # Celula vazia = campo nao informado (nao apaga o valor atual)
+        yield {k.strip(): v for k, v in linha.items() if k and v not in (None, "")}
+
+
+def ler_ndjson(arquivo_binario) -> Iterator[dict]:
+    texto = io.TextIOWrapper(arquivo_binario, encoding="utf-8-sig")
+    for linha in texto:
+        linha = linha.strip()
+        if not linha:
+            yield None
+            continue
+        try:
+            yield json.loads(linha)
+        except ValueError as e:
+            # Devolve o erro como item para nao interromper o restante do arquivo
+            yield e
+
+
+def detectar_formato(nome_arquivo: Optional[str]) -> str:
+    nome = (nome_arquivo or "").lower()
+    if nome.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return "csv"
+
+
+def importar_metadados(session: Session, arquivo_binario, formato: str = "csv", tamanho_lote: int = TAMANHO_LOTE) -> Iterator[dict]:
+    """
+    Le o arquivo linha a linha e aplica em blocos.
+    Gera um evento por erro ({"linha", "erro"}) e, ao final, {"resumo": {...}}.
+    """
+    leitor = ler_ndjson if formato == "ndjson" else ler_csv
+    inicio = time.perf_counter()
+    total = 0
+    atualizados = 0
+    erros = 0
+    bloco = []
+    linhas_bloco = {}
+
+    def descarregar():
+        nonlocal atualizados, erros
+        feitos, faltando, com_falha, erro = _aplicar_bloco(session, bloco)
+        atualizados += feitos
+        for livro_id in faltando:
+            erros += 1
+            yield {"linha": linhas_bloco.get(livro_id), "id": livro_id, "erro": "Livro não encontrado"}
+        for livro_id in com_falha:
+            erros += 1
+            yield {"linha": linhas_bloco.get(livro_id), "id": livro_id, "erro": f"Bloco não gravado: {erro}"}
+        bloco.clear()
+        linhas_bloco.clear()
+
+    # Linha 1 e o cabecalho no CSV
+    numero = 1 if formato == "csv" else 0
+    for registro in leitor(arquivo_binario):
+        numero += 1
+        if registro is None:
+            continue
+        if isinstance(registro, Exception):
+            erros += 1
+            yield {"linha": numero, "erro": f"Linha inválida: {registro}"}
+            continue
+
+        total += 1
+        try:
+            patch = LivroPatch.model_validate(registro).model_dump(exclude_unset=True)
+        except ValidationError as e:
+            erros += 1
+            yield {"linha": numero, "erro": e.errors(include_url=False, include_context=False)}
+            continue
+
+        bloco.append(patch)
+        linhas_bloco[patch["id"]] = numero
+        if len(bloco) >= tamanho_lote:
+            yield from descarregar()
+
+    if bloco:
+        yield from descarregar()
+
+    duracao = time.perf_counter() - inicio
+    yield {
+        "resumo": {
+            "linhas": total,
+            "atualizados": atualizados,
+            "erros": erros,
+            "segundos": round(duracao, 2),
+            "linhas_por_segundo": round(total / duracao, 1) if duracao > 0 else None,
+        }
+    }
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    if len(sys.argv) < 2:
+        print("Uso: python catalog_import.py <arquivo.csv|arquivo.ndjson>")
+        sys.exit(1)
+
+    caminho = sys.argv[1]
+    with open(caminho, "rb") as arquivo, Session(engine) as session:
+        for evento in importar_metadados(session, arquivo, formato=detectar_formato(caminho)):
+            print(json.dumps(evento, ensure_ascii=False, default=str))
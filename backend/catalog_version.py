@@ -0,0 +1,32 @@
+"""
+Contador de versao do catalogo (tabela catalogo_versao).
+
+Usado tanto pela API (via SQLAlchemy) quanto pelos scripts de sincronizacao
+(via cursor mysql.connector), por isso aqui so existe SQL puro e funcoes que
+recebem um cursor DB-API.
+"""
+
+SQL_CRIAR_TABELA_VERSAO = '''
+CREATE TABLE IF NOT EXISTS catalogo_versao (
+    id INT PRIMARY KEY,
+    versao BIGINT NOT NULL DEFAULT 1,
+    atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+)
+'''
+
+SQL_SEMEAR_VERSAO = 'INSERT IGNORE INTO catalogo_versao (id, versao) VALUES (1, 1)'
+
+SQL_LER_VERSAO = 'SELECT versao FROM catalogo_versao WHERE id = 1'
+
+SQL_INCREMENTAR_VERSAO = 'UPDATE catalogo_versao SET versao = versao + 1 WHERE id = 1'
+
+
+def incrementar_versao(cursor):
+    """Marca o catalogo como alterado. Deve rodar na mesma transacao da escrita."""
+    cursor.execute(SQL_INCREMENTAR_VERSAO)
+
+
+def ler_versao(cursor) -> int:
+    cursor.execute(SQL_LER_VERSAO)
+    row = cursor.fetchone()
+    return int(row[0]) if row else 0
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Indice invertido do conteudo de toda a biblioteca.
+
+Layout em CONTENT_INDEX_DIR:
+    CURRENT                  nome da geracao ativa (trocado atomicamente)
+    diretos/<digital>.json.gz  indice direto por arquivo: termo -> [[pagina, tf], ...]
+    gen-<timestamp>/
+        termos.json          dicionario: termos ordenados + inicio/quantidade/df
+        postings.bin         registros uint32 (livro_id, pagina, tf), lidos via mmap
+        livros.json          livro_id -> {digital, tokens}
+
+A reconstrucao e incremental: so arquivos novos/alterados sao extraidos (pool de
+processos); os demais reaproveitam o indice direto. A nova geracao e escrita ao
+lado da atual e so entra em uso quando CURRENT e trocado, entao as buscas
+continuam funcionando durante o rebuild.
+
+Uso:
+    python content_index.py
+"""
+
+import gzip
+import heapq
+import json
+import math
+import mmap
+import os
+import shutil
+import sys
+import threading
+import time
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from book_search import carregar_textos, impressao_digital, tokenizar
+
+INDEX_DIR = os.getenv("CONTENT_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "indice_conteudo"))
+# Quantos registros de postings acumular em memoria antes de gravar um bloco ordenado
+MAX_POSTINGS_EM_MEMORIA = int(os.getenv("CONTENT_INDEX_MAX_POSTINGS", "5000000"))
+GERACOES_MANTIDAS = 2
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+# --- Construcao ---
+
+def _caminho_direto(digital: str) -> str:
+    return os.path.join(INDEX_DIR, "diretos", digital[:2], f"{digital}.json.gz")
+
+
+def indexar_arquivo(file_path: str, digital: str) -> dict:
+    """
+    Executa no processo filho: extrai o texto (ou reaproveita o cache de texto)
+    e grava o indice direto do arquivo. Devolve so um resumo pequeno.
+    """
+    from services import PDFService
+
+    try:
+        paginas = carregar_textos(PDFService(os.path.dirname(file_path)), file_path, digital)
+    except Exception as e:
+        return {"digital": digital, "erro": str(getattr(e, "detail", e))}
+
+    termos: Dict[str, list] = {}
+    tokens = 0
+    for numero, texto in enumerate(paginas, start=1):
+        contagem = Counter(termo for termo, _, _ in tokenizar(texto))
+        tokens += sum(contagem.values())
+        for termo, tf in contagem.items():
+            termos.setdefault(termo, []).append([numero, tf])
+
+    destino = _caminho_direto(digital)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporario = f"{destino}.{os.getpid()}.tmp"
+    with gzip.open(temporario, "wt", encoding="utf-8") as f:
+        json.dump({"tokens": tokens, "paginas": len(paginas), "termos": termos}, f, ensure_ascii=False)
+    os.replace(temporario, destino)
+    return {"digital": digital, "tokens": tokens}
+
+
+def _gravar_bloco(memoria: Dict[str, array], caminho: str):
+    """Grava um bloco ordenado por termo: uma linha JSON [termo, [livro, pagina, tf, ...]]."""
+    with gzip.open(caminho, "wt", encoding="utf-8") as f:
+        for termo in sorted(memoria):
+            f.write(json.dumps([termo, memoria[termo].tolist()], ensure_ascii=False))
+            f.write("\n")
+
+
+def _ler_bloco(caminho: str) -> Iterator[tuple]:
+    with gzip.open(caminho, "rt", encoding="utf-8") as f:
+        for linha in f:
+            termo, registros = json.loads(linha)
+            yield termo, registros
+
+
+def _gravar_geracao(blocos: List[str], destino: str):
+    """Intercala os blocos (k-way merge) no dicionario + postings.bin."""
+    termos, inicios, quantidades, dfs = [], [], [], []
+    posicao = 0
+    with open(os.path.join(destino, "postings.bin"), "wb") as saida:
+        fluxo = heapq.merge(*[_ler_bloco(b) for b in blocos], key=lambda item: item[0])
+        termo_atual = None
+        acumulado = array("I")
+        for termo, registros in fluxo:
+            if termo != termo_atual and termo_atual is not None:
+                posicao = _anexar_termo(saida, termo_atual, acumulado, posicao, termos, inicios, quantidades, dfs)
+                acumulado = array("I")
+            termo_atual = termo
+            acumulado.extend(registros)
+        if termo_atual is not None:
+            _anexar_termo(saida, termo_atual, acumulado, posicao, termos, inicios, quantidades, dfs)
+
+    with open(os.path.join(destino, "termos.json"), "w", encoding="utf-8") as f:
+        json.dump({"termos": termos, "inicio": inicios, "quantidade": quantidades, "df": dfs}, f, ensure_ascii=False)
+
+
+def _anexar_termo(saida, termo, registros: array, posicao, termos, inicios, quantidades, dfs) -> int:
+    saida.write(registros.tobytes())
+    quantidade = len(registros) // 3
+    termos.append(termo)
+    inicios.append(posicao)
+    quantidades.append(quantidade)
+    dfs.append(len(set(registros[0::3])))
+    return posicao + quantidade
+
+
+def reconstruir_indice(livros: List[tuple], processos: Optional[int] = None, progresso=None) -> dict:
+    """
+    `livros`: [(livro_id, caminho_absoluto), ...] com o estado atual do catalogo.
+    Livros removidos simplesmente nao entram na nova geracao.
+    `progresso(feitos, total)` e chamado a cada arquivo extraido; se levantar
+    excecao (job cancelado), as extracoes ainda nao iniciadas sao descartadas e
+    as ja feitas ficam para a proxima execucao.
+    """
+    inicio = time.perf_counter()
+    processos = processos or int(os.getenv("CONTENT_INDEX_PROCESSOS", "0")) or os.cpu_count() or 2
+
+    atuais = []
+    faltando = []
+    ignorados = 0
+    for livro_id, caminho in livros:
+        if not caminho or not caminho.lower().endswith(".pdf"):
+            ignorados += 1
+            continue
+        try:
+            digital = impressao_digital(caminho)
+        except OSError:
+            ignorados += 1
+            continue
+        atuais.append((livro_id, digital))
+        if not os.path.exists(_caminho_direto(digital)):
+            faltando.append((caminho, digital))
+
+    print(f"Indice de conteudo: {len(atuais)} livros, {len(faltando)} a extrair (processos: {processos})")
+    erros = []
+    if faltando:
+        pool = ProcessPoolExecutor(max_workers=processos)
+        try:
+            for feitos, resultado in enumerate(pool.map(indexar_arquivo, *zip(*faltando)), start=1):
+                if "erro" in resultado:
+                    erros.append(resultado)
+                if feitos % 50 == 0:
+                    taxa = feitos / (time.perf_counter() - inicio)
+                    print(f"  {feitos}/{len(faltando)} extraidos | {taxa:.1f} livros/s")
+                if progresso:
+                    progresso(feitos, len(faltando))
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    geracao = f"gen-{time.time_ns()}"
+    destino = os.path.join(INDEX_DIR, geracao)
+    trabalho = os.path.join(destino, "blocos")
+    os.makedirs(trabalho, exist_ok=True)
+
+    # SPIMI: acumula postings em memoria e descarrega blocos ordenados ao passar do limite
+    blocos = []
+    memoria: Dict[str, array] = {}
+    em_memoria = 0
+    manifest = {}
+    for livro_id, digital in atuais:
+        try:
+            with gzip.open(_caminho_direto(digital), "rt", encoding="utf-8") as f:
+                direto = json.load(f)
+        except (OSError, ValueError):
+            continue
+        manifest[str(livro_id)] = {"digital": digital, "tokens": direto["tokens"]}
+        for termo, ocorrencias in direto["termos"].items():
+            destino_termo = memoria.get(termo)
+            if destino_termo is None:
+                destino_termo = memoria[termo] = array("I")
+            for pagina, tf in ocorrencias:
+                destino_termo.extend((livro_id, pagina, tf))
+            em_memoria += len(ocorrencias)
+        if em_memoria >= MAX_POSTINGS_EM_MEMORIA:
+            blocos.append(os.path.join(trabalho, f"bloco-{len(blocos):05d}.jsonl.gz"))
+            _gravar_bloco(memoria, blocos[-1])
+            memoria, em_memoria = {}, 0
+    if memoria or not blocos:
+        blocos.append(os.path.join(trabalho, f"bloco-{len(blocos):05d}.jsonl.gz"))
+        _gravar_bloco(memoria, blocos[-1])
+
+    _gravar_geracao(blocos, destino)
+    shutil.rmtree(trabalho, ignore_errors=True)
+    with open(os.path.join(destino, "livros.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+    # Troca atomica da geracao ativa
+    temporario = os.path.join(INDEX_DIR, "CURRENT.tmp")
+    with open(temporario, "w", encoding="utf-8") as f:
+        f.write(geracao)
+    os.replace(temporario, os.path.join(INDEX_DIR, "CURRENT"))
+
+    _limpar_antigos({digital for _, digital in atuais}, geracao)
+
+    resumo = {
+        "livros": len(manifest),
+        "extraidos": len(faltando) - len(erros),
+        "erros": len(erros),
+        "ignorados": ignorados,
+        "geracao": geracao,
+        "segundos": round(time.perf_counter() - inicio, 1),
+    }
+    print(f"Resumo indice de conteudo: {resumo}")
+    return resumo
+
+
+def _limpar_antigos(digitais_em_uso: set, geracao_atual: str):
+    geracoes = sorted(
+        nome for nome in os.listdir(INDEX_DIR)
+        if nome.startswith("gen-") and nome != geracao_atual
+    )
+    # Mantem a anterior para leitores que ainda estejam com ela aberta
+    for antiga in geracoes[:-(GERACOES_MANTIDAS - 1) or None]:
+        shutil.rmtree(os.path.join(INDEX_DIR, antiga), ignore_errors=True)
+
+    pasta_diretos = os.path.join(INDEX_DIR, "diretos")
+    for raiz, _, arquivos in os.walk(pasta_diretos):
+        for arquivo in arquivos:
+            digital = arquivo.split(".", 1)[0]
+            if arquivo.endswith(".json.gz") and digital not in digitais_em_uso:
+                try:
+                    os.remove(os.path.join(raiz, arquivo))
+                except OSError:
+                    pass
+
+
+def reconstruir_do_banco(processos: Optional[int] = None, progresso=None) -> dict:
+    """Le os livros do banco e reconstroi (incrementalmente) o indice."""
+    from sqlmodel import Session, select
+
+    from database import engine
+    from models import Livro
+
+    base_path = os.getenv("PDF_SOURCE_DIR", "")
+    with Session(engine) as session:
+        linhas = session.exec(select(Livro.id, Livro.caminho).where(Livro.caminho != None)).all()
+
+    livros = []
+    for livro_id, caminho in linhas:
+        caminho = (caminho or "").strip()
+        if caminho and not os.path.isabs(caminho) and base_path:
+            caminho = os.path.join(base_path, caminho)
+        livros.append((livro_id, caminho))
+    return reconstruir_indice(livros, processos=processos, progresso=progresso)
+
+
+# --- Consulta ---
+
+class IndiceConteudo:
+    """Geracao aberta para leitura: dicionario em memoria, postings via mmap."""
+
+    def __init__(self, pasta: str):
+        self.pasta = pasta
+        with open(os.path.join(pasta, "termos.json"), "r", encoding="utf-8") as f:
+            dicionario = json.load(f)
+        self.termos = dicionario["termos"]
+        self.inicio = dicionario["inicio"]
+        self.quantidade = dicionario["quantidade"]
+        self.df = dicionario["df"]
+        self.posicao_termo = {termo: i for i, termo in enumerate(self.termos)}
+
+        with open(os.path.join(pasta, "livros.json"), "r", encoding="utf-8") as f:
+            self.livros = {int(k): v for k, v in json.load(f).items()}
+        self.total_livros = max(len(self.livros), 1)
+        self.media_tokens = (sum(v["tokens"] for v in self.livros.values()) / self.total_livros) or 1
+
+        self._arquivo = open(os.path.join(pasta, "postings.bin"), "rb")
+        tamanho = os.fstat(self._arquivo.fileno()).st_size
+        self._mmap = mmap.mmap(self._arquivo.fileno(), 0, access=mmap.ACCESS_READ) if tamanho else None
+        self._registros = memoryview(self._mmap).cast("I") if self._mmap is not None else memoryview(array("I"))
+
+    def _postings(self, termo: str):
+        i = self.posicao_termo.get(termo)
+        if i is None:
+            return None, 0
+        inicio = self.inicio[i] * 3
+        return self._registros[inicio:inicio + self.quantidade[i] * 3], self.df[i]
+
+    def buscar(self, q: str, limite: int = 20, paginas_por_livro: int = 5) -> List[dict]:
+        termos = list(dict.fromkeys(termo for termo, _, _ in tokenizar(q)))
+        if not termos:
+            return []
+
+        tf_livro: Dict[int, Dict[str, int]] = {}
+        paginas: Dict[int, Dict[int, Dict[str, int]]] = {}
+        for termo in termos:
+            registros, df = self._postings(termo)
+            if registros is None:
+                return []  # Busca AND: um termo ausente zera o resultado
+            for j in range(0, len(registros), 3):
+                livro_id, pagina, tf = registros[j], registros[j + 1], registros[j + 2]
+                por_termo = tf_livro.setdefault(livro_id, {})
+                por_termo[termo] = por_termo.get(termo, 0) + tf
+                paginas.setdefault(livro_id, {}).setdefault(pagina, {})[termo] = tf
+
+        dfs = {termo: self._postings(termo)[1] for termo in termos}
+        resultados = []
+        for livro_id, por_termo in tf_livro.items():
+            if len(por_termo) < len(termos):
+                continue
+            tokens = self.livros.get(livro_id, {}).get("tokens", self.media_tokens)
+            norma = BM25_K1 * (1 - BM25_B + BM25_B * tokens / self.media_tokens)
+            score = 0.0
+            for termo, tf in por_termo.items():
+                idf = math.log(1 + (self.total_livros - dfs[termo] + 0.5) / (dfs[termo] + 0.5))
+                score += idf * tf * (BM25_K1 + 1) / (tf + norma)
+
+            # Paginas onde todos os termos aparecem, as mais densas primeiro
+            melhores = sorted(
+                ((pagina, sum(contagem.values())) for pagina, contagem in paginas[livro_id].items() if len(contagem) == len(termos)),
+                key=lambda item: -item[1],
+            )[:paginas_por_livro]
+            resultados.append({
+                "livro_id": livro_id,
+                "score": round(score, 4),
+                "ocorrencias": sum(por_termo.values()),
+                "paginas": [{"pagina": pagina, "ocorrencias": total} for pagina, total in melhores],
+            })
+
+        resultados.sort(key=lambda item: -item["score"])
+        return resultados[:limite]
+
+    def fechar(self):
+        self._registros.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._arquivo.close()
+
+
+_leitor_lock = threading.Lock()
+_leitor = {"indice": None, "geracao": None, "verificado_em": 0.0}
+INTERVALO_VERIFICACAO = 5.0
+
+
+def get_indice_conteudo() -> Optional[IndiceConteudo]:
+    """Geracao ativa; reabre quando CURRENT muda (verificado a cada poucos segundos)."""
+    agora = time.monotonic()
+    with _leitor_lock:
+        if agora - _leitor["verificado_em"] < INTERVALO_VERIFICACAO:
+            return _leitor["indice"]
+        _leitor["verificado_em"] = agora
+        try:
+            with open(os.path.join(INDEX_DIR, "CURRENT"), "r", encoding="utf-8") as f:
+                geracao = f.read().strip()
+        except OSError:
+            return _leitor["indice"]
+        if geracao != _leitor["geracao"]:
+            _leitor["indice"] = IndiceConteudo(os.path.join(INDEX_DIR, geracao))
+            _leitor["geracao"] = geracao
+            # A geracao antiga e liberada pelo GC quando as buscas em andamento terminarem
+        return _leitor["indice"]
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    reconstruir_do_banco(processos=int(sys.argv[1]) if len(sys.argv) > 1 else None)
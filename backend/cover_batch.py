@@ -0,0 +1,121 @@
+"""
+Capas de varios livros em uma resposta (GET /documents/covers?ids=1,2,3).
+
+O grid pedia uma capa por card (uma sessao e uma consulta cada). Aqui:
+- uma consulta leve `id -> capa_hash` com `IN` (sem BLOBs);
+- os bytes vem de um LRU por hash (capas sao enderecadas pelo SHA-256, entao o
+  cache nunca fica velho); so os hashes que faltam vao ao banco, em outro `IN`;
+- resposta NDJSON, uma linha por id na ordem pedida:
+  {"id": 1, "hash": "...", "tipo": "image/jpeg", "dados": "<base64>"} ou
+  {"id": 2, "hash": null} para livro sem capa (o cliente mostra o fallback sem
+  tentar baixar).
+
+ETag por (versao do catalogo, ids): gravar capas incrementa a versao, entao um
+304 so depende da versao em cache. Tamanho do LRU: COVER_CACHE_MB (32).
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+
+from sqlmodel import Session, select
+
+from models import Capa, Livro
+
+MAX_IDS = 100
+LIMITE_CACHE = int(os.getenv("COVER_CACHE_MB", "32")) * 1024 * 1024
+
+
+class CacheCapas:
+    """LRU hash -> bytes da imagem, limitado pelo total de bytes."""
+
+    def __init__(self, limite_bytes: int = LIMITE_CACHE):
+        self.limite_bytes = limite_bytes
+        self.bytes = 0
+        self._itens: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, hashes: List[str]) -> Dict[str, bytes]:
+        encontrados = {}
+        with self._lock:
+            for capa_hash in hashes:
+                dados = self._itens.get(capa_hash)
+                if dados is not None:
+                    self._itens.move_to_end(capa_hash)
+                    encontrados[capa_hash] = dados
+        return encontrados
+
+    def guardar(self, capa_hash: str, dados: bytes):
+        if len(dados) > self.limite_bytes:
+            return
+        with self._lock:
+            if capa_hash in self._itens:
+                return
+            self._itens[capa_hash] = dados
+            self.bytes += len(dados)
+            while self.bytes > self.limite_bytes:
+                _, removido = self._itens.popitem(last=False)
+                self.bytes -= len(removido)
+
+
+_cache = CacheCapas()
+
+
+def ler_ids(texto: str) -> List[int]:
+    """'3,1,3,2' -> [3, 1, 2] (sem repetidos, na ordem). ValueError se invalido."""
+    ids = []
+    for parte in texto.split(","):
+        parte = parte.strip()
+        if parte:
+            ids.append(int(parte))
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise ValueError("nenhum id")
+    if len(ids) > MAX_IDS:
+        raise ValueError(f"maximo de {MAX_IDS} ids por requisicao")
+    return ids
+
+
+def etag_pacote(versao: int, ids: List[int], encoding: str = "identity") -> str:
+    # Um ETag forte por representacao: o corpo gzip e outro byte a byte
+    chave = hashlib.sha1(",".join(map(str, ids)).encode()).hexdigest()[:16]
+    sufixo = "" if encoding == "identity" else f"-{encoding}"
+    return f'"capas-{versao}-{chave}{sufixo}"'
+
+
+def montar_pacote(session: Session, ids: List[int]) -> bytes:
+    hash_por_id = dict(session.exec(select(Livro.id, Livro.capa_hash).where(Livro.id.in_(ids))).all())
+    hashes = list({h for h in hash_por_id.values() if h})
+
+    imagens = _cache.obter(hashes)
+    faltando = [h for h in hashes if h not in imagens]
+    if faltando:
+        for capa_hash, dados in session.exec(select(Capa.hash, Capa.dados).where(Capa.hash.in_(faltando))).all():
+            imagens[capa_hash] = dados
+            _cache.guardar(capa_hash, dados)
+
+    linhas = []
+    for livro_id in ids:
+        capa_hash = hash_por_id.get(livro_id)
+        dados = imagens.get(capa_hash) if capa_hash else None
+        if dados is None:
+            linhas.append({"id": livro_id, "hash": None})
+        else:
+            linhas.append({
+                "id": livro_id,
+                "hash": capa_hash,
+                "tipo": "image/jpeg",
+                "dados": base64.b64encode(dados).decode("ascii"),
+            })
+    return "".join(json.dumps(linha, separators=(",", ":")) + "\n" for linha in linhas).encode("utf-8")
+
+
+def comprimir(corpo: bytes) -> bytes:
+    # base64 de JPEG: o gzip devolve boa parte dos 33% do base64; nivel baixo basta
+    return gzip.compress(corpo, compresslevel=1)
+
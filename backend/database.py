@@ -1,4 +1,6 @@
-from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel import create_engine, Session
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
 import os
 from dotenv import load_dotenv
 
@@ -27,9 +29,45 @@ engine = create_engine(
     }
 )
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
-
 def get_session():
     with Session(engine) as session:
         yield session
+
+
+def upsert(session: Session, model, valores: dict, chaves: tuple, atualizar: tuple, incrementar: tuple = ()):
+    """
+    Insere `valores` ou, se já existir linha com as mesmas `chaves` (chave única),
+    atualiza apenas as colunas `atualizar` — em um único comando quando o banco suporta.
+    Colunas em `incrementar` (ex.: versão) recebem +1 na atualização.
+    """
+    tabela = model.__table__
+    dialeto = session.get_bind().dialect.name
+    incrementos = {col: tabela.c[col] + 1 for col in incrementar}
+
+    if dialeto == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(tabela).values(**valores)
+        stmt = stmt.on_duplicate_key_update({**{col: stmt.inserted[col] for col in atualizar}, **incrementos})
+        session.execute(stmt)
+        return
+
+    if dialeto in ("postgresql", "sqlite"):
+        if dialeto == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as conflict_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as conflict_insert
+        stmt = conflict_insert(tabela).values(**valores)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(chaves),
+            set_={**{col: stmt.excluded[col] for col in atualizar}, **incrementos},
+        )
+        session.execute(stmt)
+        return
+
+    # Fallback portável: tenta inserir e, se a chave única colidir, atualiza
+    try:
+        with session.begin_nested():
+            session.execute(insert(tabela).values(**valores))
+    except IntegrityError:
+        filtro = [tabela.c[col] == valores[col] for col in chaves]
+        session.execute(update(tabela).where(*filtro).values({**{col: valores[col] for col in atualizar}, **incrementos}))
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Relatorio de livros duplicados (mesmo livro em arquivos/pastas diferentes) e fusao.
+
+Cada livro recebe duas assinaturas MinHash: uma dos trigramas do titulo normalizado
+(sem extensao, "(1)", "copia"...) e outra das sequencias de 4 palavras das primeiras
+paginas, quando o texto ja foi extraido (cache de book_search, preenchido pelo
+indice de conteudo). O LSH por bandas so compara livros que caem no mesmo balde em
+alguma banda, entao o custo cresce quase linearmente com a biblioteca. Os pares
+acima do limiar viram grupos (union-find), gravados em DUPLICATES_DIR/relatorio.json.
+
+A fusao mantem um livro de cada grupo: listas de leitura e anotacoes dos demais
+passam para ele (mescladas quando o usuario tinha as duas) e os campos vazios sao
+completados com os dos removidos. Os arquivos dos removidos continuam na pasta e
+viram alias do livro mantido (livros_alias), que o sync conta como presentes.
+
+Configuracao (env): DUPLICATES_DIR, DUPLICATES_LIMIAR (0.75), DUPLICATES_PAGINAS_TEXTO (3).
+
+Uso:
+    python duplicates.py
+"""
+
+import json
+import os
+import re
+import time
+import zlib
+from datetime import datetime
+from itertools import combinations
+from typing import Dict, List, Optional
+
+from sqlmodel import Session, delete, select
+
+from similar_books import normalizar
+
+DUPLICATES_DIR = os.getenv("DUPLICATES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "duplicatas"))
+LIMIAR = float(os.getenv("DUPLICATES_LIMIAR", "0.75"))
+PAGINAS_TEXTO = int(os.getenv("DUPLICATES_PAGINAS_TEXTO", "3"))
+MAX_PALAVRAS_TEXTO = 800
+PERMUTACOES = 128
+BANDAS = 16  # 8 linhas por banda: limiar de candidatura ~(1/16)^(1/8) = 0.71
+MAX_BALDE = 200  # baldes maiores (ex.: titulos genericos) sao ignorados
+PESO_TEXTO = 0.7
+PRIMO = (1 << 31) - 1
+
+RE_EXTENSAO = re.compile(r"\.(pdf|epub|azw3?|mobi)$", re.IGNORECASE)
+RE_COPIA = re.compile(r"(\(\d+\)|\[\d+\]|\bcopia\b(\s*\d+)?|\bcopy\b(\s*\d+)?)\s*$")
+RE_NAO_PALAVRA = re.compile(r"[\W_]+")
+
+ORDEM_STATUS = {"quero_ler": 0, "lendo": 1, "concluido": 2}
+CAMPOS_COMPLEMENTARES = ("autor", "ano", "editora", "genero", "idioma", "paginas", "sinopse", "capa_hash")
+
+
+# --- Assinaturas ---
+
+def _sem_marcas_de_copia(titulo: Optional[str]) -> str:
+    texto = normalizar(RE_EXTENSAO.sub("", (titulo or "").strip()))
+    anterior = None
+    while texto != anterior:
+        anterior = texto
+        texto = RE_COPIA.sub("", texto.rstrip(" -_.")).strip()
+    return texto
+
+
+def tem_marca_de_copia(titulo: Optional[str]) -> bool:
+    return _sem_marcas_de_copia(titulo) != normalizar(RE_EXTENSAO.sub("", (titulo or "").strip())).strip()
+
+
+def normalizar_titulo(titulo: Optional[str]) -> str:
+    """Minusculas, sem acentos, extensao, pontuacao e marcas de copia ("(1)", "copia")."""
+    return RE_NAO_PALAVRA.sub(" ", _sem_marcas_de_copia(titulo)).strip()
+
+
+def _hashes(shingles) -> List[int]:
+    return [zlib.crc32(s.encode("utf-8")) for s in shingles]
+
+
+def shingles_titulo(titulo_normalizado: str) -> set:
+    texto = f" {titulo_normalizado} "
+    if len(texto) <= 3:
+        return {texto} if titulo_normalizado else set()
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def shingles_texto(paginas: Optional[List[str]]) -> set:
+    palavras = []
+    for pagina in (paginas or [])[:PAGINAS_TEXTO]:
+        palavras.extend(p for p in RE_NAO_PALAVRA.split(normalizar(pagina or "")) if p)
+        if len(palavras) >= MAX_PALAVRAS_TEXTO:
+            break
+    palavras = palavras[:MAX_PALAVRAS_TEXTO]
+    return {" ".join(palavras[i:i + 4]) for i in range(len(palavras) - 3)}
+
+
+class MinHash:
+    """Permutacoes (a*x + b) mod PRIMO com sementes fixas: assinaturas comparaveis entre execucoes."""
+
+    def __init__(self, permutacoes: int = PERMUTACOES, semente: int = 42):
+        import numpy as np
+
+        rng = np.random.RandomState(semente)
+        self.a = rng.randint(1, PRIMO, size=(permutacoes, 1)).astype(np.uint64)
+        self.b = rng.randint(0, PRIMO, size=(permutacoes, 1)).astype(np.uint64)
+
+    def assinatura(self, shingles: set):
+        import numpy as np
+
+        if not shingles:
+            return None
+        x = np.asarray(_hashes(shingles), dtype=np.uint64) % PRIMO
+        return ((self.a * x[None, :] + self.b) % PRIMO).min(axis=1).astype(np.uint32)
+
+
+def pares_candidatos(assinaturas, bandas: int = BANDAS, max_balde: int = MAX_BALDE) -> set:
+    """LSH: pares (i, j) de linhas que coincidem em todas as posicoes de pelo menos uma banda."""
+    import numpy as np
+
+    n, permutacoes = assinaturas.shape
+    linhas_por_banda = permutacoes // bandas
+    pares = set()
+    for banda in range(bandas):
+        fatia = np.ascontiguousarray(assinaturas[:, banda * linhas_por_banda:(banda + 1) * linhas_por_banda])
+        chaves = fatia.view(np.dtype((np.void, fatia.dtype.itemsize * linhas_por_banda))).ravel()
+        _, balde = np.unique(chaves, return_inverse=True)
+        ordem = np.argsort(balde, kind="stable")
+        inicios = np.flatnonzero(np.r_[True, np.diff(balde[ordem]) != 0])
+        tamanhos = np.diff(np.r_[inicios, n])
+        for inicio, tamanho in zip(inicios[tamanhos > 1], tamanhos[tamanhos > 1]):
+            if tamanho > max_balde:
+                continue
+            membros = sorted(ordem[inicio:inicio + tamanho].tolist())
+            pares.update(combinations(membros, 2))
+    return pares
+
+
+class UniaoBusca:
+    def __init__(self, n: int):
+        self.pai = list(range(n))
+
+    def achar(self, x: int) -> int:
+        while self.pai[x] != x:
+            self.pai[x] = self.pai[self.pai[x]]
+            x = self.pai[x]
+        return x
+
+    def unir(self, a: int, b: int):
+        ra, rb = self.achar(a), self.achar(b)
+        if ra != rb:
+            self.pai[max(ra, rb)] = min(ra, rb)
+
+
+# --- Relatorio ---
+
+def _numeros(titulo_normalizado: str) -> frozenset:
+    # "vol 1" x "vol 2", "2a edicao" x "3a edicao": titulos quase iguais, livros diferentes
+    return frozenset(re.findall(r"\d+", titulo_normalizado))
+
+
+def _preenchidos(livro: dict) -> int:
+    return sum(1 for campo in CAMPOS_COMPLEMENTARES if livro.get(campo) not in (None, ""))
+
+
+def encontrar_duplicatas(livros: List[dict], limiar: float = LIMIAR, progresso=None) -> dict:
+    """
+    `livros`: dicts com id, titulo e opcionalmente `paginas_texto` (texto das primeiras
+    paginas) e os campos de CAMPOS_COMPLEMENTARES. Retorna o relatorio com os grupos.
+    """
+    import numpy as np
+
+    inicio = time.perf_counter()
+    minhash = MinHash()
+    n = len(livros)
+    titulos = [normalizar_titulo(livro.get("titulo")) for livro in livros]
+    sig_titulo = np.zeros((n, PERMUTACOES), dtype=np.uint32)
+    sig_texto = np.zeros((n, PERMUTACOES), dtype=np.uint32)
+    tem_titulo = np.zeros(n, dtype=bool)
+    tem_texto = np.zeros(n, dtype=bool)
+
+    for i, livro in enumerate(livros):
+        assinatura = minhash.assinatura(shingles_titulo(titulos[i]))
+        if assinatura is not None:
+            sig_titulo[i], tem_titulo[i] = assinatura, True
+        assinatura = minhash.assinatura(shingles_texto(livro.get("paginas_texto")))
+        if assinatura is not None:
+            sig_texto[i], tem_texto[i] = assinatura, True
+        if progresso and (i + 1) % 1000 == 0:
+            progresso(i + 1, n)
+
+    candidatos = set()
+    for assinaturas, validos in ((sig_titulo, tem_titulo), (sig_texto, tem_texto)):
+        indices = np.flatnonzero(validos)
+        if len(indices) > 1:
+            candidatos.update((int(indices[a]), int(indices[b])) for a, b in pares_candidatos(assinaturas[indices]))
+
+    # Similaridade estimada (fracao de posicoes iguais) de todos os candidatos de uma vez
+    pares = np.asarray(sorted(candidatos), dtype=np.int64).reshape(-1, 2)
+    a, b = pares[:, 0], pares[:, 1]
+    sims_titulo = np.where(tem_titulo[a] & tem_titulo[b], (sig_titulo[a] == sig_titulo[b]).mean(axis=1), 0.0)
+    com_texto = tem_texto[a] & tem_texto[b]
+    sims_texto = (sig_texto[a] == sig_texto[b]).mean(axis=1)
+    scores = np.where(com_texto, (1 - PESO_TEXTO) * sims_titulo + PESO_TEXTO * sims_texto, sims_titulo)
+
+    uniao = UniaoBusca(n)
+    arestas = []
+    for k in np.flatnonzero(scores >= limiar):
+        i, j = int(a[k]), int(b[k])
+        if not com_texto[k] and _numeros(titulos[i]) != _numeros(titulos[j]):
+            continue
+        sim_texto = float(sims_texto[k]) if com_texto[k] else None
+        uniao.unir(i, j)
+        arestas.append((i, j, float(sims_titulo[k]), sim_texto, float(scores[k])))
+
+    grupos: Dict[int, dict] = {}
+    for i, j, sim_titulo, sim_texto, score in arestas:
+        grupo = grupos.setdefault(uniao.achar(i), {"membros": set(), "pares": []})
+        grupo["membros"].update((i, j))
+        grupo["pares"].append({
+            "a": livros[i]["id"],
+            "b": livros[j]["id"],
+            "titulo": round(sim_titulo, 3),
+            "texto": round(sim_texto, 3) if sim_texto is not None else None,
+            "score": round(score, 3),
+        })
+
+    saida = []
+    for grupo in grupos.values():
+        membros = [livros[i] for i in sorted(grupo["membros"])]
+        scores = [par["score"] for par in grupo["pares"]]
+        # Sugestao: o mais completo; no empate, o de titulo sem marca de copia e o mais antigo
+        manter = min(membros, key=lambda livro: (-_preenchidos(livro), tem_marca_de_copia(livro.get("titulo")), livro["id"]))
+        saida.append({
+            "livros": [{campo: livro.get(campo) for campo in ("id", "titulo", "autor", "area", "caminho", "paginas")} for livro in membros],
+            "sugestao_manter": manter["id"],
+            "similaridade_min": min(scores),
+            "similaridade_max": max(scores),
+            "pares": sorted(grupo["pares"], key=lambda par: -par["score"]),
+        })
+    saida.sort(key=lambda grupo: (-len(grupo["livros"]), -grupo["similaridade_max"]))
+
+    return {
+        "gerado_em": datetime.utcnow().isoformat(),
+        "limiar": limiar,
+        "livros": n,
+        "livros_com_texto": int(tem_texto.sum()),
+        "pares_candidatos": len(candidatos),
+        "pares_acima_do_limiar": len(arestas),
+        "total_grupos": len(saida),
+        "segundos": round(time.perf_counter() - inicio, 1),
+        "grupos": saida,
+    }
+
+
+def _caminho_relatorio() -> str:
+    return os.path.join(DUPLICATES_DIR, "relatorio.json")
+
+
+def carregar_relatorio() -> Optional[dict]:
+    try:
+        with open(_caminho_relatorio(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def gerar_relatorio(limiar: float = LIMIAR, usar_texto: bool = True, progresso=None) -> dict:
+    """Le os livros do banco, gera o relatorio e grava em DUPLICATES_DIR. Devolve o resumo."""
+    from book_search import textos_em_cache
+    from database import engine
+    from models import Livro, LivroArquivo
+
+    base_path = os.getenv("PDF_SOURCE_DIR", "")
+    with Session(engine) as session:
+        arquivos = dict(session.exec(select(LivroArquivo.livro_id, LivroArquivo.caminho)).all())
+        livros = [livro.model_dump() for livro in session.exec(select(Livro).order_by(Livro.id)).all()]
+
+    if usar_texto:
+        for livro in livros:
+            caminho = arquivos.get(livro["id"]) or (livro.get("caminho") or "").strip()
+            if caminho and not os.path.isabs(caminho) and base_path:
+                caminho = os.path.join(base_path, caminho)
+            livro["paginas_texto"] = textos_em_cache(caminho) if caminho else None
+
+    relatorio = encontrar_duplicatas(livros, limiar=limiar, progresso=progresso)
+    os.makedirs(DUPLICATES_DIR, exist_ok=True)
+    temporario = f"{_caminho_relatorio()}.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, default=str)
+    os.replace(temporario, _caminho_relatorio())
+
+    resumo = {chave: valor for chave, valor in relatorio.items() if chave != "grupos"}
+    print(f"Relatorio de duplicatas: {resumo}")
+    return resumo
+
+
+# --- Fusao ---
+
+def mesclar_anotacoes(destino: dict, origem: dict) -> dict:
+    """Uniao de marcadores, notas (concatenadas se diferentes) e destaques (sem repetir id)."""
+    destino, origem = dict(destino or {}), origem or {}
+    destino["bookmarks"] = sorted(set(destino.get("bookmarks") or []) | set(origem.get("bookmarks") or []))
+
+    notas = dict(destino.get("notes") or {})
+    for pagina, texto in (origem.get("notes") or {}).items():
+        if not notas.get(pagina):
+            notas[pagina] = texto
+        elif texto and texto != notas[pagina]:
+            notas[pagina] = f"{notas[pagina]}\n\n{texto}"
+    destino["notes"] = notas
+
+    destaques = {pagina: list(itens) for pagina, itens in (destino.get("highlights") or {}).items()}
+    for pagina, itens in (origem.get("highlights") or {}).items():
+        atuais = destaques.setdefault(pagina, [])
+        ids = {item.get("id") for item in atuais if isinstance(item, dict)}
+        atuais.extend(item for item in itens if not (isinstance(item, dict) and item.get("id") in ids))
+    destino["highlights"] = destaques
+
+    if not destino.get("lastPage"):
+        destino["lastPage"] = origem.get("lastPage")
+    if not destino.get("totalPages"):
+        destino["totalPages"] = origem.get("totalPages")
+    return destino
+
+
+def mesclar_livros(session: Session, manter_id: int, remover_ids: List[int]) -> dict:
+    """
+    Move listas e anotacoes para `manter_id`, completa os metadados e exclui os demais
+    (sem commit). Os arquivos dos excluidos ficam como alias do mantido, para o
+    proximo sync nao inseri-los de novo.
+    """
+    from models import Anotacao, ListaLeitura, Livro, LivroAlias
+
+    remover_ids = sorted({i for i in remover_ids if i != manter_id})
+    manter = session.get(Livro, manter_id)
+    if manter is None:
+        raise ValueError(f"Livro {manter_id} não encontrado")
+    removidos = session.exec(select(Livro).where(Livro.id.in_(remover_ids))).all() if remover_ids else []
+    ids = [livro.id for livro in removidos]
+    if not ids:
+        return {"manter": manter_id, "removidos": 0, "listas": 0, "anotacoes": 0, "aliases": 0}
+
+    for campo in CAMPOS_COMPLEMENTARES:
+        if getattr(manter, campo) in (None, ""):
+            origem = next((livro for livro in removidos if getattr(livro, campo) not in (None, "")), None)
+            if origem is not None:
+                setattr(manter, campo, getattr(origem, campo))
+                if campo == "capa_hash":
+                    # O placeholder acompanha a capa de onde veio
+                    manter.capa_blurhash = origem.capa_blurhash
+    session.add(manter)
+
+    listas = 0
+    por_usuario: Dict[int, list] = {}
+    for entrada in session.exec(select(ListaLeitura).where(ListaLeitura.livro_id.in_([manter_id] + ids))).all():
+        por_usuario.setdefault(entrada.usuario_id, []).append(entrada)
+    for entradas in por_usuario.values():
+        alvo = next((e for e in entradas if e.livro_id == manter_id), entradas[0])
+        # O status mais avancado e a data de inclusao mais antiga
+        alvo.status = max((e.status for e in entradas), key=lambda status: ORDEM_STATUS.get(status, -1))
+        alvo.data_adicao = min(e.data_adicao for e in entradas)
+        if alvo.livro_id != manter_id:
+            alvo.livro_id = manter_id
+            listas += 1
+        session.add(alvo)
+        for entrada in entradas:
+            if entrada is not alvo:
+                session.delete(entrada)
+
+    anotacoes = 0
+    por_usuario = {}
+    for anotacao in session.exec(select(Anotacao).where(Anotacao.livro_id.in_([manter_id] + ids))).all():
+        por_usuario.setdefault(anotacao.usuario_id, []).append(anotacao)
+    for itens in por_usuario.values():
+        alvo = next((a for a in itens if a.livro_id == manter_id), itens[0])
+        dados = alvo.dados_json
+        for anotacao in itens:
+            if anotacao is not alvo:
+                dados = mesclar_anotacoes(dados, anotacao.dados_json)
+                session.delete(anotacao)
+        if alvo.livro_id != manter_id or len(itens) > 1:
+            anotacoes += 1
+        alvo.livro_id = manter_id
+        alvo.dados_json = dados
+        alvo.updated_at = datetime.utcnow()
+        alvo.versao += 1
+        session.add(alvo)
+
+    # Arquivos dos excluidos (e aliases de mesclas anteriores) passam ao livro mantido
+    aliases = 0
+    for alias in session.exec(select(LivroAlias).where(LivroAlias.livro_id.in_(ids))).all():
+        alias.livro_id = manter_id
+        session.add(alias)
+    for livro in removidos:
+        if livro.caminho and livro.caminho != manter.caminho:
+            session.add(LivroAlias(livro_id=manter_id, caminho=livro.caminho))
+            aliases += 1
+
+    # Listas/anotacoes/aliases ja apontam para o livro mantido antes de excluir os demais
+    session.flush()
+    session.exec(delete(Livro).where(Livro.id.in_(ids)))
+    return {"manter": manter_id, "removidos": len(ids), "listas": listas, "anotacoes": anotacoes, "aliases": aliases}
+
+
+def mesclar_grupos(session: Session, grupos: list) -> List[dict]:
+    """Um commit por grupo: um grupo invalido nao desfaz os anteriores."""
+    from catalog import bump_catalog_version
+
+    resultados = []
+    for grupo in grupos:
+        try:
+            resultado = mesclar_livros(session, grupo.manter, grupo.remover)
+            bump_catalog_version(session)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            resultado = {"manter": grupo.manter, "erro": str(e)}
+        resultados.append(resultado)
+    return resultados
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    gerar_relatorio()
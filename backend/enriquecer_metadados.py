@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Preenche autor/ano/idioma/editora a partir do proprio PDF.
+
+- Le o dicionario Info e o XMP (dc:creator, dc:publisher, dc:date, dc:language).
+- Detecta o idioma por uma amostra do texto das primeiras paginas.
+- Extracao roda em um pool de processos; gravacao em lotes, so nos campos vazios.
+- Retomavel: guarda o ultimo id processado em ENRIQUECIMENTO_CHECKPOINT.
+
+Uso:
+    python enriquecer_metadados.py               # continua de onde parou
+    python enriquecer_metadados.py --reiniciar   # ignora o checkpoint
+"""
+
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import bindparam, func, or_, update
+from sqlmodel import Session, select
+
+from catalog import bump_catalog_version
+from database import engine
+from models import Livro
+
+
+load_dotenv()
+
+CAMPOS = ("autor", "ano", "idioma", "editora")
+CHECKPOINT = os.getenv("ENRIQUECIMENTO_CHECKPOINT", ".enriquecimento_checkpoint.json")
+PAGINAS_AMOSTRA = 5
+MAX_CARACTERES_AMOSTRA = 8000
+
+IDIOMAS = {
+    "pt": ("Português", {"de", "que", "nao", "para", "com", "uma", "os", "no", "se", "na", "por", "mais", "as", "dos", "como", "mas", "ao", "ele", "das", "seu", "sua", "ou", "quando", "muito", "nos", "ja", "tambem", "pelo", "pela", "ate", "isso", "entre", "sao", "foi"}),
+    "en": ("Inglês", {"the", "of", "and", "to", "in", "is", "that", "for", "it", "as", "was", "with", "be", "by", "on", "not", "he", "this", "are", "or", "his", "from", "at", "which", "but", "have", "an", "they", "you", "were", "their", "been", "has", "would"}),
+    "es": ("Espanhol", {"de", "la", "que", "el", "en", "y", "los", "del", "se", "las", "por", "un", "para", "con", "no", "una", "su", "al", "es", "lo", "como", "mas", "pero", "sus", "le", "ya", "fue", "este", "ha", "porque", "esta", "son", "entre", "cuando", "muy"}),
+    "fr": ("Francês", {"de", "la", "le", "et", "les", "des", "en", "un", "du", "une", "que", "est", "pour", "qui", "dans", "par", "plus", "pas", "au", "sur", "ne", "se", "ce", "il", "sont", "avec", "aux", "ou", "mais", "nous", "comme", "cette", "leur", "ont"}),
+    "de": ("Alemão", {"der", "die", "und", "in", "den", "von", "zu", "das", "mit", "sich", "des", "auf", "fur", "ist", "im", "dem", "nicht", "ein", "eine", "als", "auch", "es", "an", "werden", "aus", "er", "hat", "dass", "sie", "nach", "wird", "bei", "einer", "um"}),
+    "it": ("Italiano", {"di", "che", "il", "la", "e", "per", "un", "in", "non", "una", "del", "della", "sono", "le", "si", "con", "da", "al", "gli", "anche", "come", "piu", "ma", "dei", "nel", "questo", "alla", "essere", "delle", "ha", "lo", "sua", "suo", "tra"}),
+}
+
+NS_XMP = {
+    "rdf": "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+    "dc": "http://purl.org/dc/elements/1.1/",
+    "prism": "http://prismstandard.org/namespaces/basic/2.0/",
+}
+
+RE_ANO = re.compile(r"(?<!\d)(1[5-9]\d\d|20\d\d)(?!\d)")
+RE_PALAVRA = re.compile(r"[a-z]+")
+
+
+def _sem_acentos(texto: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+
+
+def detectar_idioma(texto: str) -> Optional[str]:
+    """Retorna o nome do idioma pela frequencia de stopwords, ou None se inconclusivo."""
+    palavras = RE_PALAVRA.findall(_sem_acentos(texto.lower()))
+    if len(palavras) < 50:
+        return None
+    pontos = {codigo: sum(1 for p in palavras if p in stop) for codigo, (_, stop) in IDIOMAS.items()}
+    ordenados = sorted(pontos.items(), key=lambda item: -item[1])
+    (melhor, pontos_melhor), (_, pontos_segundo) = ordenados[0], ordenados[1]
+    # Exige uma vantagem clara (pt/es compartilham muitas stopwords)
+    if pontos_melhor < len(palavras) * 0.05 or pontos_melhor < pontos_segundo * 1.2:
+        return None
+    return IDIOMAS[melhor][0]
+
+
+def _texto_xmp(raiz, caminho: str) -> Optional[str]:
+    no = raiz.find(caminho, NS_XMP)
+    if no is None:
+        return None
+    # dc:* costuma vir em rdf:Seq/rdf:Alt/rdf:Bag com rdf:li
+    itens = [li.text.strip() for li in no.iter(f"{{{NS_XMP['rdf']}}}li") if li.text and li.text.strip()]
+    if itens:
+        return "; ".join(itens)
+    return no.text.strip() if no.text and no.text.strip() else None
+
+
+def _ler_xmp(pdf) -> dict:
+    try:
+        referencia = pdf.doc.catalog.get("Metadata")
+        if referencia is None:
+            return {}
+        dados = referencia.resolve().get_data()
+        raiz = ET.fromstring(dados)
+    except Exception:
+        return {}
+
+    return {
+        "autor": _texto_xmp(raiz, ".//dc:creator"),
+        "editora": _texto_xmp(raiz, ".//dc:publisher"),
+        "data": _texto_xmp(raiz, ".//prism:publicationDate") or _texto_xmp(raiz, ".//dc:date"),
+        "idioma": _texto_xmp(raiz, ".//dc:language"),
+    }
+
+
+def _valor_info(info: dict, chave: str) -> Optional[str]:
+    valor = info.get(chave)
+    if isinstance(valor, bytes):
+        valor = valor.decode("utf-8", errors="ignore")
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    return valor or None
+
+
+def extrair_metadados(livro_id: int, caminho_completo: str, titulo: str) -> dict:
+    """Executa no processo filho: abre o PDF e devolve apenas o que foi encontrado."""
+    import pdfplumber
+
+    resultado = {"id": livro_id}
+    try:
+        with pdfplumber.open(caminho_completo) as pdf:
+            info = pdf.metadata or {}
+            xmp = _ler_xmp(pdf)
+
+            autor = xmp.get("autor") or _valor_info(info, "Author")
+            if autor:
+                resultado["autor"] = autor[:255]
+
+            editora = xmp.get("editora") or _valor_info(info, "Publisher")
+            if editora:
+                resultado["editora"] = editora[:255]
+
+            # Ano: data de publicacao do XMP ou um ano no nome do arquivo.
+            # CreationDate do Info e a data do arquivo, nao da edicao, e fica de fora.
+            for fonte in (xmp.get("data"), titulo):
+                encontrado = RE_ANO.search(fonte or "")
+                if encontrado:
+                    resultado["ano"] = int(encontrado.group(1))
+                    break
+
+            amostra = []
+            tamanho = 0
+            for pagina in pdf.pages[:PAGINAS_AMOSTRA]:
+                texto = pagina.extract_text() or ""
+                pagina.close()
+                amostra.append(texto)
+                tamanho += len(texto)
+                if tamanho >= MAX_CARACTERES_AMOSTRA:
+                    break
+            idioma = detectar_idioma(" ".join(amostra)[:MAX_CARACTERES_AMOSTRA])
+            if idioma:
+                resultado["idioma"] = idioma
+    except Exception as e:
+        resultado["erro"] = str(e)
+    return resultado
+
+
+def _ler_checkpoint() -> int:
+    try:
+        with open(CHECKPOINT, "r", encoding="utf-8") as f:
+            return int(json.load(f).get("ultimo_id", 0))
+    except (OSError, ValueError):
+        return 0
+
+
+def _salvar_checkpoint(ultimo_id: int):
+    temporario = f"{CHECKPOINT}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump({"ultimo_id": ultimo_id, "atualizado_em": time.strftime("%Y-%m-%d %H:%M:%S")}, f)
+    os.replace(temporario, CHECKPOINT)
+
+
+def _gravar_lote(session: Session, resultados: list) -> int:
+    """Grava so nos campos ainda vazios (COALESCE), um executemany por campo."""
+    gravados = 0
+    for campo in CAMPOS:
+        params = [{"_id": r["id"], "valor": r[campo]} for r in resultados if r.get(campo) is not None]
+        if not params:
+            continue
+        coluna = Livro.__table__.c[campo]
+        stmt = (
+            update(Livro.__table__)
+            .where(Livro.__table__.c.id == bindparam("_id"))
+            .values({campo: func.coalesce(coluna, bindparam("valor"))})
+        )
+        session.execute(stmt, params)
+        gravados += len(params)
+    if gravados:
+        bump_catalog_version(session)
+    session.commit()
+    return gravados
+
+
+def _resolver_caminho(caminho: str, base_path: str) -> Optional[str]:
+    caminho = (caminho or "").strip()
+    if not caminho:
+        return None
+    if os.path.isabs(caminho):
+        return caminho
+    return os.path.join(base_path, caminho) if base_path else None
+
+
+def enriquecer_metadados(
+    base_pdf_path: Optional[str] = None,
+    processos: Optional[int] = None,
+    lote: int = 200,
+    reiniciar: bool = False,
+):
+    """
+    Processa, em ordem de id, livros PDF com algum dos CAMPOS vazio.
+    O checkpoint avanca a cada lote gravado.
+    """
+    base_path = os.path.normpath(base_pdf_path or os.getenv("PDF_SOURCE_DIR", "") or ".")
+    processos = processos or int(os.getenv("ENRIQUECIMENTO_PROCESSOS", "0")) or os.cpu_count() or 2
+    ultimo_id = 0 if reiniciar else _ler_checkpoint()
+    if ultimo_id:
+        print(f"Retomando a partir do livro id > {ultimo_id}")
+
+    faltando = or_(*[getattr(Livro, campo) == None for campo in CAMPOS])
+
+    processados = 0
+    campos_gravados = 0
+    erros = 0
+    inicio = time.perf_counter()
+
+    with Session(engine) as session, ProcessPoolExecutor(max_workers=processos) as pool:
+        total = session.exec(
+            select(func.count()).select_from(Livro).where(faltando, Livro.caminho != None, Livro.id > ultimo_id)
+        ).one()
+        print(f"Livros com metadados faltando: {total} (processos: {processos})")
+
+        while True:
+            # Paginacao por id: nao carrega a biblioteca inteira em memoria
+            linhas = session.exec(
+                select(Livro.id, Livro.caminho, Livro.titulo)
+                .where(faltando, Livro.caminho != None, Livro.id > ultimo_id)
+                .order_by(Livro.id)
+                .limit(lote)
+            ).all()
+            if not linhas:
+                break
+
+            tarefas = []
+            for livro_id, caminho, titulo in linhas:
+                completo = _resolver_caminho(caminho, base_path)
+                if completo and completo.lower().endswith(".pdf") and os.path.exists(completo):
+                    tarefas.append((livro_id, completo, titulo or ""))
+
+            resultados = list(pool.map(extrair_metadados, *zip(*tarefas))) if tarefas else []
+            erros += sum(1 for r in resultados if "erro" in r)
+            campos_gravados += _gravar_lote(session, [r for r in resultados if "erro" not in r])
+
+            ultimo_id = linhas[-1][0]
+            _salvar_checkpoint(ultimo_id)
+            processados += len(linhas)
+
+            decorrido = time.perf_counter() - inicio
+            taxa = processados / decorrido if decorrido > 0 else 0
+            restante = (total - processados) / taxa if taxa > 0 else 0
+            print(f"{processados}/{total} livros | {taxa:.1f} livros/s | campos gravados: {campos_gravados} | erros: {erros} | ETA {restante:.0f}s")
+
+    resumo = {
+        "processados": processados,
+        "campos_gravados": campos_gravados,
+        "erros": erros,
+        "segundos": round(time.perf_counter() - inicio, 1),
+        "ultimo_id": ultimo_id,
+    }
+    print(f"Resumo enriquecimento: {resumo}")
+    return resumo
+
+
+if __name__ == "__main__":
+    enriquecer_metadados(reiniciar="--reiniciar" in sys.argv)
@@ -0,0 +1,106 @@
+"""
+Registro de arquivos: livro_id -> caminho absoluto, tamanho, mtime e inode.
+
+O sync grava a tabela `livros_arquivos` durante a varredura; as rotas consultam
+primeiro um cache em memoria e depois a tabela, sem tocar no sistema de arquivos
+(o preenchimento pelo sync, so com cursor DB-API, fica em file_registry_sync.py).
+O arquivo so e verificado de novo (stat) quando o registro passa de
+FILE_REGISTRY_TTL segundos ou quando a abertura falha.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+from fastapi import HTTPException
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session
+
+from database import upsert
+from file_registry_sync import ArquivoRegistrado, do_stat as _do_stat
+from models import Livro, LivroArquivo
+from services import PDFService
+
+TTL_SEGUNDOS = float(os.getenv("FILE_REGISTRY_TTL", "3600"))
+
+T = TypeVar("T")
+
+_lock = threading.Lock()
+# livro_id -> (arquivo, caminho no cadastro do livro, validade em time.monotonic())
+_memoria: Dict[int, Tuple[ArquivoRegistrado, str, float]] = {}
+
+
+def _corresponde(registrado: str, caminho_livro: str) -> bool:
+    """O registro ainda e do caminho cadastrado no livro? (o admin pode ter editado)"""
+    if os.path.isabs(caminho_livro):
+        return os.path.normcase(registrado) == os.path.normcase(caminho_livro)
+    return os.path.normcase(registrado).endswith(os.path.normcase(os.path.normpath(caminho_livro)))
+
+
+def invalidar(livro_id: Optional[int] = None):
+    with _lock:
+        if livro_id is None:
+            _memoria.clear()
+        else:
+            _memoria.pop(livro_id, None)
+
+
+def resolver_arquivo(session: Session, livro: Livro, pdf_service: PDFService, forcar: bool = False) -> ArquivoRegistrado:
+    """Arquivo do livro; 404 se o livro nao tem arquivo acessivel."""
+    if not livro.caminho:
+        raise HTTPException(status_code=404, detail="Livro sem arquivo cadastrado")
+
+    agora = time.monotonic()
+    if not forcar:
+        with _lock:
+            em_memoria = _memoria.get(livro.id)
+        if em_memoria and em_memoria[1] == livro.caminho and em_memoria[2] > agora:
+            return em_memoria[0]
+
+        registro = session.get(LivroArquivo, livro.id)
+        if registro is not None and _corresponde(registro.caminho, livro.caminho):
+            idade = (datetime.utcnow() - registro.verificado_em).total_seconds()
+            if idade < TTL_SEGUNDOS:
+                arquivo = ArquivoRegistrado(registro.caminho, registro.tamanho, registro.mtime_ns, registro.inode)
+                with _lock:
+                    _memoria[livro.id] = (arquivo, livro.caminho, agora + TTL_SEGUNDOS - idade)
+                return arquivo
+
+    # Registro ausente, vencido ou arquivo que falhou ao abrir: resolve e re-verifica
+    try:
+        arquivo = _do_stat(pdf_service.get_file_path(livro.caminho))
+    except (HTTPException, OSError):
+        invalidar(livro.id)
+        raise HTTPException(status_code=404, detail=f"PDF file not found: {livro.caminho}")
+
+    # Sessao propria e curta: a transacao de quem chamou (ex.: job no meio de um
+    # lote) nao e confirmada nem perde o que carregou por causa do registro. O
+    # registro e so um atalho; se a gravacao falhar, a proxima consulta refaz o stat
+    try:
+        with Session(session.get_bind()) as registro_session:
+            upsert(
+                registro_session,
+                LivroArquivo,
+                {"livro_id": livro.id, **arquivo._asdict(), "verificado_em": datetime.utcnow()},
+                chaves=("livro_id",),
+                atualizar=("caminho", "tamanho", "mtime_ns", "inode", "verificado_em"),
+            )
+            registro_session.commit()
+    except SQLAlchemyError as e:
+        print(f"Falha ao gravar o registro do arquivo do livro {livro.id}: {e}")
+    with _lock:
+        _memoria[livro.id] = (arquivo, livro.caminho, agora + TTL_SEGUNDOS)
+    return arquivo
+
+
+def com_arquivo(session: Session, livro: Livro, pdf_service: PDFService, operacao: Callable[[ArquivoRegistrado], T]) -> T:
+    """Executa `operacao` no arquivo do livro; se ele nao abrir, revalida o registro e tenta uma vez mais."""
+    arquivo = resolver_arquivo(session, livro, pdf_service)
+    try:
+        return operacao(arquivo)
+    except FileNotFoundError:
+        arquivo = resolver_arquivo(session, livro, pdf_service, forcar=True)
+        return operacao(arquivo)
+
@@ -0,0 +1,64 @@
+"""
+Preenchimento do registro de arquivos (tabela livros_arquivos) pelo sync.
+
+Usado pelo sync de linha de comando e pelo admin Streamlit (cursor
+mysql.connector), por isso aqui so existe SQL puro e funcoes que recebem um
+cursor DB-API; as consultas da API ficam em file_registry.py.
+"""
+
+import os
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+
+TAMANHO_BLOCO_SYNC = 1000
+
+SQL_UPSERT_ARQUIVO = (
+    'INSERT INTO livros_arquivos (livro_id, caminho, tamanho, mtime_ns, inode, verificado_em) '
+    'VALUES (%s, %s, %s, %s, %s, %s) '
+    'ON DUPLICATE KEY UPDATE caminho = VALUES(caminho), tamanho = VALUES(tamanho), '
+    'mtime_ns = VALUES(mtime_ns), inode = VALUES(inode), verificado_em = VALUES(verificado_em)'
+)
+
+
+class ArquivoRegistrado(NamedTuple):
+    caminho: str
+    tamanho: int
+    mtime_ns: int
+    inode: Optional[int]
+
+    @property
+    def assinatura(self) -> Tuple[int, int]:
+        return self.tamanho, self.mtime_ns
+
+
+def do_stat(caminho: str) -> ArquivoRegistrado:
+    st = os.stat(caminho)
+    return ArquivoRegistrado(caminho, st.st_size, st.st_mtime_ns, st.st_ino or None)
+
+
+def registrar_arquivos(cursor, caminhos_absolutos) -> int:
+    """
+    Atualiza o registro para os livros cujos caminhos estao em `caminhos_absolutos`
+    (os arquivos encontrados na varredura). Livros excluidos saem por ON DELETE CASCADE.
+    """
+    alvo = {os.path.normcase(os.path.abspath(c)) for c in caminhos_absolutos}
+    cursor.execute('SELECT id, caminho FROM livros WHERE caminho IS NOT NULL')
+    livros = [(livro_id, caminho) for livro_id, caminho in cursor.fetchall() if os.path.normcase(os.path.abspath(caminho)) in alvo]
+
+    agora = datetime.utcnow()
+    registrados = 0
+    bloco = []
+    for livro_id, caminho in livros:
+        try:
+            arquivo = do_stat(caminho)
+        except OSError:
+            continue
+        bloco.append((livro_id, arquivo.caminho, arquivo.tamanho, arquivo.mtime_ns, arquivo.inode, agora))
+        if len(bloco) >= TAMANHO_BLOCO_SYNC:
+            cursor.executemany(SQL_UPSERT_ARQUIVO, bloco)
+            registrados += len(bloco)
+            bloco = []
+    if bloco:
+        cursor.executemany(SQL_UPSERT_ARQUIVO, bloco)
+        registrados += len(bloco)
+    return registrados
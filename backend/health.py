@@ -0,0 +1,141 @@
+"""
+Liveness/readiness da API.
+
+A inicializacao nao toca no banco nem importa bibliotecas pesadas; o aquecimento
+roda em uma thread depois que o worker sobe. /health/ready so responde 200 quando
+pool, schema e caches estao prontos (use no balanceador durante restarts).
+"""
+
+import os
+import threading
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlmodel import Session
+
+from database import engine
+
+CONEXOES_AQUECIMENTO = int(os.getenv("WARMUP_CONEXOES", "4"))
+INTERVALO_NOVA_TENTATIVA = 10.0
+
+router = APIRouter()
+
+_lock = threading.Lock()
+_estado = {"pronto": False, "em_andamento": False, "etapas": {}, "erro": None, "iniciado_em": None, "concluido_em": None}
+
+
+def _etapa_banco():
+    # Abre varias conexoes ao mesmo tempo para o pool ja comecar com elas
+    conexoes = [engine.connect() for _ in range(CONEXOES_AQUECIMENTO)]
+    try:
+        for conexao in conexoes:
+            conexao.exec_driver_sql("SELECT 1")
+    finally:
+        for conexao in conexoes:
+            conexao.close()
+
+
+def _etapa_migracoes():
+    from migrations import migracoes_pendentes
+
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        pendentes = migracoes_pendentes(cursor)
+        cursor.close()
+    finally:
+        conn.close()
+    if pendentes:
+        raise RuntimeError(f"Migracoes pendentes {pendentes}: execute `make migrate` (python migrations.py)")
+
+
+def _etapa_catalogo():
+    from areas import get_area_tree
+    from catalog import get_catalog_snapshot
+
+    with Session(engine) as session:
+        get_catalog_snapshot(session)
+        get_area_tree(session)
+
+
+def _etapa_pdf():
+    import pdfplumber  # noqa: F401
+
+
+def _etapa_traducao():
+    from services import get_translation_service
+
+    get_translation_service()
+
+
+ETAPAS = (
+    ("banco", _etapa_banco),
+    ("migracoes", _etapa_migracoes),
+    ("catalogo", _etapa_catalogo),
+    ("pdf", _etapa_pdf),
+    ("traducao", _etapa_traducao),
+)
+
+
+def _aquecer():
+    inicio = time.perf_counter()
+    erro = None
+    for nome, etapa in ETAPAS:
+        t0 = time.perf_counter()
+        try:
+            etapa()
+            resultado = {"ok": True, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+        except Exception as e:
+            erro = erro or f"{nome}: {e}"
+            resultado = {"ok": False, "erro": str(e)}
+        with _lock:
+            _estado["etapas"][nome] = resultado
+
+    with _lock:
+        _estado["pronto"] = erro is None
+        _estado["erro"] = erro
+        _estado["em_andamento"] = False
+        _estado["concluido_em"] = time.time()
+        _estado["duracao_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+    print(f"Aquecimento {'concluido' if erro is None else 'com falha'} em {_estado['duracao_ms']} ms" + (f" ({erro})" if erro else ""))
+
+
+def iniciar_aquecimento():
+    """Dispara o aquecimento em segundo plano (nao bloqueia o startup do worker)."""
+    with _lock:
+        if _estado["em_andamento"] or _estado["pronto"]:
+            return
+        _estado.update(em_andamento=True, erro=None, etapas={}, iniciado_em=time.time())
+    threading.Thread(target=_aquecer, name="aquecimento", daemon=True).start()
+
+
+@router.get("/health/live")
+def health_live():
+    return {"status": "ok"}
+
+
+@router.get("/health/admission")
+def health_admission():
+    """Ocupacao e rejeicoes por classe de endpoint (controle de admissao)"""
+    from admission import estado_admissao
+
+    return estado_admissao()
+
+
+@router.get("/health/prefetch")
+def health_prefetch():
+    """Taxa de acerto, cancelamentos e descartes da pre-busca de paginas"""
+    from prefetch import estado_prebusca
+
+    return estado_prebusca()
+
+
+@router.get("/health/ready")
+def health_ready():
+    with _lock:
+        estado = dict(_estado, etapas=dict(_estado["etapas"]))
+    # Falhou (ex.: banco fora do ar ou migracao pendente): tenta de novo de tempos em tempos
+    if not estado["pronto"] and not estado["em_andamento"] and estado["concluido_em"] and time.time() - estado["concluido_em"] > INTERVALO_NOVA_TENTATIVA:
+        iniciar_aquecimento()
+    return JSONResponse(estado, status_code=200 if estado["pronto"] else 503)
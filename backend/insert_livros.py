@@ -1,6 +1,7 @@
 import os
 import mysql.connector
 from dotenv import load_dotenv
+from migrations import aplicar_migracoes
 
 # Carrega variáveis de ambiente
 load_dotenv()
@@ -24,24 +25,8 @@ except Exception as e:
     print(f"❌ Erro ao conectar: {e}")
     exit()
 
-# 1. Criar tabela se não existir
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS livros (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    titulo VARCHAR(255),
-    area VARCHAR(255),
-    caminho TEXT,
-    autor VARCHAR(255),
-    editora VARCHAR(255),
-    ano INT,
-    paginas INT,
-    genero VARCHAR(255),
-    idioma VARCHAR(255),
-    sinopse TEXT,
-    capa BLOB,
-    data_adicao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-''')
+# 1. Garantir schema (migrações versionadas)
+aplicar_migracoes(conn)
 
 # 2. LIMPEZA TOTAL DA TABELA (O comando novo é este aqui)
 print("🧹 Limpando tabela 'livros' existente...")
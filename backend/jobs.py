@@ -0,0 +1,356 @@
+"""
+Tarefas de admin em segundo plano (contagem de paginas, capas, sincronizacao...).
+
+- POST /admin/jobs cria o registro em `jobs` e devolve o id; cada worker da API
+  tem um executor que reivindica jobs pendentes com um UPDATE condicional.
+- No maximo um job ativo por tipo: a coluna `slot` (unica) recebe o tipo enquanto
+  o job esta pendente/executando e volta a NULL ao terminar.
+- O executor renova `atualizado_em` dos seus jobs a cada ciclo; um job
+  "executando" sem batimento ha JOBS_STALE_SECONDS (processo reiniciado ou morto)
+  e reivindicado de novo e continua do ultimo checkpoint.
+
+Configuracao (env): JOBS_ENABLED (1), JOBS_WORKERS (2), JOBS_POLL_SECONDS (5), JOBS_STALE_SECONDS (60).
+"""
+
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from database import engine
+from models import Job, Livro
+
+ATIVOS = ("pendente", "executando")
+INTERVALO_POLL = float(os.getenv("JOBS_POLL_SECONDS", "5"))
+LIMITE_SEM_BATIMENTO = float(os.getenv("JOBS_STALE_SECONDS", "60"))
+MAX_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+
+TIPOS: Dict[str, Callable[["ContextoJob"], Optional[dict]]] = {}
+
+
+def tipo_job(nome: str):
+    def registrar(func):
+        TIPOS[nome] = func
+        return func
+    return registrar
+
+
+class JobCancelado(Exception):
+    pass
+
+
+class JobPerdido(Exception):
+    """O job foi reivindicado por outro executor (este ficou sem batimento); parar sem gravar nada."""
+
+
+class ContextoJob:
+    """Entregue a funcao do job: parametros, checkpoint salvo e `avancar` para gravar progresso."""
+
+    def __init__(self, job: Job, dono: str):
+        self.id = job.id
+        self.parametros = job.parametros or {}
+        self.checkpoint = job.checkpoint or {}
+        self.dono = dono
+
+    def avancar(self, progresso: Optional[int] = None, total: Optional[int] = None, checkpoint: Optional[dict] = None):
+        """
+        Grava progresso/checkpoint (commit proprio). Levanta JobCancelado se o
+        cancelamento foi pedido e JobPerdido se outro executor assumiu o job.
+        """
+        valores = {"atualizado_em": datetime.utcnow()}
+        if progresso is not None:
+            valores["progresso"] = progresso
+        if total is not None:
+            valores["total"] = total
+        if checkpoint is not None:
+            valores["checkpoint"] = checkpoint
+            self.checkpoint = checkpoint
+        with Session(engine) as session:
+            resultado = session.execute(update(Job).where(Job.id == self.id, Job.dono == self.dono).values(**valores))
+            cancelar = session.exec(select(Job.cancelar).where(Job.id == self.id)).one()
+            session.commit()
+        if resultado.rowcount == 0:
+            raise JobPerdido()
+        if cancelar:
+            raise JobCancelado()
+
+
+def progresso_do_job(ctx: ContextoJob, intervalo: float = 2.0) -> Callable[[int, int], None]:
+    """
+    Callback `progresso(feitos, total)` para funcoes fora de jobs.py: grava no
+    maximo a cada `intervalo` segundos e propaga JobCancelado quando pedido.
+    """
+    ultimo = [0.0]
+
+    def progresso(feitos: int, total: int):
+        agora = time.monotonic()
+        if agora - ultimo[0] >= intervalo:
+            ultimo[0] = agora
+            ctx.avancar(progresso=feitos, total=total)
+
+    return progresso
+
+
+# --- API usada pelas rotas ---
+
+def submeter_job(session: Session, tipo: str, parametros: Optional[dict] = None, usuario_id: Optional[int] = None) -> Tuple[Job, bool]:
+    """Cria o job. Se ja houver um ativo do mesmo tipo, devolve esse (criado=False)."""
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de job desconhecido: {tipo}")
+    job = Job(tipo=tipo, slot=tipo, parametros=parametros or {}, usuario_id=usuario_id)
+    session.add(job)
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        existente = session.exec(select(Job).where(Job.slot == tipo)).first()
+        if existente is None:
+            # O ativo terminou entre o INSERT e o SELECT: tenta de novo uma vez
+            return submeter_job(session, tipo, parametros, usuario_id)
+        return existente, False
+    session.refresh(job)
+    if _executor is not None:
+        _executor.acordar()
+    return job, True
+
+
+def pedir_cancelamento(session: Session, job: Job) -> Job:
+    if job.status == "pendente":
+        job.status, job.slot, job.concluido_em = "cancelado", None, datetime.utcnow()
+    elif job.status == "executando":
+        # O job para no proximo `avancar`
+        job.cancelar = True
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+# --- Executor ---
+
+class ExecutorJobs:
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self.dono = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._executando = set()
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+
+    def acordar(self):
+        self._acordar.set()
+
+    def iniciar(self):
+        threading.Thread(target=self._laco, name="jobs", daemon=True).start()
+
+    def parar(self):
+        self._parar.set()
+        self._acordar.set()
+
+    def _laco(self):
+        while not self._parar.is_set():
+            try:
+                self._batimento()
+                self._agendar_desatualizados()
+                self._reivindicar()
+            except Exception as e:
+                print(f"Executor de jobs: {e}")
+            self._acordar.wait(INTERVALO_POLL)
+            self._acordar.clear()
+
+    def _batimento(self):
+        with self._lock:
+            ids = list(self._executando)
+        if not ids:
+            return
+        with Session(engine) as session:
+            session.execute(
+                update(Job).where(Job.id.in_(ids), Job.dono == self.dono).values(atualizado_em=datetime.utcnow())
+            )
+            session.commit()
+
+    def _agendar_desatualizados(self):
+        # Indices derivados do catalogo: a reconstrucao parte daqui quando a versao muda
+        from similar_books import agendar_se_desatualizado
+
+        with Session(engine) as session:
+            agendar_se_desatualizado(session)
+
+    def _reivindicar(self):
+        with self._lock:
+            vagas = self.max_workers - len(self._executando)
+        if vagas <= 0:
+            return
+        limite = datetime.utcnow() - timedelta(seconds=LIMITE_SEM_BATIMENTO)
+        disponivel = or_(Job.status == "pendente", (Job.status == "executando") & (Job.atualizado_em < limite))
+
+        with Session(engine) as session:
+            candidatos = session.exec(select(Job.id).where(disponivel).order_by(Job.id).limit(vagas * 4)).all()
+            for job_id in candidatos:
+                if vagas <= 0:
+                    break
+                agora = datetime.utcnow()
+                # UPDATE condicional: so um processo consegue reivindicar o mesmo job
+                resultado = session.execute(
+                    update(Job)
+                    .where(Job.id == job_id, disponivel)
+                    .values(status="executando", dono=self.dono, atualizado_em=agora, iniciado_em=agora)
+                )
+                session.commit()
+                if resultado.rowcount == 1:
+                    vagas -= 1
+                    with self._lock:
+                        self._executando.add(job_id)
+                    self._pool.submit(self._executar, job_id)
+
+    def _finalizar(self, job_id: int, **valores):
+        with Session(engine) as session:
+            session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.dono == self.dono)
+                .values(slot=None, concluido_em=datetime.utcnow(), atualizado_em=datetime.utcnow(), **valores)
+            )
+            session.commit()
+
+    def _executar(self, job_id: int):
+        try:
+            with Session(engine) as session:
+                job = session.get(Job, job_id)
+                contexto = ContextoJob(job, self.dono)
+                tipo = job.tipo
+            retomado = " (retomando)" if contexto.checkpoint else ""
+            print(f"Job {job_id} [{tipo}] iniciado{retomado}")
+            resultado = TIPOS[tipo](contexto)
+            self._finalizar(job_id, status="concluido", resultado=resultado, erro=None)
+            print(f"Job {job_id} [{tipo}] concluido: {resultado}")
+        except JobCancelado:
+            self._finalizar(job_id, status="cancelado")
+            print(f"Job {job_id} cancelado")
+        except JobPerdido:
+            # O novo dono continua do ultimo checkpoint; este executor so para
+            print(f"Job {job_id} assumido por outro executor; interrompido aqui")
+        except Exception as e:
+            self._finalizar(job_id, status="falhou", erro=f"{e}\n{traceback.format_exc(limit=5)}")
+            print(f"Job {job_id} falhou: {e}")
+        finally:
+            with self._lock:
+                self._executando.discard(job_id)
+            self.acordar()
+
+
+_executor: Optional[ExecutorJobs] = None
+
+
+def iniciar_executor_jobs():
+    global _executor
+    if os.getenv("JOBS_ENABLED", "1").strip().lower() not in ("1", "true", "yes", "y"):
+        return
+    if _executor is None:
+        _executor = ExecutorJobs()
+        _executor.iniciar()
+
+
+# --- Tipos de job ---
+
+@tipo_job("paginas")
+def job_paginas(ctx: ContextoJob) -> dict:
+    """Conta as paginas de todos os livros em blocos por id; commit e checkpoint por bloco."""
+    from catalog import bump_catalog_version
+    from file_registry import com_arquivo
+    from services import get_pdf_service
+
+    pdf_service = get_pdf_service()
+    bloco = int(ctx.parametros.get("bloco", 100))
+    ultimo_id = ctx.checkpoint.get("ultimo_id", 0)
+    atualizados = ctx.checkpoint.get("atualizados", 0)
+    erros = ctx.checkpoint.get("erros", 0)
+
+    with Session(engine) as session:
+        total = session.exec(select(Livro.id).where(Livro.caminho != None)).all()
+        ctx.avancar(progresso=sum(1 for i in total if i <= ultimo_id), total=len(total))
+
+        while True:
+            livros = session.exec(
+                select(Livro).where(Livro.caminho != None, Livro.id > ultimo_id).order_by(Livro.id).limit(bloco)
+            ).all()
+            if not livros:
+                break
+            for livro in livros:
+                try:
+                    paginas = com_arquivo(
+                        session, livro, pdf_service,
+                        lambda arquivo: pdf_service.count_pages(arquivo.caminho, arquivo.assinatura),
+                    )
+                    if livro.paginas != paginas:
+                        livro.paginas = paginas
+                        session.add(livro)
+                        atualizados += 1
+                except Exception as e:
+                    erros += 1
+                    print(f"✗ Livro {livro.id} ({livro.titulo}): {getattr(e, 'detail', e)}")
+            ultimo_id = livros[-1].id
+            bump_catalog_version(session)
+            session.commit()
+            feitos = sum(1 for i in total if i <= ultimo_id)
+            ctx.avancar(progresso=feitos, checkpoint={"ultimo_id": ultimo_id, "atualizados": atualizados, "erros": erros})
+
+    return {"atualizados": atualizados, "erros": erros, "total": len(total)}
+
+
+@tipo_job("capas")
+def job_capas(ctx: ContextoJob) -> dict:
+    # Ja e retomavel por natureza: so processa livros ainda sem capa
+    from capas import gerar_capas_automaticas
+
+    return gerar_capas_automaticas(progresso=lambda feitos, total: ctx.avancar(progresso=feitos, total=total))
+
+
+@tipo_job("sincronizacao")
+def job_sincronizacao(ctx: ContextoJob) -> dict:
+    # Idempotente (diferenca pasta x banco): reexecutar apos uma queda e seguro
+    from sync_livros import sincronizar_livros
+
+    return sincronizar_livros(
+        gerar_capas=bool(ctx.parametros.get("gerar_capas")),
+        subpasta_relativa=ctx.parametros.get("subpasta", ""),
+        indexar_conteudo=bool(ctx.parametros.get("indexar_conteudo")),
+        tamanho_bloco=ctx.parametros.get("tamanho_bloco"),
+        progresso=progresso_do_job(ctx),
+    )
+
+
+@tipo_job("indice_conteudo")
+def job_indice_conteudo(ctx: ContextoJob) -> dict:
+    # Incremental: arquivos ja extraidos sao reaproveitados ao retomar
+    from content_index import reconstruir_do_banco
+
+    return reconstruir_do_banco(progresso=progresso_do_job(ctx))
+
+
+@tipo_job("similares")
+def job_similares(ctx: ContextoJob) -> dict:
+    # Reaproveita a geracao existente se os metadados nao mudaram
+    from similar_books import reconstruir_do_banco
+
+    return reconstruir_do_banco(progresso=progresso_do_job(ctx))
+
+
+@tipo_job("duplicatas")
+def job_duplicatas(ctx: ContextoJob) -> dict:
+    from duplicates import LIMIAR, gerar_relatorio
+
+    return gerar_relatorio(
+        limiar=float(ctx.parametros.get("limiar", LIMIAR)),
+        usar_texto=bool(ctx.parametros.get("usar_texto", True)),
+        progresso=lambda feitos, total: ctx.avancar(progresso=feitos, total=total),
+    )
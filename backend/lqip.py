@@ -0,0 +1,97 @@
+"""
+Placeholder das capas (BlurHash): ~28 caracteres por livro, que vao junto na
+listagem do catalogo para o grid pintar as cores da capa antes da imagem chegar.
+
+Gerado a partir dos bytes da capa (JPEG) em capas.gerar_capas_automaticas e
+guardado em `livros.capa_blurhash`. Implementacao direta do algoritmo de
+referencia (https://blurha.sh), sem dependencias alem do PyMuPDF ja usado
+nas capas. O frontend decodifica em src/utils/blurhash.js.
+"""
+
+import math
+from typing import Optional
+
+# Componentes horizontais x verticais (capas sao mais altas que largas)
+COMPONENTES_X = 3
+COMPONENTES_Y = 4
+# Largura da miniatura usada no calculo; mais pixels nao mudam o resultado visivel
+LARGURA_AMOSTRA = 32
+
+ALFABETO = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+_SRGB_PARA_LINEAR = [
+    (v / 255) / 12.92 if v / 255 <= 0.04045 else ((v / 255 + 0.055) / 1.055) ** 2.4
+    for v in range(256)
+]
+
+
+def _base83(valor: int, tamanho: int) -> str:
+    return "".join(ALFABETO[(valor // 83 ** (tamanho - i)) % 83] for i in range(1, tamanho + 1))
+
+
+def _linear_para_srgb(valor: float) -> int:
+    v = max(0.0, min(1.0, valor))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _raiz_com_sinal(valor: float) -> float:
+    return math.copysign(abs(valor) ** 0.5, valor)
+
+
+def codificar(largura: int, altura: int, rgb: bytes, componentes_x: int = COMPONENTES_X, componentes_y: int = COMPONENTES_Y) -> str:
+    """BlurHash de uma imagem RGB (3 bytes por pixel, linha a linha)."""
+    linear = [_SRGB_PARA_LINEAR[b] for b in rgb]
+    cos_x = [[math.cos(math.pi * i * x / largura) for x in range(largura)] for i in range(componentes_x)]
+    cos_y = [[math.cos(math.pi * j * y / altura) for y in range(altura)] for j in range(componentes_y)]
+
+    fatores = []
+    for j in range(componentes_y):
+        for i in range(componentes_x):
+            r = g = b = 0.0
+            for y in range(altura):
+                peso_y = cos_y[j][y]
+                linha = y * largura * 3
+                for x in range(largura):
+                    peso = cos_x[i][x] * peso_y
+                    p = linha + x * 3
+                    r += peso * linear[p]
+                    g += peso * linear[p + 1]
+                    b += peso * linear[p + 2]
+            escala = (1 if i == 0 and j == 0 else 2) / (largura * altura)
+            fatores.append((r * escala, g * escala, b * escala))
+
+    dc, ac = fatores[0], fatores[1:]
+    resultado = _base83((componentes_x - 1) + (componentes_y - 1) * 9, 1)
+    if ac:
+        maximo_real = max(abs(c) for fator in ac for c in fator)
+        maximo_quantizado = max(0, min(82, int(maximo_real * 166 - 0.5)))
+        maximo = (maximo_quantizado + 1) / 166
+        resultado += _base83(maximo_quantizado, 1)
+    else:
+        maximo = 1.0
+        resultado += _base83(0, 1)
+
+    resultado += _base83((_linear_para_srgb(dc[0]) << 16) + (_linear_para_srgb(dc[1]) << 8) + _linear_para_srgb(dc[2]), 4)
+    for fator in ac:
+        q = [max(0, min(18, int(math.floor(_raiz_com_sinal(c / maximo) * 9 + 9.5)))) for c in fator]
+        resultado += _base83(q[0] * 19 * 19 + q[1] * 19 + q[2], 2)
+    return resultado
+
+
+def blurhash_da_imagem(img_bytes: bytes) -> Optional[str]:
+    """BlurHash dos bytes de uma imagem (JPEG/PNG); None se nao for possivel decodificar."""
+    import fitz  # PyMuPDF
+
+    try:
+        pix = fitz.Pixmap(img_bytes)
+        if pix.alpha or pix.n != 3:
+            pix = fitz.Pixmap(fitz.csRGB, pix, 0)
+        # Reduz pela metade ate ficar perto da largura da amostra
+        while pix.width >= LARGURA_AMOSTRA * 2:
+            pix.shrink(1)
+        return codificar(pix.width, pix.height, pix.samples)
+    except Exception as e:
+        print(f"Falha ao gerar placeholder da capa: {e}")
+        return None
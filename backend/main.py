@@ -1,7 +1,9 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routes import router
-from database import create_db_and_tables
+from health import router as health_router, iniciar_aquecimento
+from admission import AdmissionMiddleware
+from jobs import iniciar_executor_jobs
 
 app = FastAPI(title="PDF Translator API")
 
@@ -14,22 +16,31 @@ origins = [
 ]
 
 
+# Limites por classe de endpoint (traducao, arquivo, busca, admin); fica dentro do CORS
+# para que as respostas 429/503 tambem levem os cabecalhos CORS
+app.add_middleware(AdmissionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Range", "Accept-Ranges", "Content-Length", "Content-Disposition"],
+    expose_headers=["Content-Range", "Accept-Ranges", "Content-Length", "Content-Disposition", "Retry-After", "ETag"],
 )
 
 
 
 @app.on_event("startup")
 def on_startup():
-    create_db_and_tables()
+    # Sem DDL aqui: o schema e aplicado por `make migrate` antes de subir os workers.
+    # Pool, catalogo e bibliotecas pesadas aquecem em segundo plano (ver /health/ready).
+    iniciar_aquecimento()
+    # Jobs de admin (paginas, capas, sync); retoma os interrompidos por restart
+    iniciar_executor_jobs()
 
 app.include_router(router)
+app.include_router(health_router)
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Migracoes versionadas do schema (fonte unica para a API e para os scripts de sync).
+
+Cada migracao e aplicada uma unica vez e registrada em `schema_migrations`.
+Trabalha sobre uma conexao DB-API (mysql.connector ou engine.raw_connection()),
+por isso nao depende do SQLModel.
+
+Uso:
+    python migrations.py            # aplica as pendentes
+    python migrations.py --status   # lista aplicadas/pendentes
+"""
+
+import os
+import sys
+
+from catalog_version import SQL_CRIAR_TABELA_VERSAO, SQL_SEMEAR_VERSAO
+
+NOME_LOCK = 'bibloshome_migracoes'
+
+
+# --- Helpers idempotentes ---
+
+def _indice_existe(cursor, tabela: str, nome: str) -> bool:
+    cursor.execute(
+        'SELECT COUNT(*) FROM information_schema.statistics '
+        'WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s',
+        (tabela, nome),
+    )
+    return cursor.fetchall()[0][0] > 0
+
+
+def _coluna_existe(cursor, tabela: str, coluna: str) -> bool:
+    cursor.execute(
+        'SELECT COUNT(*) FROM information_schema.columns '
+        'WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s',
+        (tabela, coluna),
+    )
+    return cursor.fetchall()[0][0] > 0
+
+
+def criar_indice(cursor, tabela: str, nome: str, colunas: str, unico: bool = False):
+    if not _indice_existe(cursor, tabela, nome):
+        tipo = 'UNIQUE INDEX' if unico else 'INDEX'
+        cursor.execute(f'CREATE {tipo} {nome} ON {tabela} ({colunas})')
+
+
+def adicionar_coluna(cursor, tabela: str, coluna: str, definicao: str):
+    if not _coluna_existe(cursor, tabela, coluna):
+        cursor.execute(f'ALTER TABLE {tabela} ADD COLUMN {coluna} {definicao}')
+
+
+def recriar_fk_cascade(cursor, tabela: str, coluna: str, tabela_ref: str, nome: str):
+    """Troca qualquer FK existente de `coluna` por uma com ON DELETE CASCADE."""
+    cursor.execute(
+        'SELECT constraint_name FROM information_schema.key_column_usage '
+        'WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s '
+        'AND referenced_table_name = %s',
+        (tabela, coluna, tabela_ref),
+    )
+    for (existente,) in cursor.fetchall():
+        cursor.execute(f'ALTER TABLE {tabela} DROP FOREIGN KEY {existente}')
+
+    # Registros orfaos impediriam a criacao da FK (tabelas antigas criadas sem FK)
+    cursor.execute(
+        f'DELETE FROM {tabela} WHERE {coluna} NOT IN (SELECT id FROM {tabela_ref})'
+    )
+    cursor.execute(
+        f'ALTER TABLE {tabela} ADD CONSTRAINT {nome} FOREIGN KEY ({coluna}) '
+        f'REFERENCES {tabela_ref}(id) ON DELETE CASCADE'
+    )
+
+
+# --- Migracoes ---
+
+def m001_schema_base(cursor):
+    """Tabelas iniciais (equivalentes ao create_all e ao DDL antigo do sync)."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS livros (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        titulo VARCHAR(255),
+        area VARCHAR(255),
+        caminho TEXT,
+        autor VARCHAR(255),
+        editora VARCHAR(255),
+        ano INT,
+        paginas INT,
+        genero VARCHAR(255),
+        idioma VARCHAR(255),
+        sinopse TEXT,
+        capa BLOB,
+        data_adicao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS usuario (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        nome VARCHAR(255) NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        senha_hash VARCHAR(255) NOT NULL,
+        is_admin BOOL NOT NULL DEFAULT FALSE,
+        created_at DATETIME NOT NULL,
+        UNIQUE INDEX ix_usuario_email (email)
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS listaleitura (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        usuario_id INT NOT NULL,
+        livro_id INT NOT NULL,
+        status VARCHAR(255) NOT NULL DEFAULT 'quero_ler',
+        data_adicao DATETIME NOT NULL,
+        FOREIGN KEY (usuario_id) REFERENCES usuario(id),
+        FOREIGN KEY (livro_id) REFERENCES livros(id)
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS anotacoes (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        usuario_id INT NOT NULL,
+        livro_id INT NOT NULL,
+        dados_json JSON,
+        updated_at DATETIME,
+        FOREIGN KEY (usuario_id) REFERENCES usuario(id),
+        FOREIGN KEY (livro_id) REFERENCES livros(id)
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS pedidos_livros (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        usuario_id INT NOT NULL,
+        titulo VARCHAR(255) NOT NULL,
+        autor VARCHAR(255) NOT NULL,
+        editora VARCHAR(255) NOT NULL,
+        status VARCHAR(255) NOT NULL DEFAULT 'pendente',
+        data_criacao DATETIME NOT NULL,
+        data_atualizacao DATETIME NOT NULL,
+        observacoes VARCHAR(255),
+        FOREIGN KEY (usuario_id) REFERENCES usuario(id)
+    )
+    ''')
+    cursor.execute(SQL_CRIAR_TABELA_VERSAO)
+    cursor.execute(SQL_SEMEAR_VERSAO)
+
+
+def m002_indices(cursor):
+    """Indices compostos/unicos das tabelas por usuario e indices das facetas."""
+    # Remove duplicatas antes das chaves unicas (mantem o registro mais recente)
+    cursor.execute('''
+    DELETE l1 FROM listaleitura l1
+    JOIN listaleitura l2
+      ON l1.usuario_id = l2.usuario_id AND l1.livro_id = l2.livro_id AND l1.id < l2.id
+    ''')
+    # updated_at pode ser NULL: o COALESCE deixa a ordem total (NULL = mais antigo,
+    # empate pelo id), senao o par NULL/nao NULL sobrevive e a chave unica falha
+    cursor.execute('''
+    DELETE a1 FROM anotacoes a1
+    JOIN anotacoes a2
+      ON a1.usuario_id = a2.usuario_id AND a1.livro_id = a2.livro_id
+     AND (COALESCE(a1.updated_at, '1970-01-01') < COALESCE(a2.updated_at, '1970-01-01')
+          OR (COALESCE(a1.updated_at, '1970-01-01') = COALESCE(a2.updated_at, '1970-01-01') AND a1.id < a2.id))
+    ''')
+
+    criar_indice(cursor, 'listaleitura', 'uq_listaleitura_usuario_livro', 'usuario_id, livro_id', unico=True)
+    criar_indice(cursor, 'anotacoes', 'uq_anotacoes_usuario_livro', 'usuario_id, livro_id', unico=True)
+    criar_indice(cursor, 'pedidos_livros', 'ix_pedidos_livros_usuario_data', 'usuario_id, data_criacao')
+    criar_indice(cursor, 'pedidos_livros', 'ix_pedidos_livros_data_criacao', 'data_criacao')
+
+    for coluna in ('genero', 'idioma', 'ano', 'area'):
+        criar_indice(cursor, 'livros', f'ix_livros_{coluna}', coluna)
+
+
+def m003_fk_cascade(cursor):
+    """Remover um livro remove junto as entradas de lista e anotacoes."""
+    recriar_fk_cascade(cursor, 'listaleitura', 'livro_id', 'livros', 'fk_listaleitura_livro')
+    recriar_fk_cascade(cursor, 'anotacoes', 'livro_id', 'livros', 'fk_anotacoes_livro')
+
+
+def m004_capas_separadas(cursor):
+    """Move as capas (BLOB em livros) para a tabela `capas`, endereçada pelo SHA-256 da imagem."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS capas (
+        hash CHAR(64) PRIMARY KEY,
+        dados MEDIUMBLOB NOT NULL,
+        tamanho INT NOT NULL,
+        criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    adicionar_coluna(cursor, 'livros', 'capa_hash', 'CHAR(64) NULL')
+    criar_indice(cursor, 'livros', 'ix_livros_capa_hash', 'capa_hash')
+
+    if not _coluna_existe(cursor, 'livros', 'capa'):
+        return
+
+    # Copia em blocos de ids para nao segurar uma transacao gigante
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM livros')
+    max_id = cursor.fetchall()[0][0]
+    bloco = 500
+    for inicio in range(0, max_id + 1, bloco):
+        fim = inicio + bloco
+        cursor.execute(
+            'INSERT IGNORE INTO capas (hash, dados, tamanho) '
+            'SELECT SHA2(capa, 256), capa, LENGTH(capa) FROM livros '
+            'WHERE capa IS NOT NULL AND id >= %s AND id < %s',
+            (inicio, fim),
+        )
+        cursor.execute(
+            'UPDATE livros SET capa_hash = SHA2(capa, 256) '
+            'WHERE capa IS NOT NULL AND id >= %s AND id < %s',
+            (inicio, fim),
+        )
+        cursor.execute('COMMIT')
+
+    cursor.execute('ALTER TABLE livros DROP COLUMN capa')
+
+
+def m005_registro_arquivos(cursor):
+    """Caminho absoluto e assinatura (tamanho/mtime/inode) do arquivo de cada livro, preenchidos pelo sync."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS livros_arquivos (
+        livro_id INT PRIMARY KEY,
+        caminho VARCHAR(1024) NOT NULL,
+        tamanho BIGINT NOT NULL,
+        mtime_ns BIGINT NOT NULL,
+        inode BIGINT NULL,
+        verificado_em DATETIME NOT NULL,
+        CONSTRAINT fk_livros_arquivos_livro FOREIGN KEY (livro_id) REFERENCES livros(id) ON DELETE CASCADE
+    )
+    ''')
+
+
+def m006_jobs(cursor):
+    """Tarefas de admin em segundo plano; `slot` unico garante uma execucao ativa por tipo."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        tipo VARCHAR(64) NOT NULL,
+        status VARCHAR(16) NOT NULL DEFAULT 'pendente',
+        slot VARCHAR(64) NULL,
+        parametros JSON,
+        checkpoint JSON,
+        progresso INT NOT NULL DEFAULT 0,
+        total INT NULL,
+        erro TEXT NULL,
+        resultado JSON,
+        dono VARCHAR(128) NULL,
+        cancelar BOOL NOT NULL DEFAULT FALSE,
+        usuario_id INT NULL,
+        criado_em DATETIME NOT NULL,
+        iniciado_em DATETIME NULL,
+        atualizado_em DATETIME NOT NULL,
+        concluido_em DATETIME NULL,
+        UNIQUE INDEX uq_jobs_slot (slot),
+        INDEX ix_jobs_status (status, atualizado_em)
+    )
+    ''')
+
+
+def m007_versao_anotacoes(cursor):
+    """Versao das anotacoes para detectar edicoes concorrentes (/annotations/sync)."""
+    adicionar_coluna(cursor, 'anotacoes', 'versao', 'INT NOT NULL DEFAULT 1')
+
+
+def m008_placeholder_capas(cursor):
+    """BlurHash da capa na linha do livro (vai inline na listagem do catalogo)."""
+    adicionar_coluna(cursor, 'livros', 'capa_blurhash', 'VARCHAR(64) NULL')
+
+
+def m009_alias_livros(cursor):
+    """Arquivos de duplicatas mescladas: o sync os conta como do livro mantido (nao reinsere)."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS livros_alias (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        livro_id INT NOT NULL,
+        caminho VARCHAR(1024) NOT NULL,
+        criado_em DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_livros_alias_livro (livro_id),
+        CONSTRAINT fk_livros_alias_livro FOREIGN KEY (livro_id) REFERENCES livros(id) ON DELETE CASCADE
+    )
+    ''')
+
+
+MIGRACOES = [
+    (1, 'schema base', m001_schema_base),
+    (2, 'indices compostos e chaves unicas', m002_indices),
+    (3, 'FKs de livro com ON DELETE CASCADE', m003_fk_cascade),
+    (4, 'capas em tabela propria enderecada por hash', m004_capas_separadas),
+    (5, 'registro de arquivos dos livros', m005_registro_arquivos),
+    (6, 'tarefas em segundo plano', m006_jobs),
+    (7, 'versao das anotacoes', m007_versao_anotacoes),
+    (8, 'placeholder das capas', m008_placeholder_capas),
+    (9, 'arquivos de duplicatas mescladas', m009_alias_livros),
+]
+
+
+# --- Execucao ---
+
+def _garantir_tabela_migracoes(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        versao INT PRIMARY KEY,
+        descricao VARCHAR(255),
+        aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+
+def versoes_aplicadas(cursor) -> set:
+    _garantir_tabela_migracoes(cursor)
+    cursor.execute('SELECT versao FROM schema_migrations')
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migracoes_pendentes(cursor) -> list:
+    """Versoes ainda nao aplicadas, sem DDL (usado pelo readiness da API)."""
+    try:
+        cursor.execute('SELECT versao FROM schema_migrations')
+        aplicadas = {row[0] for row in cursor.fetchall()}
+    except Exception:
+        # Tabela de controle ainda nao existe: banco nunca migrado
+        aplicadas = set()
+    return [versao for versao, _, _ in MIGRACOES if versao not in aplicadas]
+
+
+def aplicar_migracoes(conn, verbose: bool = True) -> list:
+    """
+    Aplica as migracoes pendentes em ordem. Seguro para varios processos ao mesmo
+    tempo (usa GET_LOCK). Retorna as versoes aplicadas nesta chamada.
+    """
+    cursor = conn.cursor()
+    aplicadas_agora = []
+    try:
+        cursor.execute('SELECT GET_LOCK(%s, 120)', (NOME_LOCK,))
+        if cursor.fetchall()[0][0] != 1:
+            raise RuntimeError('Nao foi possivel obter o lock de migracoes')
+        try:
+            aplicadas = versoes_aplicadas(cursor)
+            for versao, descricao, migracao in MIGRACOES:
+                if versao in aplicadas:
+                    continue
+                if verbose:
+                    print(f'Aplicando migracao {versao:03d}: {descricao}')
+                migracao(cursor)
+                cursor.execute(
+                    'INSERT INTO schema_migrations (versao, descricao) VALUES (%s, %s)',
+                    (versao, descricao),
+                )
+                conn.commit()
+                aplicadas_agora.append(versao)
+        finally:
+            cursor.execute('SELECT RELEASE_LOCK(%s)', (NOME_LOCK,))
+            cursor.fetchall()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return aplicadas_agora
+
+
+def conectar():
+    """Conexao mysql.connector com as mesmas variaveis usadas pelos scripts de sync."""
+    import mysql.connector
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return mysql.connector.connect(
+        host=os.getenv('HOST'),
+        user=os.getenv('USER'),
+        password=os.getenv('PASSWORD'),
+        database=os.getenv('DATABASE'),
+    )
+
+
+if __name__ == '__main__':
+    conn = conectar()
+    try:
+        if '--status' in sys.argv:
+            cursor = conn.cursor()
+            aplicadas = versoes_aplicadas(cursor)
+            cursor.close()
+            for versao, descricao, _ in MIGRACOES:
+                marca = 'x' if versao in aplicadas else ' '
+                print(f'[{marca}] {versao:03d} {descricao}')
+        else:
+            novas = aplicar_migracoes(conn)
+            print(f'Migracoes aplicadas: {novas or "nenhuma (schema atualizado)"}')
+    finally:
+        conn.close()
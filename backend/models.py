@@ -2,7 +2,7 @@
 from typing import Optional, Dict, Any, List
 from sqlmodel import Field, SQLModel
 from datetime import datetime
-from sqlalchemy import Column, JSON
+from sqlalchemy import BigInteger, Column, JSON, Index, LargeBinary, UniqueConstraint
 
 class Livro(SQLModel, table=True):
     __tablename__ = "livros"
@@ -10,17 +10,74 @@ class Livro(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     titulo: Optional[str]
     autor: Optional[str]
-    ano: Optional[int]
+    ano: Optional[int] = Field(default=None, index=True)
     editora: Optional[str]
-    genero: Optional[str]
-    area: Optional[str]
-    idioma: Optional[str]
+    genero: Optional[str] = Field(default=None, index=True)
+    area: Optional[str] = Field(default=None, index=True)
+    idioma: Optional[str] = Field(default=None, index=True)
     paginas: Optional[int]
     sinopse: Optional[str]
     caminho: Optional[str]
-    capa: Optional[bytes] = Field(default=None)  
+    # Capa fica na tabela `capas` (SHA-256 da imagem), fora da linha do livro
+    capa_hash: Optional[str] = Field(default=None, max_length=64, index=True)
+    # BlurHash da capa (lqip.py): placeholder que vai na listagem do catalogo
+    capa_blurhash: Optional[str] = Field(default=None, max_length=64)
     data_adicao: Optional[datetime] = Field(default_factory=datetime.utcnow)
-    # capa: blob is skipped for now as we don't need it for this feature yet
+
+class Capa(SQLModel, table=True):
+    __tablename__ = "capas"
+
+    hash: str = Field(primary_key=True, max_length=64)
+    dados: bytes = Field(sa_column=Column(LargeBinary(length=16 * 1024 * 1024), nullable=False))
+    tamanho: int
+    criado_em: datetime = Field(default_factory=datetime.utcnow)
+
+class LivroArquivo(SQLModel, table=True):
+    """Arquivo resolvido de cada livro (preenchido pelo sync, revalidado sob demanda)"""
+    __tablename__ = "livros_arquivos"
+
+    livro_id: int = Field(primary_key=True, foreign_key="livros.id", ondelete="CASCADE")
+    caminho: str = Field(max_length=1024)
+    tamanho: int = Field(sa_column=Column(BigInteger, nullable=False))
+    mtime_ns: int = Field(sa_column=Column(BigInteger, nullable=False))
+    inode: Optional[int] = Field(default=None, sa_column=Column(BigInteger, nullable=True))
+    verificado_em: datetime = Field(default_factory=datetime.utcnow)
+
+class LivroAlias(SQLModel, table=True):
+    """Arquivo de uma duplicata mesclada no livro (ver duplicates.mesclar_livros)"""
+    __tablename__ = "livros_alias"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    livro_id: int = Field(foreign_key="livros.id", ondelete="CASCADE", index=True)
+    caminho: str = Field(max_length=1024)
+    criado_em: datetime = Field(default_factory=datetime.utcnow)
+
+class Job(SQLModel, table=True):
+    """Tarefa de admin em segundo plano (ver jobs.py)"""
+    __tablename__ = "jobs"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tipo: str = Field(max_length=64)
+    status: str = Field(default="pendente", max_length=16, index=True)
+    # Igual a `tipo` enquanto pendente/executando e NULL depois: no maximo um ativo por tipo
+    slot: Optional[str] = Field(default=None, max_length=64, unique=True)
+    parametros: Dict[str, Any] = Field(default={}, sa_column=Column(JSON))
+    checkpoint: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
+    progresso: int = 0
+    total: Optional[int] = None
+    erro: Optional[str] = None
+    resultado: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
+    dono: Optional[str] = Field(default=None, max_length=128)
+    cancelar: bool = False
+    usuario_id: Optional[int] = None
+    criado_em: datetime = Field(default_factory=datetime.utcnow)
+    iniciado_em: Optional[datetime] = None
+    atualizado_em: datetime = Field(default_factory=datetime.utcnow)
+    concluido_em: Optional[datetime] = None
+
+class JobCreate(SQLModel):
+    tipo: str
+    parametros: Dict[str, Any] = {}
 
 class LivroRead(SQLModel):
     id: int
@@ -34,19 +91,30 @@ class LivroRead(SQLModel):
     editora: Optional[str]
     sinopse: Optional[str]
     caminho: Optional[str]
+    capa_blurhash: Optional[str] = None
 
 class LivroUpdate(SQLModel):
-    titulo: Optional[str] = None
-    autor: Optional[str] = None
-    area: Optional[str] = None
+    # max_length = VARCHAR(255) das colunas (migrations.m001): texto maior e recusado na validacao
+    titulo: Optional[str] = Field(default=None, max_length=255)
+    autor: Optional[str] = Field(default=None, max_length=255)
+    area: Optional[str] = Field(default=None, max_length=255)
     caminho: Optional[str] = None
-    editora: Optional[str] = None
+    editora: Optional[str] = Field(default=None, max_length=255)
     ano: Optional[int] = None
     paginas: Optional[int] = None
-    genero: Optional[str] = None
-    idioma: Optional[str] = None
+    genero: Optional[str] = Field(default=None, max_length=255)
+    idioma: Optional[str] = Field(default=None, max_length=255)
     sinopse: Optional[str] = None
 
+# Item da edição em lote / importação: id do livro + campos a alterar
+class LivroPatch(LivroUpdate):
+    id: int
+
+class FusaoDuplicatas(SQLModel):
+    """Um grupo do relatório de duplicatas: `remover` são fundidos em `manter`"""
+    manter: int
+    remover: List[int]
+
 # --- USUÁRIOS ---
 class Usuario(SQLModel, table=True):
     __tablename__ = "usuario"
@@ -61,10 +129,11 @@ class Usuario(SQLModel, table=True):
 # --- LISTA DE LEITURA ---
 class ListaLeitura(SQLModel, table=True):
     __tablename__ = "listaleitura" 
+    __table_args__ = (UniqueConstraint("usuario_id", "livro_id", name="uq_listaleitura_usuario_livro"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     usuario_id: int = Field(foreign_key="usuario.id")
-    livro_id: int = Field(foreign_key="livros.id") 
+    livro_id: int = Field(foreign_key="livros.id", ondelete="CASCADE") 
     status: str = Field(default="quero_ler") 
     data_adicao: datetime = Field(default_factory=datetime.utcnow)
 
@@ -85,10 +154,11 @@ class UsuarioLogin(SQLModel):
 
 class Anotacao(SQLModel, table=True):
     __tablename__ = "anotacoes"
+    __table_args__ = (UniqueConstraint("usuario_id", "livro_id", name="uq_anotacoes_usuario_livro"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     usuario_id: int = Field(foreign_key="usuario.id")
-    livro_id: int = Field(foreign_key="livros.id")
+    livro_id: int = Field(foreign_key="livros.id", ondelete="CASCADE")
     
     # Campo JSON para armazenar o objeto complexo do frontend
     dados_json: Dict[str, Any] = Field(default={}, sa_column=Column(JSON))
@@ -97,6 +167,8 @@ class Anotacao(SQLModel, table=True):
         default_factory=datetime.utcnow,
         sa_column_kwargs={"onupdate": datetime.utcnow}
     )
+    # Incrementada a cada gravação; /annotations/sync só aceita alterações feitas sobre a versão atual
+    versao: int = Field(default=1)
 
 # Modelo para validação do que o frontend envia
 class AnotacaoUpdate(SQLModel):
@@ -106,9 +178,19 @@ class AnotacaoUpdate(SQLModel):
     lastPage: Optional[int] = None
     totalPages: Optional[int] = None
 
+class AnotacaoSyncItem(SQLModel):
+    livro_id: int
+    # Versão em que a edição se baseou (0 = livro ainda sem anotações no servidor)
+    versao: int = 0
+    dados: AnotacaoUpdate
+
+class AnotacoesSync(SQLModel):
+    itens: List[AnotacaoSyncItem]
+
 # --- PEDIDOS DE LIVROS ---
 class PedidoLivro(SQLModel, table=True):
     __tablename__ = "pedidos_livros"
+    __table_args__ = (Index("ix_pedidos_livros_usuario_data", "usuario_id", "data_criacao"),)
     
     id: Optional[int] = Field(default=None, primary_key=True)
     usuario_id: int = Field(foreign_key="usuario.id")
@@ -0,0 +1,136 @@
+"""
+Cache LRU de documentos PDF abertos (pdfplumber), compartilhado pelo processo.
+
+Abrir um PDF faz o parse do xref/catalogo a cada chamada; com o documento ja
+aberto, ler a pagina seguinte custa so o parse da pagina.
+
+- Chave: caminho absoluto + tamanho + mtime (arquivo alterado = nova entrada).
+- Limites: numero de arquivos abertos e memoria estimada (tamanho dos arquivos).
+- Entradas ociosas por mais de PDF_CACHE_IDLE_SECONDS sao fechadas.
+- Cada documento tem sua trava: pdfplumber/pdfminer nao sao thread-safe.
+
+Configuracao (env): PDF_CACHE_MAX_OPEN (32), PDF_CACHE_MAX_MB (512), PDF_CACHE_IDLE_SECONDS (300).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+
+class _Documento:
+    __slots__ = ("pdf", "trava", "tamanho", "ultimo_uso", "em_uso", "descartado")
+
+    def __init__(self, pdf, tamanho: int):
+        self.pdf = pdf
+        self.trava = threading.Lock()
+        self.tamanho = tamanho
+        self.ultimo_uso = time.monotonic()
+        self.em_uso = 0
+        self.descartado = False
+
+
+class PDFHandleCache:
+    def __init__(self, max_abertos: int = 32, max_bytes: int = 512 * 1024 * 1024, ocioso_segundos: float = 300.0):
+        self.max_abertos = max_abertos
+        self.max_bytes = max_bytes
+        self.ocioso_segundos = ocioso_segundos
+        self._lock = threading.Lock()
+        self._documentos: "OrderedDict[Tuple[str, int, int], _Documento]" = OrderedDict()
+        self._bytes = 0
+        self.metricas = {"acertos": 0, "faltas": 0, "despejos": 0, "expirados": 0}
+
+    def _remover(self, chave, motivo: str):
+        """Tira a entrada do cache (com self._lock). Fecha agora ou quando o ultimo usuario soltar."""
+        doc = self._documentos.pop(chave)
+        self._bytes -= doc.tamanho
+        self.metricas[motivo] += 1
+        doc.descartado = True
+        if doc.em_uso == 0:
+            doc.pdf.close()
+
+    def _aplicar_limites(self):
+        agora = time.monotonic()
+        while self._documentos:
+            chave, doc = next(iter(self._documentos.items()))
+            if agora - doc.ultimo_uso > self.ocioso_segundos:
+                self._remover(chave, "expirados")
+            elif len(self._documentos) > self.max_abertos or self._bytes > self.max_bytes:
+                self._remover(chave, "despejos")
+            else:
+                break
+
+    @contextmanager
+    def abrir(self, file_path: str, assinatura: Optional[Tuple[int, int]] = None) -> Iterator[object]:
+        """
+        Documento aberto e travado para uso exclusivo durante o bloco `with`.
+        `assinatura` (tamanho, mtime_ns) ja conhecida evita o stat do arquivo.
+        """
+        import pdfplumber
+
+        caminho = os.path.abspath(file_path)
+        if assinatura is None:
+            st = os.stat(caminho)
+            assinatura = (st.st_size, st.st_mtime_ns)
+        chave = (caminho, *assinatura)
+
+        with self._lock:
+            doc = self._documentos.get(chave)
+            if doc is not None:
+                self._documentos.move_to_end(chave)
+                self.metricas["acertos"] += 1
+                doc.em_uso += 1
+
+        if doc is None:
+            # Abre fora da trava global: o parse inicial e a parte cara
+            pdf = pdfplumber.open(caminho)
+            with self._lock:
+                self.metricas["faltas"] += 1
+                existente = self._documentos.get(chave)
+                if existente is not None:
+                    # Outra thread abriu o mesmo arquivo ao mesmo tempo
+                    pdf.close()
+                    doc = existente
+                else:
+                    # Versoes antigas do mesmo arquivo nao serao mais pedidas
+                    for antiga in [c for c in self._documentos if c[0] == caminho]:
+                        self._remover(antiga, "despejos")
+                    doc = self._documentos[chave] = _Documento(pdf, assinatura[0])
+                    self._bytes += doc.tamanho
+                doc.em_uso += 1
+                self._aplicar_limites()
+
+        try:
+            with doc.trava:
+                yield doc.pdf
+        finally:
+            with self._lock:
+                doc.em_uso -= 1
+                doc.ultimo_uso = time.monotonic()
+                if doc.descartado and doc.em_uso == 0:
+                    doc.pdf.close()
+                self._aplicar_limites()
+
+    def limpar(self):
+        with self._lock:
+            for chave in list(self._documentos):
+                self._remover(chave, "despejos")
+
+    def estado(self) -> Dict[str, object]:
+        with self._lock:
+            consultas = self.metricas["acertos"] + self.metricas["faltas"]
+            return {
+                "abertos": len(self._documentos),
+                "bytes": self._bytes,
+                "taxa_acerto": round(self.metricas["acertos"] / consultas, 3) if consultas else None,
+                **self.metricas,
+            }
+
+
+pdf_cache = PDFHandleCache(
+    max_abertos=int(os.getenv("PDF_CACHE_MAX_OPEN", "32")),
+    max_bytes=int(os.getenv("PDF_CACHE_MAX_MB", "512")) * 1024 * 1024,
+    ocioso_segundos=float(os.getenv("PDF_CACHE_IDLE_SECONDS", "300")),
+)
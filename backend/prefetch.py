@@ -0,0 +1,267 @@
+"""
+Pre-busca das proximas paginas do leitor (texto extraido e traducao).
+
+Depois de servir a pagina N, agenda N+1..N+PREFETCH_JANELA num pool proprio e
+pequeno, separado das requisicoes. E trabalho de baixa prioridade:
+- a traducao antecipada so roda se o cliente de traducao tiver vaga sobrando
+  (PREFETCH_RESERVA_TRADUCAO vagas ficam para quem esta esperando a resposta);
+- cada usuario tem no maximo PREFETCH_POR_USUARIO paginas pendentes;
+- quando o leitor salta para longe (ou troca de livro), o que ainda nao comecou
+  e cancelado (geracao do leitor muda).
+
+Os resultados ficam num LRU por (arquivo, assinatura, pagina), entao arquivo
+alterado nao reaproveita texto antigo. Falha de traducao nao e guardada. Uma
+requisicao que chega enquanto a pagina esta sendo pre-buscada espera por ela em
+vez de repetir o trabalho. /health/prefetch mostra acertos e descartes.
+
+Configuracao (env): PREFETCH_ENABLED (1), PREFETCH_JANELA (2), PREFETCH_POR_USUARIO (4),
+PREFETCH_WORKERS (2), PREFETCH_CACHE_PAGINAS (512), PREFETCH_RESERVA_TRADUCAO (1).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+from translation import TranslationError
+
+ATIVO = os.getenv("PREFETCH_ENABLED", "1") != "0"
+JANELA = int(os.getenv("PREFETCH_JANELA", "2"))
+POR_USUARIO = int(os.getenv("PREFETCH_POR_USUARIO", "4"))
+WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+MAX_PAGINAS = int(os.getenv("PREFETCH_CACHE_PAGINAS", "512"))
+RESERVA_TRADUCAO = int(os.getenv("PREFETCH_RESERVA_TRADUCAO", "1"))
+MAX_LEITORES = 1000
+# Quanto uma requisicao espera por uma pre-busca que ja comecou antes de fazer ela mesma
+ESPERA_EM_ANDAMENTO = 30.0
+
+
+@dataclass
+class Pagina:
+    original: str
+    traducao: Optional[str] = None
+    antecipada: bool = False  # veio da pre-busca e ainda nao foi pedida
+
+
+@dataclass
+class Pendente:
+    futuro: Future = field(default_factory=Future)
+    iniciada: bool = False
+
+
+class PreBusca:
+    def __init__(self, janela: int = JANELA, por_usuario: int = POR_USUARIO, workers: int = WORKERS,
+                 max_paginas: int = MAX_PAGINAS, reserva_traducao: int = RESERVA_TRADUCAO, ativo: bool = ATIVO):
+        self.janela = janela
+        self.por_usuario = por_usuario
+        self.max_paginas = max_paginas
+        self.reserva_traducao = reserva_traducao
+        self.ativo = ativo and janela > 0
+        self._lock = threading.Lock()
+        self._paginas: "OrderedDict[tuple, Pagina]" = OrderedDict()
+        self._pendentes: dict = {}
+        # usuario -> {"doc", "pagina", "geracao", "pendentes"}
+        self._leitores: "OrderedDict[str, dict]" = OrderedDict()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch") if self.ativo else None
+        self.metricas = {
+            "consultas": 0,
+            "acertos": 0,            # respondida sem extrair nem traduzir
+            "acertos_antecipados": 0,  # ... com uma pagina que a pre-busca preparou
+            "acertos_em_andamento": 0,  # esperou uma pre-busca que ja estava rodando
+            "acertos_parciais": 0,   # texto pronto, traducao feita na hora
+            "faltas": 0,
+            "agendadas": 0,
+            "concluidas": 0,
+            "canceladas": 0,
+            "descartadas": 0,        # limite por usuario atingido
+            "sem_vaga_traducao": 0,
+            "nao_usadas": 0,         # antecipadas que sairam do cache sem serem pedidas
+            "erros": 0,
+        }
+
+    # --- Cache ---
+
+    def _contar(self, nome: str, quantidade: int = 1):
+        with self._lock:
+            self.metricas[nome] += quantidade
+
+    def _guardar(self, chave: tuple, original: str, traducao: Optional[str], antecipada: bool):
+        with self._lock:
+            pagina = self._paginas.get(chave)
+            if pagina is None:
+                pagina = self._paginas[chave] = Pagina(original, traducao, antecipada)
+            elif traducao is not None:
+                pagina.traducao = traducao
+            self._paginas.move_to_end(chave)
+            while len(self._paginas) > self.max_paginas:
+                _, removida = self._paginas.popitem(last=False)
+                if removida.antecipada:
+                    self.metricas["nao_usadas"] += 1
+
+    @staticmethod
+    def _traduzir(translation_service, texto: str) -> Optional[str]:
+        """Traducao ou None em caso de falha (falha nao vai para o cache)."""
+        if not texto.strip():
+            return ""
+        try:
+            return translation_service.client.translate(texto)
+        except TranslationError as e:
+            print(f"Translation error: {e}")
+            return None
+
+    # --- Requisicao ---
+
+    def servir(self, usuario: str, doc_id: int, arquivo, pagina: int, total_paginas: Optional[int],
+               pdf_service, translation_service, traduzir: bool = True) -> Tuple[str, Optional[str]]:
+        """
+        Texto original e traducao (None se a traducao falhou ou `traduzir` e falso)
+        da pagina, usando o que a pre-busca ja preparou, e agenda as proximas.
+        Chamar dentro de `com_arquivo` (arquivo com caminho e assinatura validos).
+        """
+        chave = (arquivo.caminho, arquivo.assinatura, pagina)
+        with self._lock:
+            self.metricas["consultas"] += 1
+            pronta = self._paginas.get(chave)
+            pendente = self._pendentes.get(chave) if pronta is None else None
+
+        em_andamento = False
+        if pendente is not None and pendente.iniciada:
+            try:
+                pendente.futuro.result(timeout=ESPERA_EM_ANDAMENTO)
+            except Exception:
+                pass
+            with self._lock:
+                pronta = self._paginas.get(chave)
+            em_andamento = pronta is not None
+
+        if pronta is not None and (pronta.traducao is not None or not traduzir):
+            with self._lock:
+                self.metricas["acertos"] += 1
+                if em_andamento:
+                    self.metricas["acertos_em_andamento"] += 1
+                if pronta.antecipada:
+                    self.metricas["acertos_antecipados"] += 1
+                    pronta.antecipada = False
+                self._paginas.move_to_end(chave)
+            original, traducao = pronta.original, pronta.traducao
+        else:
+            if pronta is not None:
+                self._contar("acertos_parciais")
+                pronta.antecipada = False
+                original = pronta.original
+            else:
+                self._contar("faltas")
+                original = pdf_service.extract_text(arquivo.caminho, pagina, arquivo.assinatura)
+            traducao = self._traduzir(translation_service, original) if traduzir else None
+            self._guardar(chave, original, traducao, antecipada=False)
+
+        self.agendar(usuario, doc_id, arquivo, pagina, total_paginas, pdf_service, translation_service, traduzir)
+        return original, traducao
+
+    # --- Agendamento ---
+
+    def _leitor(self, usuario: str, doc_id: int, pagina: int) -> dict:
+        leitor = self._leitores.get(usuario)
+        if leitor is None:
+            leitor = self._leitores[usuario] = {"doc": doc_id, "pagina": pagina, "geracao": 0, "pendentes": 0}
+            while len(self._leitores) > MAX_LEITORES:
+                self._leitores.popitem(last=False)
+        elif leitor["doc"] != doc_id or abs(pagina - leitor["pagina"]) > self.janela:
+            # Salto: o que estava na fila para a posicao anterior nao serve mais
+            leitor["doc"] = doc_id
+            leitor["geracao"] += 1
+        leitor["pagina"] = pagina
+        self._leitores.move_to_end(usuario)
+        return leitor
+
+    def agendar(self, usuario: str, doc_id: int, arquivo, pagina: int, total_paginas: Optional[int],
+                pdf_service, translation_service, traduzir: bool = True):
+        if not self.ativo:
+            return
+        with self._lock:
+            leitor = self._leitor(usuario, doc_id, pagina)
+            for alvo in range(pagina + 1, pagina + self.janela + 1):
+                if total_paginas and alvo > total_paginas:
+                    break
+                chave = (arquivo.caminho, arquivo.assinatura, alvo)
+                pronta = self._paginas.get(chave)
+                if (pronta is not None and (pronta.traducao is not None or not traduzir)) or chave in self._pendentes:
+                    continue
+                if leitor["pendentes"] >= self.por_usuario:
+                    self.metricas["descartadas"] += 1
+                    break
+                pendente = self._pendentes[chave] = Pendente()
+                leitor["pendentes"] += 1
+                self.metricas["agendadas"] += 1
+                self._pool.submit(
+                    self._executar, leitor, leitor["geracao"], chave, pendente,
+                    arquivo, alvo, pdf_service, translation_service, traduzir,
+                )
+
+    def _executar(self, leitor: dict, geracao: int, chave: tuple, pendente: Pendente,
+                  arquivo, pagina: int, pdf_service, translation_service, traduzir: bool):
+        try:
+            with self._lock:
+                pronta = self._paginas.get(chave)
+                if leitor["geracao"] != geracao or (pronta is not None and (pronta.traducao is not None or not traduzir)):
+                    # Leitor saltou ou a pagina ja foi servida pela propria requisicao
+                    self.metricas["canceladas"] += 1
+                    return
+                pendente.iniciada = True
+
+            original = pronta.original if pronta is not None else pdf_service.extract_text(arquivo.caminho, pagina, arquivo.assinatura)
+            traducao = None
+            if traduzir:
+                if leitor["geracao"] != geracao:
+                    self._contar("canceladas")
+                elif translation_service.client.tem_vaga(self.reserva_traducao):
+                    traducao = self._traduzir(translation_service, original)
+                else:
+                    self._contar("sem_vaga_traducao")
+            self._guardar(chave, original, traducao, antecipada=True)
+            self._contar("concluidas")
+        except Exception as e:
+            # Ex.: pagina fora do intervalo ou arquivo movido; a requisicao real trata
+            print(f"Pre-busca da pagina {pagina} falhou: {e}")
+            self._contar("erros")
+        finally:
+            with self._lock:
+                leitor["pendentes"] -= 1
+                self._pendentes.pop(chave, None)
+            pendente.futuro.set_result(None)
+
+    def estado(self) -> dict:
+        with self._lock:
+            metricas = dict(self.metricas)
+            paginas = len(self._paginas)
+            pendentes = len(self._pendentes)
+            leitores = len(self._leitores)
+        return {
+            "ativo": self.ativo,
+            "janela": self.janela,
+            "por_usuario": self.por_usuario,
+            "paginas_em_cache": paginas,
+            "pendentes": pendentes,
+            "leitores": leitores,
+            "taxa_acerto": round(metricas["acertos"] / metricas["consultas"], 3) if metricas["consultas"] else None,
+            **metricas,
+        }
+
+
+_prebusca: Optional[PreBusca] = None
+_prebusca_lock = threading.Lock()
+
+
+def get_prebusca() -> PreBusca:
+    global _prebusca
+    if _prebusca is None:
+        with _prebusca_lock:
+            if _prebusca is None:
+                _prebusca = PreBusca()
+    return _prebusca
+
+
+def estado_prebusca() -> dict:
+    return get_prebusca().estado() if _prebusca is not None else {"ativo": ATIVO, "consultas": 0}
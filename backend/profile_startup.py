@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Mede o tempo de import da API (python -X importtime) e lista os modulos mais caros.
+
+Uso:
+    python profile_startup.py                 # relatorio dos 25 modulos mais lentos
+    python profile_startup.py --top 50
+    python profile_startup.py --max-ms 1500   # sai com erro se o import total passar do limite
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+RE_LINHA = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+# Nao devem ser importados no startup (so no primeiro uso)
+PROIBIDOS_NO_STARTUP = ("pdfplumber", "pdfminer", "deep_translator", "fitz", "numpy", "scipy")
+
+
+def medir(modulo: str = "main") -> list:
+    """Retorna [(modulo, proprio_us, acumulado_us, profundidade), ...] na ordem do import."""
+    pasta = os.path.dirname(os.path.abspath(__file__))
+    processo = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=pasta,
+        capture_output=True,
+        text=True,
+    )
+    if processo.returncode != 0:
+        print(processo.stderr[-2000:])
+        raise SystemExit(f"Falha ao importar {modulo}")
+
+    linhas = []
+    for linha in processo.stderr.splitlines():
+        m = RE_LINHA.match(linha)
+        if m:
+            proprio, acumulado, recuo, nome = m.groups()
+            linhas.append((nome, int(proprio), int(acumulado), len(recuo) // 2))
+    return linhas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de import da API")
+    parser.add_argument("--modulo", default="main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--max-ms", type=float, default=None, help="limite para o import total (regressao)")
+    args = parser.parse_args()
+
+    linhas = medir(args.modulo)
+    total_us = next((acumulado for nome, _, acumulado, _ in reversed(linhas) if nome == args.modulo), 0)
+
+    print(f"Import total de '{args.modulo}': {total_us / 1000:.1f} ms ({len(linhas)} modulos)\n")
+    print(f"{'acumulado ms':>13} {'proprio ms':>11}  modulo")
+    for nome, proprio, acumulado, _ in sorted(linhas, key=lambda item: -item[2])[:args.top]:
+        print(f"{acumulado / 1000:>13.1f} {proprio / 1000:>11.1f}  {nome}")
+
+    falhas = []
+    pesados = sorted({nome.split(".")[0] for nome, _, _, _ in linhas if nome.split(".")[0] in PROIBIDOS_NO_STARTUP})
+    if pesados:
+        falhas.append(f"bibliotecas pesadas importadas no startup: {', '.join(pesados)}")
+    if args.max_ms is not None and total_us / 1000 > args.max_ms:
+        falhas.append(f"import total {total_us / 1000:.1f} ms acima do limite de {args.max_ms:.0f} ms")
+
+    if falhas:
+        print()
+        for falha in falhas:
+            print(f"REGRESSAO: {falha}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,86 @@
-from fastapi import APIRouter, Depends, HTTPException, Body, Response
-from fastapi.responses import FileResponse
+import json
+import os
+import shutil
+import tempfile
+from fastapi import APIRouter, Depends, HTTPException, Body, File, Query, Request, Response, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlmodel import Session, select
-from typing import List
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional
 from datetime import datetime
-from database import get_session
-from models import Usuario, UsuarioCreate, UsuarioLogin, ListaLeitura, ListaLeituraUpdate, Livro, Anotacao, AnotacaoUpdate, LivroRead, LivroUpdate, PedidoLivro, PedidoLivroCreate, PedidoLivroUpdate
+from database import engine, get_session, upsert
+from models import Usuario, UsuarioCreate, UsuarioLogin, ListaLeitura, ListaLeituraUpdate, Livro, Capa, Anotacao, AnotacaoUpdate, AnotacoesSync, LivroRead, LivroUpdate, LivroPatch, PedidoLivro, PedidoLivroCreate, PedidoLivroUpdate, Job, JobCreate, FusaoDuplicatas
 from services import get_pdf_service, get_translation_service, PDFService, TranslationService
 from auth import get_password_hash, verify_password, create_access_token, get_current_user
+from catalog import get_catalog_snapshot, get_catalog_facets, get_catalog_version, bump_catalog_version, etag_matches
+from areas import get_area_subtree
+from catalog_import import aplicar_patches, detectar_formato, importar_metadados
+from book_search import get_indice_livro
+from content_index import get_indice_conteudo
+from similar_books import get_indice_similares
+from translation_stream import traduzir_em_fluxo
+from file_registry import com_arquivo, resolver_arquivo
+from jobs import pedir_cancelamento, submeter_job
+from duplicates import carregar_relatorio, mesclar_grupos
+from prefetch import get_prebusca
+from cover_batch import comprimir, etag_pacote, ler_ids, montar_pacote
+from admission import identificar_usuario
 
 router = APIRouter()
 
 @router.get("/documents", response_model=List[LivroRead])
-def list_documents(session: Session = Depends(get_session)):
-    return session.exec(select(Livro)).all()
+def list_documents(request: Request, session: Session = Depends(get_session)):
+    # Snapshot pre-serializado por versao do catalogo (ETag/304, gzip/br)
+    return get_catalog_snapshot(session).response(request)
+
+@router.get("/documents/facets")
+def get_document_facets(
+    q: Optional[str] = None,
+    genero: Optional[str] = None,
+    idioma: Optional[str] = None,
+    area: Optional[str] = None,
+    decada: Optional[int] = None,
+    session: Session = Depends(get_session)
+):
+    """Contagens por gênero, idioma, década e área (opcionalmente filtradas pela busca atual)"""
+    return get_catalog_facets(session, q=q, genero=genero, idioma=idioma, area=area, decada=decada)
+
+@router.get("/documents/areas")
+def get_document_areas(
+    caminho: Optional[str] = None,
+    profundidade: int = Query(default=1, ge=0, le=10),
+    session: Session = Depends(get_session)
+):
+    """Árvore de áreas com contagem de livros; use `caminho` para expandir uma subárvore"""
+    return get_area_subtree(session, caminho=caminho, profundidade=profundidade)
+
+@router.get("/documents/covers")
+def get_covers(ids: str, request: Request, session: Session = Depends(get_session)):
+    """
+    Capas de vários livros em NDJSON (uma linha por id, imagem em base64; `hash` nulo
+    = sem capa). Até 100 ids por chamada; ETag pela versão do catálogo, pelos ids
+    e pela codificação do corpo.
+    """
+    try:
+        lista_ids = ler_ids(ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"ids inválidos: {e}")
+
+    encoding = "gzip" if "gzip" in request.headers.get("accept-encoding", "").lower() else "identity"
+    headers = {
+        "ETag": etag_pacote(get_catalog_version(session), lista_ids, encoding),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    corpo = montar_pacote(session, lista_ids)
+    if encoding == "gzip":
+        corpo = comprimir(corpo)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=corpo, media_type="application/x-ndjson", headers=headers)
 
 @router.get("/documents/{doc_id}/file")
 def get_document_file(
@@ -24,9 +92,13 @@ def get_document_file(
     if not livro:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # Assuming 'caminho' contains the filename
-    file_path = pdf_service.get_file_path(livro.caminho)
-    return FileResponse(file_path, media_type="application/pdf", filename=livro.caminho)
+    # O stat feito aqui e reaproveitado pela FileResponse; se falhar, o registro e revalidado
+    return com_arquivo(
+        session, livro, pdf_service,
+        lambda arquivo: FileResponse(
+            arquivo.caminho, media_type="application/pdf", filename=livro.caminho, stat_result=os.stat(arquivo.caminho)
+        ),
+    )
 
 @router.get("/documents/{doc_id}/details", response_model=LivroRead)
 def get_book_details(
@@ -67,14 +139,141 @@ def update_book(
         setattr(livro, key, value)
     
     session.add(livro)
+    bump_catalog_version(session)
     session.commit()
     
     return {"message": "Livro atualizado com sucesso", "livro": LivroRead.model_validate(livro)}
 
+@router.get("/documents/{doc_id}/search")
+def search_in_book(
+    doc_id: int,
+    q: str = Query(..., min_length=1, max_length=200),
+    limite: int = Query(default=50, ge=1, le=500),
+    session: Session = Depends(get_session),
+    pdf_service: PDFService = Depends(get_pdf_service)
+):
+    """Busca dentro do livro: páginas com ocorrências, trechos e offsets para destaque"""
+    livro = session.get(Livro, doc_id)
+    if not livro:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    arquivo = resolver_arquivo(session, livro, pdf_service)
+    indice = get_indice_livro(pdf_service, arquivo.caminho)
+    return {"q": q, "total_paginas_livro": len(indice.paginas), **indice.buscar(q, limite=limite)}
+
+@router.get("/documents/{doc_id}/similar")
+def similar_books(
+    doc_id: int,
+    limite: int = Query(default=10, ge=1, le=50),
+    session: Session = Depends(get_session)
+):
+    """Livros parecidos (TF-IDF de título, autor, área, gênero e sinopse), pré-calculados por versão do catálogo"""
+    if not session.get(Livro, doc_id):
+        raise HTTPException(status_code=404, detail="Livro não encontrado")
+
+    # Responde com o índice atual; a reconstrução é agendada pelo executor de jobs
+    # quando a versão do catálogo muda (rota pública não cria jobs)
+    indice = get_indice_similares()
+    if indice is None:
+        raise HTTPException(status_code=503, detail="Índice de livros semelhantes ainda não foi gerado")
+
+    # Pede alguns a mais: livros removidos depois do último rebuild são descartados
+    vizinhos = indice.vizinhos(doc_id, limite=limite * 2)
+    ids = [livro_id for livro_id, _ in vizinhos]
+    livros = {
+        livro_id: (titulo, autor, area)
+        for livro_id, titulo, autor, area in session.exec(
+            select(Livro.id, Livro.titulo, Livro.autor, Livro.area).where(Livro.id.in_(ids))
+        ).all()
+    } if ids else {}
+
+    itens = []
+    for livro_id, score in vizinhos:
+        if livro_id not in livros:
+            continue
+        titulo, autor, area = livros[livro_id]
+        itens.append({"id": livro_id, "titulo": titulo, "autor": autor, "area": area, "score": score})
+    return {"id": doc_id, "versao": indice.versao, "resultados": itens[:limite]}
+
+@router.get("/search/content")
+def search_library_content(
+    q: str = Query(..., min_length=1, max_length=200),
+    limite: int = Query(default=20, ge=1, le=100),
+    session: Session = Depends(get_session)
+):
+    """Busca no texto de toda a biblioteca: livros ranqueados (BM25) e páginas com mais ocorrências"""
+    indice = get_indice_conteudo()
+    if indice is None:
+        raise HTTPException(status_code=503, detail="Índice de conteúdo ainda não foi gerado")
+
+    # Pede alguns a mais: livros removidos depois do último rebuild são descartados
+    resultados = indice.buscar(q, limite=limite * 2)
+    ids = [r["livro_id"] for r in resultados]
+    livros = {
+        livro_id: (titulo, autor)
+        for livro_id, titulo, autor in session.exec(
+            select(Livro.id, Livro.titulo, Livro.autor).where(Livro.id.in_(ids))
+        ).all()
+    } if ids else {}
+
+    itens = []
+    for r in resultados:
+        if r["livro_id"] not in livros:
+            continue
+        titulo, autor = livros[r["livro_id"]]
+        itens.append({"id": r["livro_id"], "titulo": titulo, "autor": autor, **{k: v for k, v in r.items() if k != "livro_id"}})
+    return {"q": q, "total": len(itens[:limite]), "resultados": itens[:limite]}
+
+MAX_PATCHES_POR_REQUISICAO = 5000
+
+@router.put("/documents/batch-update")
+def batch_update_books(
+    patches: List[LivroPatch],
+    current_user: Usuario = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Atualiza metadados de vários livros de uma vez (apenas admin)"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Acesso negado. Apenas administradores.")
+    if len(patches) > MAX_PATCHES_POR_REQUISICAO:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_PATCHES_POR_REQUISICAO} livros por requisição")
+
+    resultado = aplicar_patches(session, patches)
+    return {"message": f"{resultado['atualizados']} livros atualizados", **resultado}
+
+@router.post("/documents/import")
+def import_book_metadata(
+    arquivo: UploadFile = File(...),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Importa metadados de um CSV ou NDJSON (coluna/campo `id` obrigatório).
+    Responde em NDJSON: um evento por linha com erro e um resumo ao final.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Acesso negado. Apenas administradores.")
+
+    # Copia para um arquivo próprio: o upload pode ser fechado antes do streaming terminar
+    formato = detectar_formato(arquivo.filename)
+    temporario = tempfile.NamedTemporaryFile(delete=False, suffix=f".{formato}")
+    with temporario:
+        shutil.copyfileobj(arquivo.file, temporario)
+
+    def eventos():
+        try:
+            with open(temporario.name, "rb") as entrada, Session(engine) as session:
+                for evento in importar_metadados(session, entrada, formato=formato):
+                    yield json.dumps(evento, ensure_ascii=False, default=str) + "\n"
+        finally:
+            os.unlink(temporario.name)
+
+    return StreamingResponse(eventos(), media_type="application/x-ndjson")
+
 @router.post("/documents/{doc_id}/page/{page_number}/translate")
 def translate_page(
     doc_id: int, 
     page_number: int, 
+    request: Request,
     session: Session = Depends(get_session),
     pdf_service: PDFService = Depends(get_pdf_service),
     translation_service: TranslationService = Depends(get_translation_service)
@@ -83,9 +282,16 @@ def translate_page(
     if not livro:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    file_path = pdf_service.get_file_path(livro.caminho)
-    original_text = pdf_service.extract_text(file_path, page_number)
-    translated_text = translation_service.translate(original_text)
+    # Usa a pagina pre-buscada quando houver e agenda as proximas (prefetch.py)
+    usuario = identificar_usuario(request.scope)
+    original_text, translated_text = com_arquivo(
+        session, livro, pdf_service,
+        lambda arquivo: get_prebusca().servir(
+            usuario, doc_id, arquivo, page_number, livro.paginas, pdf_service, translation_service,
+        ),
+    )
+    if translated_text is None:
+        translated_text = "Translation failed."
     
     return {
         "original_text": original_text,
@@ -94,6 +300,44 @@ def translate_page(
     }
 
 
+@router.post("/documents/{doc_id}/page/{page_number}/translate/stream")
+async def translate_page_stream(
+    doc_id: int,
+    page_number: int,
+    request: Request,
+    session: Session = Depends(get_session),
+    pdf_service: PDFService = Depends(get_pdf_service),
+    translation_service: TranslationService = Depends(get_translation_service)
+):
+    """
+    Tradução em streaming: NDJSON por padrão, SSE com `Accept: text/event-stream`.
+    Eventos: start (texto original), chunk (um por parágrafo, na ordem em que ficam prontos) e end.
+    """
+    usuario = identificar_usuario(request.scope)
+
+    def texto_original() -> str:
+        # Consulta ao banco e extracao fora do event loop
+        livro = session.get(Livro, doc_id)
+        if not livro:
+            raise HTTPException(status_code=404, detail="Document not found")
+        # A traducao em fluxo nao passa pelo cache; so o texto original e pre-buscado
+        original, _ = com_arquivo(
+            session, livro, pdf_service,
+            lambda arquivo: get_prebusca().servir(
+                usuario, doc_id, arquivo, page_number, livro.paginas, pdf_service, translation_service, traduzir=False,
+            ),
+        )
+        return original
+
+    original_text = await run_in_threadpool(texto_original)
+
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    return StreamingResponse(
+        traduzir_em_fluxo(request, translation_service, original_text, page_number, sse=sse),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # --- 1. REGISTRO DE USUÁRIO ---
 @router.post("/auth/register", status_code=201)
 def register(user: UsuarioCreate, session: Session = Depends(get_session)):
@@ -165,10 +409,13 @@ def add_to_listold(
 
 @router.post("/my-list/add/{livro_id}")
 def add_to_list(livro_id: int, current_user: Usuario = Depends(get_current_user), session: Session = Depends(get_session)):
-    check = session.exec(select(ListaLeitura).where(ListaLeitura.usuario_id == current_user.id, ListaLeitura.livro_id == livro_id)).first()
-    if check: return {"message": "Já está na lista"}
-    novo = ListaLeitura(usuario_id=current_user.id, livro_id=livro_id)
-    session.add(novo)
+    # Upsert sem sobrescrever o status de quem já tinha o livro na lista
+    upsert(
+        session, ListaLeitura,
+        {"usuario_id": current_user.id, "livro_id": livro_id, "status": "quero_ler", "data_adicao": datetime.utcnow()},
+        chaves=("usuario_id", "livro_id"),
+        atualizar=("usuario_id",),
+    )
     session.commit()
     return {"status": "success"}
 
@@ -180,20 +427,13 @@ def update_list_status(
     current_user: Usuario = Depends(get_current_user),
     session: Session = Depends(get_session)
 ):
-    statement = select(ListaLeitura).where(
-        ListaLeitura.usuario_id == current_user.id,
-        ListaLeitura.livro_id == livro_id
+    # Se não estiver na lista, adiciona automaticamente com o status novo
+    upsert(
+        session, ListaLeitura,
+        {"usuario_id": current_user.id, "livro_id": livro_id, "status": status_data.status, "data_adicao": datetime.utcnow()},
+        chaves=("usuario_id", "livro_id"),
+        atualizar=("status",),
     )
-    item = session.exec(statement).first()
-    
-    if not item:
-        # Se não estiver na lista, adiciona automaticamente com o status novo
-        novo_item = ListaLeitura(usuario_id=current_user.id, livro_id=livro_id, status=status_data.status)
-        session.add(novo_item)
-    else:
-        item.status = status_data.status
-        session.add(item)
-        
     session.commit()
     return {"status": "success", "new_status": status_data.status}
 
@@ -254,11 +494,18 @@ def remove_from_list(
     return {"message": "Livro removido da lista", "status": "success"}
 
 @router.get("/documents/{doc_id}/cover")
-def get_cover(doc_id: int, session: Session = Depends(get_session)):
-    livro = session.get(Livro, doc_id)
-    if not livro or not livro.capa:
+def get_cover(doc_id: int, request: Request, session: Session = Depends(get_session)):
+    # Busca só os bytes da capa pelo hash; a linha do livro não carrega imagem
+    statement = select(Capa.hash, Capa.dados).join(Livro, Livro.capa_hash == Capa.hash).where(Livro.id == doc_id)
+    capa = session.exec(statement).first()
+    if not capa:
         raise HTTPException(status_code=404)
-    return Response(content=livro.capa, media_type="image/jpeg")
+
+    # Conteúdo endereçado por hash: o ETag nunca muda para a mesma imagem
+    headers = {"ETag": f'"{capa.hash}"', "Cache-Control": "public, max-age=86400"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=capa.dados, media_type="image/jpeg", headers=headers)
 
 @router.get("/documents/{doc_id}/annotations")
 def get_annotations(
@@ -274,10 +521,11 @@ def get_annotations(
     anotacao = session.exec(statement).first()
 
     if not anotacao:
-        # Se não houver nada, retorna estrutura vazia padrão
-        return {"bookmarks": [], "notes": {}, "highlights": {}}
+        # Se não houver nada, retorna estrutura vazia padrão (versão 0 = ainda não gravado)
+        return {"bookmarks": [], "notes": {}, "highlights": {}, "versao": 0}
     
-    return anotacao.dados_json
+    # `versao` é a base que o cliente envia em /annotations/sync
+    return {**anotacao.dados_json, "versao": anotacao.versao}
 
 # --- 6. SALVAR/ATUALIZAR ANOTAÇÕES ---
 @router.post("/documents/{doc_id}/annotations")
@@ -287,30 +535,104 @@ def save_annotations(
     current_user: Usuario = Depends(get_current_user),
     session: Session = Depends(get_session)
 ):
-    # Tenta encontrar um registro existente
-    statement = select(Anotacao).where(
-        Anotacao.usuario_id == current_user.id,
-        Anotacao.livro_id == doc_id
+    # Upsert atômico: evita anotações duplicadas em autosaves concorrentes.
+    # Última gravação vence; para detectar conflitos use /annotations/sync
+    upsert(
+        session, Anotacao,
+        {"usuario_id": current_user.id, "livro_id": doc_id, "dados_json": data.dict(), "updated_at": datetime.utcnow(), "versao": 1},
+        chaves=("usuario_id", "livro_id"),
+        atualizar=("dados_json", "updated_at"),
+        incrementar=("versao",),
     )
-    anotacao_db = session.exec(statement).first()
-
-    if anotacao_db:
-        # Atualiza o registro existente
-        anotacao_db.dados_json = data.dict()
-        session.add(anotacao_db)
-    else:
-        # Cria um novo registro (Primeira vez que o usuário anota neste livro)
-        nova_anotacao = Anotacao(
-            usuario_id=current_user.id,
-            livro_id=doc_id,
-            dados_json=data.dict()
-        )
-        session.add(nova_anotacao)
-
     session.commit()
     return {"message": "Anotações salvas com sucesso"}
 
 
+MAX_ITENS_SYNC = 200
+
+@router.post("/annotations/sync")
+def sync_annotations(
+    data: AnotacoesSync,
+    current_user: Usuario = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """
+    Grava as anotações alteradas de vários livros em uma transação.
+    Cada item traz a versão em que a edição se baseou; só é aceito se ainda for a
+    versão do servidor (UPDATE condicional). Em conflito nada é gravado para o
+    livro e a resposta traz os dados e a versão atuais, para o cliente mesclar e
+    reenviar. Resultado por livro: aceito, conflito ou nao_encontrado.
+    """
+    if len(data.itens) > MAX_ITENS_SYNC:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_ITENS_SYNC} livros por sincronização")
+    ids = [item.livro_id for item in data.itens]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Livro repetido na sincronização")
+
+    existentes = set(session.exec(select(Livro.id).where(Livro.id.in_(ids))).all()) if ids else set()
+    tabela = Anotacao.__table__
+    agora = datetime.utcnow()
+    resultados = {}
+    conflitos = []
+
+    # Sempre na ordem do id: duas abas com livros em comum travam as linhas na mesma
+    # ordem (em ordens diferentes o InnoDB pode abortar uma delas por deadlock)
+    for item in sorted(data.itens, key=lambda i: i.livro_id):
+        if item.livro_id not in existentes:
+            resultados[item.livro_id] = {"livro_id": item.livro_id, "status": "nao_encontrado"}
+            continue
+        dados = item.dados.dict()
+        if item.versao == 0:
+            # Primeira gravação: a chave única (usuario, livro) barra quem chegou antes
+            try:
+                with session.begin_nested():
+                    session.execute(tabela.insert().values(
+                        usuario_id=current_user.id, livro_id=item.livro_id,
+                        dados_json=dados, updated_at=agora, versao=1,
+                    ))
+                aceito = True
+            except IntegrityError:
+                aceito = False
+        else:
+            atualizados = session.execute(
+                tabela.update()
+                .where(
+                    tabela.c.usuario_id == current_user.id,
+                    tabela.c.livro_id == item.livro_id,
+                    tabela.c.versao == item.versao,
+                )
+                .values(dados_json=dados, updated_at=agora, versao=tabela.c.versao + 1)
+            ).rowcount
+            aceito = atualizados == 1
+
+        if aceito:
+            resultados[item.livro_id] = {"livro_id": item.livro_id, "status": "aceito", "versao": item.versao + 1}
+        else:
+            conflitos.append(item.livro_id)
+
+    if conflitos:
+        # Estado atual dos livros em conflito, numa consulta só. Leitura com trava
+        # (FOR UPDATE): em REPEATABLE READ uma leitura simples devolveria o snapshot
+        # do início da transação, não a versão que acabou de vencer o UPDATE
+        atuais = {
+            anotacao.livro_id: anotacao
+            for anotacao in session.exec(select(Anotacao).where(
+                Anotacao.usuario_id == current_user.id, Anotacao.livro_id.in_(conflitos),
+            ).with_for_update().execution_options(populate_existing=True)).all()
+        }
+        for livro_id in conflitos:
+            atual = atuais.get(livro_id)
+            resultados[livro_id] = {
+                "livro_id": livro_id,
+                "status": "conflito",
+                "versao": atual.versao if atual else 0,
+                "dados": atual.dados_json if atual else None,
+            }
+
+    session.commit()
+    return {"resultados": [resultados[livro_id] for livro_id in ids]}
+
+
 # --- PEDIDOS DE LIVROS ---
 
 # Criar um novo pedido
@@ -447,44 +769,142 @@ def verify_token(current_user: Usuario = Depends(get_current_user)):
     return {"status": "ok", "user": {"nome": current_user.nome, "id": current_user.id, "is_admin": current_user.is_admin}}
 
 # --- ATUALIZAR PÁGINAS DOS LIVROS ---
-@router.post("/admin/update-pages")
+@router.post("/admin/update-pages", status_code=202)
 def update_all_pages(
     current_user: Usuario = Depends(get_current_user),
-    session: Session = Depends(get_session),
-    pdf_service: PDFService = Depends(get_pdf_service)
+    session: Session = Depends(get_session)
 ):
-    """Atualiza o número de páginas de todos os livros no banco de dados"""
+    """Agenda a contagem de páginas de todos os livros (job em segundo plano)"""
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Acesso negado. Apenas administradores.")
-    
-    livros = session.exec(select(Livro)).all()
-    updated_count = 0
-    errors = []
-    
-    for livro in livros:
-        try:
-            if not livro.caminho:
-                errors.append(f"Livro {livro.id} ({livro.titulo}): sem caminho")
-                continue
-            
-            file_path = pdf_service.get_file_path(livro.caminho)
-            page_count = pdf_service.count_pages(file_path)
-            
-            livro.paginas = page_count
-            session.add(livro)
-            updated_count += 1
-            print(f"✓ Livro {livro.id} ({livro.titulo}): {page_count} páginas")
-            
-        except Exception as e:
-            error_msg = f"Livro {livro.id} ({livro.titulo}): {str(e)}"
-            errors.append(error_msg)
-            print(f"✗ {error_msg}")
-    
-    session.commit()
-    
+
+    job, criado = submeter_job(session, "paginas", usuario_id=current_user.id)
     return {
-        "message": f"Atualização concluída: {updated_count} livros atualizados",
-        "updated_count": updated_count,
-        "total_count": len(livros),
-        "errors": errors
+        "message": "Atualização agendada" if criado else "Já existe uma atualização em andamento",
+        "job_id": job.id,
+        "status": job.status,
     }
+
+
+# --- DUPLICATAS (ADMIN) ---
+MAX_GRUPOS_POR_FUSAO = 1000
+
+@router.post("/admin/duplicates/scan", status_code=202)
+def scan_duplicates(
+    limiar: float = Query(default=0.75, ge=0.3, le=1.0),
+    usar_texto: bool = Query(default=True),
+    current_user: Usuario = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Agenda a geração do relatório de duplicatas (MinHash/LSH sobre títulos e primeiras páginas)"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Acesso negado. Apenas administradores.")
+
+    job, criado = submeter_job(session, "duplicatas", {"limiar": limiar, "usar_texto": usar_texto}, usuario_id=current_user.id)
+    return {
+        "message": "Análise agendada" if criado else "Já existe uma análise em andamento",
+        "job_id": job.id,
+        "status": job.status,
+    }
+
+@router.get("/admin/duplicates")
+def get_duplicates(
+    offset: int = Query(default=0, ge=0),
+    limite: int = Query(default=50, ge=1, le=500),
+    current_user: Usuario = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Último relatório de duplicatas, paginado por grupo (livros já excluídos/fundidos são omitidos)"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Acesso negado. Apenas administradores.")
+
+    relatorio = carregar_relatorio()
+    if relatorio is None:
+        raise HTTPException(status_code=404, detail="Relatório de duplicatas ainda não foi gerado")
+
+    grupos = relatorio.pop("grupos")[offset:offset + limite]
+    ids = [livro["id"] for grupo in grupos for livro in grupo["livros"]]
+    existentes = set(session.exec(select(Livro.id).where(Livro.id.in_(ids))).all()) if ids else set()
+    pagina = []
+    for grupo in grupos:
+        livros = [livro for livro in grupo["livros"] if livro["id"] in existentes]
+        if len(livros) < 2:
+            continue
+        if grupo["sugestao_manter"] not in existentes:
+            grupo["sugestao_manter"] = livros[0]["id"]
+        pagina.append({**grupo, "livros": livros})
+    return {**relatorio, "offset": offset, "grupos": pagina}
+
+@router.post("/admin/duplicates/merge")
+def merge_duplicates(
+    grupos: List[FusaoDuplicatas],
+    current_user: Usuario = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Funde cada grupo no livro `manter`, preservando listas de leitura e anotações (um commit por grupo)"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Acesso negado. Apenas administradores.")
+    if len(grupos) > MAX_GRUPOS_POR_FUSAO:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_GRUPOS_POR_FUSAO} grupos por requisição")
+
+    resultados = mesclar_grupos(session, grupos)
+    return {
+        "fundidos": sum(1 for r in resultados if "erro" not in r),
+        "removidos": sum(r.get("removidos", 0) for r in resultados),
+        "resultados": resultados,
+    }
+
+
+# --- JOBS EM SEGUNDO PLANO (ADMIN) ---
+@router.post("/admin/jobs", status_code=202)
+def create_job(
+    dados: JobCreate,
+    current_user: Usuario = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Agenda um job (paginas, capas, sincronizacao, indice_conteudo, similares, duplicatas); devolve o ativo se já houver um do mesmo tipo"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Acesso negado. Apenas administradores.")
+    try:
+        job, criado = submeter_job(session, dados.tipo, dados.parametros, usuario_id=current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"criado": criado, "job": job}
+
+@router.get("/admin/jobs")
+def list_jobs(
+    limite: int = Query(default=50, ge=1, le=500),
+    current_user: Usuario = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Jobs mais recentes com status, progresso e erro"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Acesso negado. Apenas administradores.")
+    return session.exec(select(Job).order_by(Job.id.desc()).limit(limite)).all()
+
+@router.get("/admin/jobs/{job_id}")
+def get_job(
+    job_id: int,
+    current_user: Usuario = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Acesso negado. Apenas administradores.")
+    job = session.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+@router.post("/admin/jobs/{job_id}/cancel")
+def cancel_job(
+    job_id: int,
+    current_user: Usuario = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Cancela um job pendente ou pede a parada de um em execução (no próximo checkpoint)"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Acesso negado. Apenas administradores.")
+    job = session.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return pedir_cancelamento(session, job)
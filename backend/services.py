@@ -1,75 +1,110 @@
 import os
-import pdfplumber
-from deep_translator import GoogleTranslator
+from typing import List, Optional, Tuple
 from fastapi import HTTPException
 
+from pdf_cache import pdf_cache
+from translation import TranslationClient, TranslationError, get_translation_client
+
 class PDFService:
     def __init__(self, source_dir: str):
         self.source_dir = source_dir
 
     def get_file_path(self, filename: str) -> str:
-        print(f"DEBUG: Resolving path for filename: {filename}")
+        """
+        Resolves a path stored in the database. Routes should prefer the file
+        registry (file_registry.resolver_arquivo), which avoids these probes.
+        """
         # Check if the filename is actually an absolute path and exists
         if os.path.isabs(filename) and os.path.exists(filename):
-            print(f"DEBUG: Found absolute path: {filename}")
             return filename
             
         # Fallback to source_dir if it's just a filename or relative path
         file_path = os.path.join(self.source_dir, filename)
-        print(f"DEBUG: Checking constructed path: {file_path}")
         
         if not os.path.exists(file_path):
-            print(f"DEBUG: File not found at: {file_path}")
             # Try to handle cases where the DB path might be from a different OS or mount
             # For now, we just raise 404
             raise HTTPException(status_code=404, detail=f"PDF file not found: {filename}")
         
-        print(f"DEBUG: File found at: {file_path}")
         return file_path
 
-    def extract_text(self, file_path: str, page_number: int) -> str:
+    def extract_text(self, file_path: str, page_number: int, assinatura: Optional[Tuple[int, int]] = None) -> str:
         """
         Extracts text from a specific page number (1-indexed).
+        `assinatura` (size, mtime_ns) from the file registry skips the stat call.
         """
         try:
-            with pdfplumber.open(file_path) as pdf:
+            # Reuses the open document: consecutive pages only pay the page parse
+            with pdf_cache.abrir(file_path, assinatura) as pdf:
                 # pdfplumber pages are 0-indexed
                 if page_number < 1 or page_number > len(pdf.pages):
                     raise HTTPException(status_code=404, detail="Page number out of range")
                 
                 page = pdf.pages[page_number - 1]
                 text = page.extract_text()
+                # Keeps the document cached but drops this page's parsed objects
+                page.close()
                 return text or ""
+        except (HTTPException, FileNotFoundError):
+            # FileNotFoundError lets the file registry re-validate the path
+            raise
         except Exception as e:
             print(f"Error reading PDF: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to process PDF: {str(e)}")
 
-    def count_pages(self, file_path: str) -> int:
+    def extract_all_text(self, file_path: str) -> List[str]:
         """
-        Returns the total number of pages in the PDF.
+        Extracts the text of every page, in order (index 0 = page 1).
         """
+        # Imported on first use: pdfplumber/pdfminer add noticeable import time to startup
+        import pdfplumber
+
         try:
             with pdfplumber.open(file_path) as pdf:
+                textos = []
+                for page in pdf.pages:
+                    textos.append(page.extract_text() or "")
+                    # Releases the parsed objects of this page before the next one
+                    page.close()
+                return textos
+        except Exception as e:
+            print(f"Error reading PDF: {e}")
+            raise HTTPException(status_code=500, detail=f"Failed to process PDF: {str(e)}")
+
+    def count_pages(self, file_path: str, assinatura: Optional[Tuple[int, int]] = None) -> int:
+        """
+        Returns the total number of pages in the PDF.
+        """
+        try:
+            with pdf_cache.abrir(file_path, assinatura) as pdf:
                 return len(pdf.pages)
+        except FileNotFoundError:
+            raise
         except Exception as e:
             print(f"Error counting PDF pages: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to count PDF pages: {str(e)}")
 
 class TranslationService:
-    def __init__(self):
-        self.translator = GoogleTranslator(source='auto', target='pt')
+    def __init__(self, client: Optional[TranslationClient] = None):
+        # Shared process-wide client: concurrency cap, timeouts, retries and circuit breaker
+        self.client = client or get_translation_client()
 
     def translate(self, text: str) -> str:
         if not text or not text.strip():
             return ""
         try:
-            # deep-translator handles text splitting internally usually, but for very large texts 
-            # we might need to be careful. For single pages it should be fine.
-            return self.translator.translate(text)
-        except Exception as e:
+            return self.client.translate(text)
+        except TranslationError as e:
             print(f"Translation error: {e}")
             return "Translation failed."
 
+    def translate_batch(self, texts: List[str]) -> List[str]:
+        """
+        Translates several texts, grouping them per upstream call when the backend allows.
+        Raises TranslationError on failure.
+        """
+        return self.client.translate_batch(texts)
+
 # Singleton instances or dependency injection could be used.
 # For simplicity, we initialize them here, but PDF_SOURCE_DIR needs to be loaded from env.
 def get_pdf_service():
@@ -78,5 +113,10 @@ def get_pdf_service():
         raise HTTPException(status_code=500, detail="PDF_SOURCE_DIR not configured")
     return PDFService(source_dir)
 
+_translation_service: Optional[TranslationService] = None
+
 def get_translation_service():
-    return TranslationService()
+    global _translation_service
+    if _translation_service is None:
+        _translation_service = TranslationService()
+    return _translation_service
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Livros semelhantes: TF-IDF sobre os metadados (titulo, autor, area, genero, sinopse)
+e os K vizinhos mais proximos (cosseno) de cada livro calculados de antemao.
+
+Layout em SIMILAR_BOOKS_DIR:
+    CURRENT              {"versao": <versao do catalogo>, "geracao": "gen-<assinatura>"}
+    gen-<assinatura>/
+        linhas.npy       int32 [max_id + 1]: livro_id -> linha (-1 = livro sem linha)
+        vizinhos.npy     int32 [livros, K]: ids dos K mais parecidos (-1 = vazio)
+        scores.npy       float32 [livros, K]: similaridade do cosseno
+
+Os .npy sao abertos com mmap_mode="r": todos os workers compartilham as mesmas
+paginas do page cache e cada consulta le uma unica linha (O(k)).
+
+A geracao e nomeada pela assinatura dos metadados usados. Quando o catalogo muda
+sem mexer nesses campos (ex.: contagem de paginas), so CURRENT e atualizado; quando
+mudam, a matriz e refeita com multiplicacoes esparsas em lotes de linhas (o IDF e
+global, entao qualquer alteracao pode mexer nos vizinhos de todos). O executor de
+jobs agenda o job "similares" quando a versao do catalogo passa a do indice; sem
+executor (JOBS_ENABLED=0), rodar este script ou pedir o job em /admin/jobs.
+
+Configuracao (env): SIMILAR_BOOKS_DIR, SIMILAR_BOOKS_K (20), SIMILAR_BOOKS_LOTE (512),
+SIMILAR_BOOKS_MEMORIA_MB (256, limite do que cada lote aloca: produto e temporarios
+da selecao).
+
+Uso:
+    python similar_books.py
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import unicodedata
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from area_path import juntar_area, partes_area
+from book_search import RE_TOKEN
+
+SIMILAR_DIR = os.getenv("SIMILAR_BOOKS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "similares"))
+K = int(os.getenv("SIMILAR_BOOKS_K", "20"))
+LOTE = int(os.getenv("SIMILAR_BOOKS_LOTE", "512"))
+MEMORIA_LOTE = int(os.getenv("SIMILAR_BOOKS_MEMORIA_MB", "256")) * 1024 * 1024
+GERACOES_MANTIDAS = 2
+TAMANHO_MINIMO_TERMO = 3
+
+# Peso de cada campo no vetor do livro
+PESOS = {"titulo": 2.0, "autor": 1.0, "sinopse": 1.0}
+PESO_CATEGORIA = {"autor": 2.0, "area": 1.5, "genero": 1.5}
+
+
+# --- Construcao ---
+
+def normalizar(texto: str) -> str:
+    """Minusculas e sem acentos (sem a preservacao de offsets de book_search.normalizar, bem mais lenta)."""
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def _palavras(texto: Optional[str]) -> List[str]:
+    return [t for t in RE_TOKEN.findall(normalizar(texto or "")) if len(t) >= TAMANHO_MINIMO_TERMO and not t.isdigit()]
+
+
+def termos_do_livro(titulo, autor, area, genero, sinopse) -> Counter:
+    """Palavras dos campos de texto mais termos de categoria inteiros (autor, area e cada nivel dela, genero)."""
+    termos = Counter()
+    for campo, texto in (("titulo", titulo), ("autor", autor), ("sinopse", sinopse)):
+        for palavra in _palavras(texto):
+            termos[palavra] += PESOS[campo]
+
+    if autor and autor.strip():
+        termos[f"autor={normalizar(autor.strip())}"] += PESO_CATEGORIA["autor"]
+    if genero and genero.strip():
+        termos[f"genero={normalizar(genero.strip())}"] += PESO_CATEGORIA["genero"]
+    if area and area.strip():
+        # "Direito / Penal" -> area=direito e area=direito / penal
+        niveis = partes_area(normalizar(area))
+        for i in range(1, len(niveis) + 1):
+            termos["area=" + juntar_area(niveis[:i])] += PESO_CATEGORIA["area"]
+    return termos
+
+
+def montar_matriz(livros: list):
+    """
+    `livros`: [(id, titulo, autor, area, genero, sinopse), ...]
+    Retorna a matriz CSR (livros x termos) com tf sublinear * idf, linhas normalizadas (L2).
+    """
+    import numpy as np
+    from scipy import sparse
+
+    vocabulario = {}
+    linhas, colunas, valores = [], [], []
+    for linha, (_, *campos) in enumerate(livros):
+        for termo, peso in termos_do_livro(*campos).items():
+            colunas.append(vocabulario.setdefault(termo, len(vocabulario)))
+            linhas.append(linha)
+            valores.append(peso)
+
+    n = len(livros)
+    matriz = sparse.csr_matrix(
+        (np.asarray(valores, dtype=np.float32), (np.asarray(linhas, dtype=np.int32), np.asarray(colunas, dtype=np.int32))),
+        shape=(n, max(1, len(vocabulario))),
+        dtype=np.float32,
+    )
+    matriz.data = 1.0 + np.log(matriz.data)
+    df = np.bincount(matriz.indices, minlength=matriz.shape[1]).astype(np.float32)
+    idf = np.log((1.0 + n) / (1.0 + df)) + 1.0
+    matriz = matriz.multiply(idf).tocsr()
+
+    normas = np.sqrt(np.asarray(matriz.multiply(matriz).sum(axis=1)).ravel())
+    normas[normas == 0] = 1.0
+    return sparse.diags(1.0 / normas).dot(matriz).tocsr().astype(np.float32)
+
+
+def calcular_vizinhos(matriz, k: int = K, lote: int = LOTE, progresso=None):
+    """
+    Top-k por linha (sem a propria). Multiplica um lote de linhas pela matriz inteira
+    e escolhe os k maiores com argpartition sobre o bloco denso; o lote e reduzido
+    para tudo o que e alocado por lote caber em SIMILAR_BOOKS_MEMORIA_MB.
+    """
+    import numpy as np
+
+    n = matriz.shape[0]
+    vizinhos = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    kk = min(k, n - 1)
+    if kk <= 0:
+        return vizinhos, scores
+
+    # Bytes por linha do lote no pior caso (produto quase denso): produto esparso
+    # (float32 + indice int64) enquanto vira denso (float32); depois o denso mais os
+    # indices int64 do argpartition. O vocabulario nao entra: nada e densificado por termo
+    por_linha = 16 * n
+    lote = max(1, min(lote, MEMORIA_LOTE // por_linha))
+    for inicio in range(0, n, lote):
+        fim = min(n, inicio + lote)
+        # esparsa (n x termos) @ esparsa (termos x lote); a transposta do produto ja
+        # sai densa e contigua (lote x n)
+        produto = matriz @ matriz[inicio:fim].T
+        bloco = produto.T.toarray()
+        del produto
+        bloco[np.arange(fim - inicio), np.arange(inicio, fim)] = 0.0
+        # Os kk maiores ficam no fim da particao (sem alocar `-bloco`)
+        escolhidos = np.argpartition(bloco, -kk, axis=1)[:, -kk:]
+        valores = np.take_along_axis(bloco, escolhidos, axis=1)
+        ordem = np.argsort(-valores, axis=1, kind="stable")
+        escolhidos = np.take_along_axis(escolhidos, ordem, axis=1)
+        valores = np.take_along_axis(valores, ordem, axis=1)
+        validos = valores > 0
+        vizinhos[inicio:fim, :kk] = np.where(validos, escolhidos, -1)
+        scores[inicio:fim, :kk] = np.where(validos, valores, 0.0)
+        if progresso:
+            progresso(fim, n)
+    return vizinhos, scores
+
+
+def _assinatura(livros: list) -> str:
+    h = hashlib.sha1(f"k={K}|{sorted(PESOS.items())}|{sorted(PESO_CATEGORIA.items())}".encode("utf-8"))
+    for livro in livros:
+        h.update(json.dumps(livro, ensure_ascii=False, default=str).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _gravar_current(versao: int, geracao: str):
+    temporario = os.path.join(SIMILAR_DIR, "CURRENT.tmp")
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump({"versao": versao, "geracao": geracao}, f)
+    os.replace(temporario, os.path.join(SIMILAR_DIR, "CURRENT"))
+
+
+def _limpar_antigas(geracao_atual: str):
+    pastas = [
+        os.path.join(SIMILAR_DIR, nome) for nome in os.listdir(SIMILAR_DIR)
+        if nome.startswith("gen-") and nome != geracao_atual
+    ]
+    # Mantem as mais recentes para leitores que ainda estejam com elas abertas
+    pastas.sort(key=os.path.getmtime)
+    for antiga in pastas[:-(GERACOES_MANTIDAS - 1) or None]:
+        shutil.rmtree(antiga, ignore_errors=True)
+
+
+def reconstruir_similares(livros: list, versao: int, progresso=None) -> dict:
+    """
+    Grava (ou reaproveita) a geracao para estes metadados e aponta CURRENT para ela.
+    `progresso(feitos, total)` e chamado a cada lote de linhas calculado.
+    """
+    import numpy as np
+
+    inicio = time.perf_counter()
+    livros = sorted(livros, key=lambda livro: livro[0])
+    geracao = f"gen-{_assinatura(livros)}"
+    destino = os.path.join(SIMILAR_DIR, geracao)
+    os.makedirs(SIMILAR_DIR, exist_ok=True)
+
+    if os.path.exists(os.path.join(destino, "scores.npy")):
+        _gravar_current(versao, geracao)
+        return {"livros": len(livros), "versao": versao, "geracao": geracao, "reaproveitada": True}
+
+    ids = np.asarray([livro[0] for livro in livros], dtype=np.int32)
+    posicoes, scores = calcular_vizinhos(montar_matriz(livros), progresso=progresso)
+    # Posicao na matriz -> livro_id
+    vizinhos = np.where(posicoes >= 0, ids[posicoes], -1).astype(np.int32)
+    linhas = np.full(int(ids.max()) + 1 if len(ids) else 1, -1, dtype=np.int32)
+    linhas[ids] = np.arange(len(ids), dtype=np.int32)
+
+    temporario = f"{destino}.{os.getpid()}.tmp"
+    os.makedirs(temporario, exist_ok=True)
+    np.save(os.path.join(temporario, "linhas.npy"), linhas)
+    np.save(os.path.join(temporario, "vizinhos.npy"), vizinhos)
+    np.save(os.path.join(temporario, "scores.npy"), scores)
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(temporario, destino)
+
+    _gravar_current(versao, geracao)
+    _limpar_antigas(geracao)
+
+    resumo = {
+        "livros": len(livros),
+        "versao": versao,
+        "geracao": geracao,
+        "reaproveitada": False,
+        "segundos": round(time.perf_counter() - inicio, 1),
+    }
+    print(f"Resumo livros semelhantes: {resumo}")
+    return resumo
+
+
+def reconstruir_do_banco(progresso=None) -> dict:
+    from sqlalchemy import text
+    from sqlmodel import Session, select
+
+    from catalog_version import SQL_LER_VERSAO
+    from database import engine
+    from models import Livro
+
+    with Session(engine) as session:
+        # Versao lida antes dos livros: se mudar no meio, a proxima verificacao refaz
+        row = session.execute(text(SQL_LER_VERSAO)).first()
+        versao = int(row[0]) if row else 0
+        livros = session.exec(
+            select(Livro.id, Livro.titulo, Livro.autor, Livro.area, Livro.genero, Livro.sinopse)
+        ).all()
+    return reconstruir_similares([tuple(livro) for livro in livros], versao, progresso=progresso)
+
+
+# --- Consulta ---
+
+class IndiceSimilares:
+    def __init__(self, pasta: str, versao: int):
+        import numpy as np
+
+        self.pasta = pasta
+        self.versao = versao
+        self._linhas = np.load(os.path.join(pasta, "linhas.npy"), mmap_mode="r")
+        self._vizinhos = np.load(os.path.join(pasta, "vizinhos.npy"), mmap_mode="r")
+        self._scores = np.load(os.path.join(pasta, "scores.npy"), mmap_mode="r")
+
+    def vizinhos(self, livro_id: int, limite: int = 10) -> List[Tuple[int, float]]:
+        """[(livro_id, score), ...] do mais parecido para o menos; vazio se o livro nao esta no indice."""
+        if livro_id < 0 or livro_id >= len(self._linhas):
+            return []
+        linha = int(self._linhas[livro_id])
+        if linha < 0:
+            return []
+        ids = self._vizinhos[linha, :limite]
+        scores = self._scores[linha, :limite]
+        return [(int(i), round(float(s), 4)) for i, s in zip(ids, scores) if i >= 0]
+
+
+_leitor_lock = threading.Lock()
+_leitor = {"indice": None, "current": None, "verificado_em": 0.0}
+_reconstrucao_pedida = {"versao": None}
+INTERVALO_VERIFICACAO = 5.0
+
+
+def get_indice_similares() -> Optional[IndiceSimilares]:
+    """Geracao ativa; reabre quando CURRENT muda (verificado a cada poucos segundos)."""
+    agora = time.monotonic()
+    with _leitor_lock:
+        if agora - _leitor["verificado_em"] < INTERVALO_VERIFICACAO:
+            return _leitor["indice"]
+        _leitor["verificado_em"] = agora
+        try:
+            with open(os.path.join(SIMILAR_DIR, "CURRENT"), "r", encoding="utf-8") as f:
+                current = json.load(f)
+        except (OSError, ValueError):
+            return _leitor["indice"]
+        if current != _leitor["current"]:
+            _leitor["indice"] = IndiceSimilares(os.path.join(SIMILAR_DIR, current["geracao"]), current["versao"])
+            _leitor["current"] = current
+        return _leitor["indice"]
+
+
+def pedir_reconstrucao(session, versao: int):
+    """Agenda o job "similares" (uma vez por versao do catalogo neste worker)."""
+    from jobs import submeter_job
+
+    with _leitor_lock:
+        if _reconstrucao_pedida["versao"] == versao:
+            return
+        _reconstrucao_pedida["versao"] = versao
+    submeter_job(session, "similares")
+
+
+def agendar_se_desatualizado(session):
+    """
+    Agenda a reconstrucao se o indice esta atras da versao do catalogo. Chamado pelo
+    executor de jobs a cada ciclo (e nao pela rota publica, que so le o indice).
+    """
+    from catalog import get_catalog_version
+
+    versao = get_catalog_version(session)
+    indice = get_indice_similares()
+    if indice is None or indice.versao < versao:
+        pedir_reconstrucao(session, versao)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    reconstruir_do_banco()
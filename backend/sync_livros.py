@@ -1,7 +1,13 @@
 import os
+import time
+from typing import Optional
 import mysql.connector
 from dotenv import load_dotenv
 
+from bulk_sync import aplicar_diferencas
+from file_registry_sync import registrar_arquivos
+from migrations import aplicar_migracoes
+
 load_dotenv()
 
 HOST = os.getenv('HOST')
@@ -11,6 +17,7 @@ DATABASE = os.getenv('DATABASE')
 
 PASTA_BIBLIOTECA = os.getenv('PASTA_BIBLIOTECA', r'E:\BIBLIOTECA')
 EXTENSOES_SUPORTADAS = ('.pdf', '.epub', '.azw')
+INTERVALO_PROGRESSO = 0.25
 
 
 def normalizar_relativo(rel_path: str) -> str:
@@ -46,12 +53,24 @@ def resolver_escopo_subpasta(pasta_raiz: str, subpasta_relativa: str = '') -> tu
     return pasta_escopo, prefixo_rel
 
 
-def scan_pasta_livros(pasta_raiz: str, subpasta_relativa: str = '') -> dict:
-    """Retorna mapa rel_path -> (titulo, area, caminho_absoluto)."""
+def scan_pasta_livros(pasta_raiz: str, subpasta_relativa: str = '', progresso=None) -> dict:
+    """
+    Retorna mapa rel_path -> (titulo, area, caminho_absoluto).
+
+    `progresso(pastas, arquivos, pasta_atual)`, se informado, e chamado no maximo
+    a cada INTERVALO_PROGRESSO segundos durante a varredura e uma vez no final.
+    """
     encontrados = {}
     pasta_escopo, _ = resolver_escopo_subpasta(pasta_raiz, subpasta_relativa)
+    pastas = 0
+    ultimo_aviso = time.monotonic()
 
     for raiz, _, arquivos in os.walk(pasta_escopo):
+        pastas += 1
+        if progresso and time.monotonic() - ultimo_aviso >= INTERVALO_PROGRESSO:
+            progresso(pastas, len(encontrados), raiz)
+            ultimo_aviso = time.monotonic()
+
         arquivos_validos = [
             arq for arq in arquivos
             if arq.lower().endswith(EXTENSOES_SUPORTADAS)
@@ -68,9 +87,19 @@ def scan_pasta_livros(pasta_raiz: str, subpasta_relativa: str = '') -> dict:
             rel_norm = normalizar_relativo(rel)
             encontrados[rel_norm] = (arquivo, area, caminho_abs)
 
+    if progresso:
+        progresso(pastas, len(encontrados), pasta_escopo)
     return encontrados
 
 
+def _relativo_do_caminho(caminho: str, pasta_raiz: str) -> Optional[str]:
+    try:
+        relativo = os.path.relpath(caminho, pasta_raiz)
+    except Exception:
+        return None
+    return None if relativo.startswith('..') else relativo
+
+
 def map_db_por_relativo(cursor, pasta_raiz: str, subpasta_relativa: str = '') -> dict:
     """Retorna mapa rel_path -> (id, caminho, titulo, area) para os registros do banco."""
     cursor.execute('SELECT id, caminho, titulo, area FROM livros')
@@ -80,15 +109,9 @@ def map_db_por_relativo(cursor, pasta_raiz: str, subpasta_relativa: str = '') ->
     db_map = {}
 
     for row_id, caminho, titulo, area in rows:
-        relativo = None
-
-        if caminho:
-            try:
-                relativo = os.path.relpath(caminho, pasta_raiz)
-            except Exception:
-                relativo = None
+        relativo = _relativo_do_caminho(caminho, pasta_raiz) if caminho else None
 
-        if not relativo or relativo.startswith('..'):
+        if not relativo:
             base_area = area_para_path(area or '')
             relativo = os.path.join(base_area, titulo or '')
 
@@ -102,27 +125,43 @@ def map_db_por_relativo(cursor, pasta_raiz: str, subpasta_relativa: str = '') ->
     return db_map
 
 
-def garantir_tabela(cursor):
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS livros (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        titulo VARCHAR(255),
-        area VARCHAR(255),
-        caminho TEXT,
-        autor VARCHAR(255),
-        editora VARCHAR(255),
-        ano INT,
-        paginas INT,
-        genero VARCHAR(255),
-        idioma VARCHAR(255),
-        sinopse TEXT,
-        capa BLOB,
-        data_adicao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-
+def map_alias_por_relativo(cursor, pasta_raiz: str, subpasta_relativa: str = '') -> dict:
+    """
+    Retorna mapa rel_path -> livro_id dos arquivos de duplicatas mescladas
+    (livros_alias): continuam na pasta, mas pertencem ao livro mantido.
+    """
+    cursor.execute('SELECT livro_id, caminho FROM livros_alias')
+    rows = cursor.fetchall()
+    _, prefixo_rel = resolver_escopo_subpasta(pasta_raiz, subpasta_relativa)
 
-def sincronizar_livros(gerar_capas: bool = False, subpasta_relativa: str = ''):
+    alias_map = {}
+    for livro_id, caminho in rows:
+        relativo = _relativo_do_caminho(caminho, pasta_raiz)
+        if not relativo:
+            continue
+        rel_norm = normalizar_relativo(relativo)
+        if prefixo_rel and not (rel_norm == prefixo_rel or rel_norm.startswith(prefixo_rel + '/')):
+            continue
+        alias_map[rel_norm] = livro_id
+    return alias_map
+
+
+def calcular_diferencas(fs_map: dict, db_map: dict, alias_map: dict) -> tuple[set, set]:
+    """
+    (chaves a excluir do banco, chaves a inserir). Arquivo que e alias de um livro
+    mesclado conta como presente; alias cujo arquivo sumiu nao exclui o livro mantido.
+    """
+    fs_keys = set(fs_map.keys())
+    db_keys = set(db_map.keys())
+    return db_keys - fs_keys, fs_keys - db_keys - set(alias_map.keys())
+
+
+def sincronizar_livros(gerar_capas: bool = False, subpasta_relativa: str = '', indexar_conteudo: bool = False, tamanho_bloco: Optional[int] = None, progresso=None):
+    """
+    `progresso(feitos, total)` e chamado apos cada bloco aplicado e nas etapas
+    seguintes (capas, indice); os jobs o usam para gravar progresso e cancelar.
+    Se ele levantar excecao, os blocos ja gravados ficam (rodar de novo completa).
+    """
     if not os.path.isdir(PASTA_BIBLIOTECA):
         raise FileNotFoundError(f'Pasta da biblioteca nao encontrada: {PASTA_BIBLIOTECA}')
 
@@ -132,39 +171,42 @@ def sincronizar_livros(gerar_capas: bool = False, subpasta_relativa: str = ''):
         password=PASSWORD,
         database=DATABASE
     )
+    aplicar_migracoes(conn)
     cursor = conn.cursor()
 
     try:
-        garantir_tabela(cursor)
 
         pasta_escopo, _ = resolver_escopo_subpasta(PASTA_BIBLIOTECA, subpasta_relativa)
         print(f'Iniciando varredura em: {pasta_escopo}')
         fs_map = scan_pasta_livros(PASTA_BIBLIOTECA, subpasta_relativa=subpasta_relativa)
         db_map = map_db_por_relativo(cursor, PASTA_BIBLIOTECA, subpasta_relativa=subpasta_relativa)
+        alias_map = map_alias_por_relativo(cursor, PASTA_BIBLIOTECA, subpasta_relativa=subpasta_relativa)
 
         fs_keys = set(fs_map.keys())
         db_keys = set(db_map.keys())
 
-        para_excluir_keys = db_keys - fs_keys
-        para_inserir_keys = fs_keys - db_keys
+        para_excluir_keys, para_inserir_keys = calcular_diferencas(fs_map, db_map, alias_map)
+
+        def avisar(feitos, total):
+            print(f'Aplicando: {feitos}/{total} linhas')
+            if progresso:
+                progresso(feitos, total)
 
         ids_para_excluir = [db_map[k][0] for k in para_excluir_keys]
         registros_para_inserir = [fs_map[k] for k in para_inserir_keys]
 
-        excluidos = 0
-        inseridos = 0
-
-        if ids_para_excluir:
-            query_delete = 'DELETE FROM livros WHERE id = %s'
-            cursor.executemany('DELETE FROM listaleitura WHERE livro_id = %s', [(i,) for i in ids_para_excluir])
-            cursor.executemany('DELETE FROM anotacoes WHERE livro_id = %s', [(i,) for i in ids_para_excluir])
-            cursor.executemany(query_delete, [(i,) for i in ids_para_excluir])
-            excluidos = cursor.rowcount
+        aplicacao = aplicar_diferencas(
+            conn,
+            ids_para_excluir,
+            registros_para_inserir,
+            tamanho_bloco=tamanho_bloco,
+            progresso=lambda feitos, total: avisar(feitos, total),
+        )
+        excluidos = aplicacao['excluidos']
+        inseridos = aplicacao['inseridos']
 
-        if registros_para_inserir:
-            query_insert = 'INSERT INTO livros (titulo, area, caminho) VALUES (%s, %s, %s)'
-            cursor.executemany(query_insert, registros_para_inserir)
-            inseridos = cursor.rowcount
+        # Caminho/tamanho/mtime de cada arquivo encontrado, para as rotas nao tocarem no disco
+        registrados = registrar_arquivos(cursor, [item[2] for item in fs_map.values()])
 
         conn.commit()
 
@@ -173,13 +215,29 @@ def sincronizar_livros(gerar_capas: bool = False, subpasta_relativa: str = ''):
         print(f'Total em banco (antes): {len(db_keys)}')
         print(f'Excluidos do banco: {excluidos}')
         print(f'Inseridos no banco: {inseridos}')
+        print(f"Blocos: {aplicacao['blocos']} de ate {aplicacao['tamanho_bloco']} linhas, {aplicacao['segundos']}s ({aplicacao['linhas_por_segundo']} linhas/s)")
+        print(f'Arquivos registrados: {registrados}')
         print(f'Total em banco (esperado apos sync): {len(db_keys) - len(para_excluir_keys) + len(para_inserir_keys)}')
 
         if gerar_capas:
             from capas import gerar_capas_automaticas
-            resumo_capas = gerar_capas_automaticas()
+            resumo_capas = gerar_capas_automaticas(progresso=progresso)
             print(f'Capas apos sincronizacao: {resumo_capas}')
 
+        if indexar_conteudo:
+            # Incremental: so arquivos novos/alterados sao extraidos; removidos saem do indice
+            from content_index import reconstruir_do_banco
+            reconstruir_do_banco(progresso=progresso)
+
+        return {
+            'total_pasta': len(fs_keys),
+            'antes_banco': len(db_keys),
+            'excluidos': excluidos,
+            'inseridos': inseridos,
+            'linhas_por_segundo': aplicacao['linhas_por_segundo'],
+            'arquivos_registrados': registrados,
+        }
+
     except Exception:
         conn.rollback()
         raise
@@ -190,5 +248,6 @@ def sincronizar_livros(gerar_capas: bool = False, subpasta_relativa: str = ''):
 
 if __name__ == '__main__':
     gerar_capas_flag = os.getenv('GERAR_CAPAS_APOS_SYNC', '0').strip().lower() in ('1', 'true', 'yes', 'y')
+    indexar_flag = os.getenv('INDEXAR_CONTEUDO_APOS_SYNC', '0').strip().lower() in ('1', 'true', 'yes', 'y')
     subpasta = os.getenv('SUBPASTA_BIBLIOTECA', '')
-    sincronizar_livros(gerar_capas=gerar_capas_flag, subpasta_relativa=subpasta)
+    sincronizar_livros(gerar_capas=gerar_capas_flag, subpasta_relativa=subpasta, indexar_conteudo=indexar_flag)
@@ -0,0 +1,73 @@
+"""Fusao de duplicatas sobrevive ao proximo sync (SQLite no lugar do MySQL)."""
+
+import os
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from duplicates import mesclar_livros
+from models import Livro, LivroAlias
+from sync_livros import calcular_diferencas, map_alias_por_relativo, map_db_por_relativo, scan_pasta_livros
+
+
+@pytest.fixture
+def biblioteca(tmp_path):
+    pasta = tmp_path / "biblioteca"
+    (pasta / "Exatas").mkdir(parents=True)
+    for nome in ("Calculo.pdf", "Calculo (1).pdf", "Algebra.pdf"):
+        (pasta / "Exatas" / nome).write_bytes(b"%PDF-1.4")
+    engine = create_engine(f"sqlite:///{tmp_path / 'banco.db'}")
+    SQLModel.metadata.create_all(engine)
+    return str(pasta), engine
+
+
+def sincronizar(pasta, engine):
+    """Mesmo calculo de sync_livros.sincronizar_livros, gravando as insercoes com a Session."""
+    conexao = engine.raw_connection()
+    try:
+        cursor = conexao.cursor()
+        fs_map = scan_pasta_livros(pasta)
+        db_map = map_db_por_relativo(cursor, pasta)
+        alias_map = map_alias_por_relativo(cursor, pasta)
+    finally:
+        conexao.close()
+    para_excluir, para_inserir = calcular_diferencas(fs_map, db_map, alias_map)
+    with Session(engine) as session:
+        for chave in para_inserir:
+            titulo, area, caminho = fs_map[chave]
+            session.add(Livro(titulo=titulo, area=area, caminho=caminho))
+        session.commit()
+    return para_excluir, para_inserir
+
+
+def test_sync_depois_da_fusao_nao_reinsere_a_duplicata(biblioteca):
+    pasta, engine = biblioteca
+    _, inseridos = sincronizar(pasta, engine)
+    assert len(inseridos) == 3
+
+    with Session(engine) as session:
+        por_titulo = {livro.titulo: livro.id for livro in session.exec(select(Livro)).all()}
+        resultado = mesclar_livros(session, por_titulo["Calculo.pdf"], [por_titulo["Calculo (1).pdf"]])
+        session.commit()
+    assert resultado["removidos"] == 1 and resultado["aliases"] == 1
+
+    para_excluir, para_inserir = sincronizar(pasta, engine)
+    assert para_excluir == set() and para_inserir == set()
+    with Session(engine) as session:
+        titulos = sorted(livro.titulo for livro in session.exec(select(Livro)).all())
+        alias = session.exec(select(LivroAlias)).one()
+    assert titulos == ["Algebra.pdf", "Calculo.pdf"]
+    assert alias.livro_id == por_titulo["Calculo.pdf"]
+
+
+def test_alias_sem_arquivo_nao_exclui_o_livro_mantido(biblioteca):
+    pasta, engine = biblioteca
+    sincronizar(pasta, engine)
+    with Session(engine) as session:
+        por_titulo = {livro.titulo: livro.id for livro in session.exec(select(Livro)).all()}
+        mesclar_livros(session, por_titulo["Calculo.pdf"], [por_titulo["Calculo (1).pdf"]])
+        session.commit()
+
+    os.remove(os.path.join(pasta, "Exatas", "Calculo (1).pdf"))
+    para_excluir, para_inserir = sincronizar(pasta, engine)
+    assert para_excluir == set() and para_inserir == set()
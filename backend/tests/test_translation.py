@@ -0,0 +1,89 @@
+"""Limites e circuit breaker do TranslationClient (sem rede: backend falso)."""
+
+import threading
+import time
+
+import pytest
+
+from translation import TranslationBackend, TranslationClient, TranslationError
+
+
+class BackendControlado(TranslationBackend):
+    nome = "teste"
+
+    def __init__(self):
+        self.chamadas = 0
+        self.falhar = False
+        self.liberar = threading.Event()
+        self.liberar.set()
+
+    def translate_batch(self, textos):
+        self.chamadas += 1
+        self.liberar.wait()
+        if self.falhar:
+            raise RuntimeError("falha simulada")
+        return [f"ok:{texto}" for texto in textos]
+
+
+def esperar(condicao, limite=2.0):
+    fim = time.monotonic() + limite
+    while not condicao() and time.monotonic() < fim:
+        time.sleep(0.01)
+    return condicao()
+
+
+def test_sonda_sem_vaga_nao_trava_o_circuito():
+    backend = BackendControlado()
+    cliente = TranslationClient(backend, max_concorrencia=1, espera_fila=0.05, timeout=1.0,
+                                retentativas=0, falhas_para_abrir=1, cooldown=0.05)
+
+    backend.falhar = True
+    with pytest.raises(TranslationError):
+        cliente.translate("a")
+    assert cliente.estado()["circuito"] == "aberto"
+    time.sleep(0.06)
+
+    # Meio-aberto: a sonda nao consegue vaga e sai sem resultado
+    assert cliente._vagas.acquire(timeout=1)
+    try:
+        with pytest.raises(TranslationError, match="sobrecarregado"):
+            cliente.translate("b")
+    finally:
+        cliente._vagas.release()
+
+    # A proxima chamada vira a sonda e fecha o circuito
+    backend.falhar = False
+    assert cliente.translate("c") == "ok:c"
+    assert cliente.estado()["circuito"] == "fechado"
+    assert cliente.translate("d") == "ok:d"
+
+
+def test_timeout_mantem_a_vaga_ate_a_chamada_terminar():
+    backend = BackendControlado()
+    backend.liberar.clear()
+    cliente = TranslationClient(backend, max_concorrencia=1, espera_fila=0.05, timeout=0.05,
+                                retentativas=0, falhas_para_abrir=10, cooldown=1.0)
+
+    try:
+        with pytest.raises(TranslationError, match="sem resposta"):
+            cliente.translate("a")
+        # A thread continua presa no servico: a vaga segue ocupada
+        assert not cliente.tem_vaga()
+        with pytest.raises(TranslationError, match="sobrecarregado"):
+            cliente.translate("b")
+        assert backend.chamadas == 1
+    finally:
+        backend.liberar.set()
+
+    assert esperar(cliente.tem_vaga)
+    assert cliente.translate("c") == "ok:c"
+    assert backend.chamadas == 2
+    assert cliente.estado()["timeouts"] == 1
+
+
+def test_backend_sem_translate_batch_falha_ao_instanciar():
+    class Incompleto(TranslationBackend):
+        nome = "incompleto"
+
+    with pytest.raises(TypeError):
+        Incompleto()
@@ -0,0 +1,274 @@
+"""
+Backend de traducao compartilhado pelo processo.
+
+- Limite global de chamadas simultaneas ao tradutor (fila com tempo maximo de espera).
+- Timeout por chamada, retentativas com backoff exponencial e jitter.
+- Circuit breaker: apos N falhas seguidas, falha rapido durante o cooldown.
+- `translate_batch` agrupa varios textos por chamada quando o backend suporta.
+
+Configuracao (env):
+    TRANSLATION_BACKEND            google | local  (local = deterministico, para testes de carga offline)
+    TRANSLATION_TARGET             idioma de destino (padrao: pt)
+    TRANSLATION_MAX_CONCURRENCY    chamadas simultaneas ao tradutor (padrao: 4)
+    TRANSLATION_QUEUE_TIMEOUT      espera maxima por uma vaga, em segundos (padrao: 10)
+    TRANSLATION_TIMEOUT            timeout por chamada, em segundos (padrao: 15)
+    TRANSLATION_RETRIES            retentativas apos a primeira falha (padrao: 2)
+    TRANSLATION_BREAKER_FAILURES   falhas seguidas que abrem o circuito (padrao: 5)
+    TRANSLATION_BREAKER_COOLDOWN   segundos com o circuito aberto (padrao: 30)
+    TRANSLATION_LOCAL_LATENCY_MS   latencia simulada do backend local por 1000 caracteres (padrao: 0)
+"""
+
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from typing import List, Optional
+
+# Limite do Google Translate (deep-translator) por chamada
+MAX_CARACTERES_CHAMADA = 4500
+
+
+class TranslationError(Exception):
+    """Falha definitiva de traducao (apos retentativas, timeout de fila ou circuito aberto)."""
+
+
+class TranslationBackend(ABC):
+    nome = "base"
+    # Quantos textos podem ir em uma unica chamada ao servico
+    max_textos_por_chamada = 1
+
+    @abstractmethod
+    def translate_batch(self, textos: List[str]) -> List[str]:
+        """Uma traducao por texto, na mesma ordem."""
+
+
+class GoogleBackend(TranslationBackend):
+    nome = "google"
+
+    def __init__(self, target: str):
+        from deep_translator import GoogleTranslator
+
+        self._target = target
+        self._local = threading.local()
+        self._classe = GoogleTranslator
+
+    def _tradutor(self):
+        # GoogleTranslator guarda estado da requisicao; um por thread
+        tradutor = getattr(self._local, "tradutor", None)
+        if tradutor is None:
+            tradutor = self._local.tradutor = self._classe(source="auto", target=self._target)
+        return tradutor
+
+    def translate_batch(self, textos: List[str]) -> List[str]:
+        # Sem API de lote real: uma chamada por texto (o cliente ja divide os lotes)
+        return [self._tradutor().translate(texto) or "" for texto in textos]
+
+
+class LocalBackend(TranslationBackend):
+    """Traducao falsa e deterministica: mesmo texto, mesma saida e mesma latencia."""
+
+    nome = "local"
+    max_textos_por_chamada = 50
+
+    def __init__(self, target: str, latencia_ms_por_mil: float = 0.0):
+        self._target = target
+        self._latencia = latencia_ms_por_mil
+
+    def translate_batch(self, textos: List[str]) -> List[str]:
+        caracteres = sum(len(t) for t in textos)
+        if self._latencia:
+            time.sleep(self._latencia * caracteres / 1000 / 1000)
+        return [f"[{self._target}] {texto}" for texto in textos]
+
+
+def criar_backend(nome: str, target: str) -> TranslationBackend:
+    if nome == "local":
+        return LocalBackend(target, float(os.getenv("TRANSLATION_LOCAL_LATENCY_MS", "0")))
+    if nome == "google":
+        return GoogleBackend(target)
+    raise ValueError(f"TRANSLATION_BACKEND desconhecido: {nome}")
+
+
+class TranslationClient:
+    def __init__(
+        self,
+        backend: TranslationBackend,
+        max_concorrencia: int = 4,
+        espera_fila: float = 10.0,
+        timeout: float = 15.0,
+        retentativas: int = 2,
+        falhas_para_abrir: int = 5,
+        cooldown: float = 30.0,
+    ):
+        self.backend = backend
+        self.timeout = timeout
+        self.espera_fila = espera_fila
+        self.retentativas = retentativas
+        self.falhas_para_abrir = falhas_para_abrir
+        self.cooldown = cooldown
+
+        self.max_concorrencia = max_concorrencia
+        self._vagas = threading.BoundedSemaphore(max_concorrencia)
+        self._em_uso = 0
+        # Chamadas rodam aqui para que o timeout libere quem esperava, mesmo se o servico travar
+        self._executor = ThreadPoolExecutor(max_workers=max_concorrencia, thread_name_prefix="traducao")
+        self._lock = threading.Lock()
+        self._falhas_seguidas = 0
+        self._aberto_ate = 0.0
+        self._testando = False
+        self.metricas = {"chamadas": 0, "textos": 0, "falhas": 0, "timeouts": 0, "retentativas": 0, "rejeitadas": 0}
+
+    # --- Circuit breaker ---
+
+    def _permitir(self) -> Optional[str]:
+        """None = circuito aberto; "teste" = esta chamada e a sonda do meio-aberto; "normal" caso contrario."""
+        with self._lock:
+            if self._falhas_seguidas < self.falhas_para_abrir:
+                return "normal"
+            if time.monotonic() < self._aberto_ate or self._testando:
+                return None
+            # Meio-aberto: deixa passar uma chamada de teste
+            self._testando = True
+            return "teste"
+
+    def _desistir_do_teste(self):
+        # A sonda saiu sem resultado (ex.: sem vaga): libera para a proxima tentar
+        with self._lock:
+            self._testando = False
+
+    def _registrar(self, sucesso: bool):
+        with self._lock:
+            self._testando = False
+            if sucesso:
+                self._falhas_seguidas = 0
+                return
+            self._falhas_seguidas += 1
+            if self._falhas_seguidas >= self.falhas_para_abrir:
+                self._aberto_ate = time.monotonic() + self.cooldown
+
+    def estado(self) -> dict:
+        with self._lock:
+            aberto = self._falhas_seguidas >= self.falhas_para_abrir and time.monotonic() < self._aberto_ate
+            return {"backend": self.backend.nome, "circuito": "aberto" if aberto else "fechado", **self.metricas}
+
+    def tem_vaga(self, reserva: int = 0) -> bool:
+        """Ha vaga sobrando alem de `reserva` (usado por trabalhos de baixa prioridade, como a pre-busca)."""
+        with self._lock:
+            return self._em_uso < self.max_concorrencia - reserva
+
+    # --- Chamadas ---
+
+    def _contar(self, nome: str, quantidade: int = 1):
+        with self._lock:
+            self.metricas[nome] += quantidade
+
+    def _liberar_vaga(self, _futuro=None):
+        with self._lock:
+            self._em_uso -= 1
+        self._vagas.release()
+
+    def _chamar(self, textos: List[str]) -> List[str]:
+        ultimo_erro: Optional[Exception] = None
+        for tentativa in range(self.retentativas + 1):
+            modo = self._permitir()
+            if modo is None:
+                self._contar("rejeitadas")
+                raise TranslationError("Tradutor indisponível no momento (circuito aberto)")
+            registrado = False
+            try:
+                if tentativa:
+                    self._contar("retentativas")
+                    # Backoff exponencial com jitter completo
+                    time.sleep(random.uniform(0, min(8.0, 0.5 * 2 ** tentativa)))
+
+                if not self._vagas.acquire(timeout=self.espera_fila):
+                    self._contar("rejeitadas")
+                    raise TranslationError("Tradutor sobrecarregado, tente novamente")
+                with self._lock:
+                    self._em_uso += 1
+                    self.metricas["chamadas"] += 1
+                try:
+                    futuro = self._executor.submit(self.backend.translate_batch, textos)
+                except BaseException:
+                    self._liberar_vaga()
+                    raise
+                # A vaga so volta quando a chamada termina de fato: apos um timeout a
+                # thread continua presa no servico e ainda conta no limite
+                futuro.add_done_callback(self._liberar_vaga)
+
+                try:
+                    resultado = futuro.result(timeout=self.timeout)
+                except FuturesTimeout:
+                    # Se ainda nao comecou (fila do executor), nao chega ao servico
+                    futuro.cancel()
+                    self._contar("timeouts")
+                    ultimo_erro = TimeoutError(f"sem resposta em {self.timeout}s")
+                except Exception as e:
+                    self._contar("falhas")
+                    ultimo_erro = e
+                else:
+                    self._registrar(True)
+                    registrado = True
+                    return resultado
+                self._registrar(False)
+                registrado = True
+            finally:
+                if modo == "teste" and not registrado:
+                    self._desistir_do_teste()
+
+        raise TranslationError(f"Falha na tradução: {ultimo_erro}")
+
+    def translate_batch(self, textos: List[str]) -> List[str]:
+        """Traduz varios textos, agrupando por chamada conforme o backend permite."""
+        resultado = [""] * len(textos)
+        indices = [i for i, t in enumerate(textos) if t and t.strip()]
+        self._contar("textos", len(indices))
+
+        lote: List[int] = []
+        caracteres = 0
+
+        def enviar():
+            for i, traducao in zip(lote, self._chamar([textos[i] for i in lote])):
+                resultado[i] = traducao
+
+        for i in indices:
+            tamanho = len(textos[i])
+            if lote and (len(lote) >= self.backend.max_textos_por_chamada or caracteres + tamanho > MAX_CARACTERES_CHAMADA):
+                enviar()
+                lote, caracteres = [], 0
+            lote.append(i)
+            caracteres += tamanho
+        if lote:
+            enviar()
+        return resultado
+
+    def translate(self, texto: str) -> str:
+        return self.translate_batch([texto])[0]
+
+
+_cliente: Optional[TranslationClient] = None
+_cliente_lock = threading.Lock()
+
+
+def get_translation_client() -> TranslationClient:
+    """Instancia unica por processo, configurada pelo ambiente."""
+    global _cliente
+    if _cliente is None:
+        with _cliente_lock:
+            if _cliente is None:
+                backend = criar_backend(
+                    os.getenv("TRANSLATION_BACKEND", "google").strip().lower(),
+                    os.getenv("TRANSLATION_TARGET", "pt"),
+                )
+                _cliente = TranslationClient(
+                    backend,
+                    max_concorrencia=int(os.getenv("TRANSLATION_MAX_CONCURRENCY", "4")),
+                    espera_fila=float(os.getenv("TRANSLATION_QUEUE_TIMEOUT", "10")),
+                    timeout=float(os.getenv("TRANSLATION_TIMEOUT", "15")),
+                    retentativas=int(os.getenv("TRANSLATION_RETRIES", "2")),
+                    falhas_para_abrir=int(os.getenv("TRANSLATION_BREAKER_FAILURES", "5")),
+                    cooldown=float(os.getenv("TRANSLATION_BREAKER_COOLDOWN", "30")),
+                )
+    return _cliente
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import os
+import re
+from typing import AsyncIterator, List
+
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+
+from services import TranslationService
+
+TAMANHO_MAX_TRECHO = int(os.getenv("TRANSLATION_CHUNK_CHARS", "1200"))
+CONCORRENCIA_POR_PAGINA = int(os.getenv("TRANSLATION_STREAM_CONCURRENCY", "3"))
+INTERVALO_DESCONEXAO = 0.5
+
+RE_PARAGRAFO = re.compile(r"\n\s*\n")
+# Fim de linha depois de pontuacao final costuma ser fim de paragrafo no texto do pdfplumber
+RE_FIM_PARAGRAFO = re.compile(r"(?<=[.!?:])\n")
+RE_SENTENCA = re.compile(r"(?<=[.!?])\s+")
+
+
+def dividir_trechos(texto: str, tamanho_max: int = TAMANHO_MAX_TRECHO) -> List[str]:
+    """Divide o texto em paragrafos; os longos demais sao quebrados por sentencas."""
+    paragrafos = []
+    for bloco in RE_PARAGRAFO.split(texto or ""):
+        paragrafos.extend(p.strip() for p in RE_FIM_PARAGRAFO.split(bloco) if p.strip())
+
+    trechos = []
+    for paragrafo in paragrafos:
+        if len(paragrafo) <= tamanho_max:
+            trechos.append(paragrafo)
+            continue
+        atual = ""
+        for sentenca in RE_SENTENCA.split(paragrafo):
+            if atual and len(atual) + len(sentenca) + 1 > tamanho_max:
+                trechos.append(atual)
+                atual = ""
+            atual = f"{atual} {sentenca}" if atual else sentenca
+            # Sentenca sozinha maior que o limite: corta no tamanho
+            while len(atual) > tamanho_max:
+                trechos.append(atual[:tamanho_max])
+                atual = atual[tamanho_max:]
+        if atual:
+            trechos.append(atual)
+    return trechos
+
+
+def formatar_evento(evento: dict, sse: bool) -> str:
+    dados = json.dumps(evento, ensure_ascii=False)
+    if sse:
+        return f"event: {evento['event']}\ndata: {dados}\n\n"
+    return dados + "\n"
+
+
+async def traduzir_em_fluxo(
+    request: Request,
+    translation_service: TranslationService,
+    texto: str,
+    page_number: int,
+    sse: bool = False,
+    concorrencia: int = CONCORRENCIA_POR_PAGINA,
+) -> AsyncIterator[str]:
+    """
+    Traduz os trechos com concorrencia limitada e emite cada um assim que fica pronto
+    (fora de ordem; o cliente ordena por `index`). Se o cliente desconectar, os trechos
+    que ainda nao foram enviados ao tradutor sao cancelados.
+    """
+    trechos = dividir_trechos(texto)
+    yield formatar_evento({"event": "start", "page": page_number, "total": len(trechos), "original_text": texto}, sse)
+
+    limite = asyncio.Semaphore(max(1, concorrencia))
+
+    async def traduzir(indice: int, trecho: str) -> dict:
+        async with limite:
+            traducao = await run_in_threadpool(translation_service.translate, trecho)
+        return {"event": "chunk", "index": indice, "original_text": trecho, "translated_text": traducao}
+
+    pendentes = {asyncio.ensure_future(traduzir(i, t)) for i, t in enumerate(trechos)}
+    try:
+        while pendentes:
+            prontos, pendentes = await asyncio.wait(pendentes, timeout=INTERVALO_DESCONEXAO, return_when=asyncio.FIRST_COMPLETED)
+            for tarefa in prontos:
+                yield formatar_evento(tarefa.result(), sse)
+            if await request.is_disconnected():
+                return
+        yield formatar_evento({"event": "end", "page": page_number}, sse)
+    finally:
+        for tarefa in pendentes:
+            tarefa.cancel()
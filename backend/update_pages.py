@@ -14,6 +14,8 @@ from sqlmodel import Session, select
 from database import engine, get_session
 from models import Livro
 from services import get_pdf_service
+from file_registry import com_arquivo
+from catalog import bump_catalog_version
 
 def update_all_pages():
     """Atualiza o número de páginas de todos os livros"""
@@ -40,11 +42,11 @@ def update_all_pages():
                     skipped_count += 1
                     continue
                 
-                # Obtém o caminho do arquivo
-                file_path = pdf_service.get_file_path(livro.caminho)
-                
-                # Conta as páginas
-                page_count = pdf_service.count_pages(file_path)
+                # Conta as páginas (caminho vem do registro de arquivos)
+                page_count = com_arquivo(
+                    session, livro, pdf_service,
+                    lambda arquivo: pdf_service.count_pages(arquivo.caminho, arquivo.assinatura),
+                )
                 
                 # Atualiza o banco
                 old_pages = livro.paginas
@@ -64,6 +66,7 @@ def update_all_pages():
                 print(f"✗ {error_msg}")
         
         # Commit das alterações
+        bump_catalog_version(session)
         session.commit()
         
         # Resumo
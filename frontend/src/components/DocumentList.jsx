@@ -7,6 +7,8 @@ import {
 } from 'lucide-react';
 import api from '../services/api';
 import BookCardSkeleton from './BookCardSkeleton';
+import { estiloPlaceholder } from '../utils/blurhash';
+import { carregarCapas } from '../services/covers';
 import UserMenu from './UserMenu';
 
 const DocumentList = () => {
@@ -14,6 +16,8 @@ const DocumentList = () => {
     const [documents, setDocuments] = useState([]);
     const [myListIds, setMyListIds] = useState(new Set());
     const [myListData, setMyListData] = useState({}); // Armazena status e progresso
+    const [covers, setCovers] = useState({}); // id -> data URL da capa (null = sem capa)
+    const [versaoCatalogo, setVersaoCatalogo] = useState(''); // ETag de /documents (chave do cache de capas)
 
     // --- ESTADOS DE CONTROLE ---
     const [viewMode, setViewMode] = useState('all');
@@ -56,6 +60,7 @@ const DocumentList = () => {
             // Garantimos que os dados são um array antes de salvar
             const docs = Array.isArray(docsResponse.data) ? docsResponse.data : [];
             setDocuments(docs);
+            setVersaoCatalogo(docsResponse.headers?.etag || '');
 
             // Extração correta dos IDs da lista do usuário
             const ids = new Set();
@@ -140,12 +145,27 @@ const DocumentList = () => {
         navigate(`/document/${docId}`);
     };
 
-    // --- EXTRAI GÊNEROS ÚNICOS DOS DOCUMENTOS ---
-    // Nota: Quando tiver API de gêneros, substitua por: const availableGenres = await api.get('/genres');
-    const availableGenres = useMemo(() => {
-        const genres = new Set(documents.map(doc => doc.genero).filter(Boolean));
-        return Array.from(genres).sort();
-    }, [documents]);
+    // --- GÊNEROS (contagens vindas de /documents/facets, filtradas pela busca atual) ---
+    const [genreFacets, setGenreFacets] = useState([]);
+
+    useEffect(() => {
+        const timer = setTimeout(async () => {
+            try {
+                const params = searchTerm.trim() ? { q: searchTerm.trim() } : {};
+                const response = await api.get('/documents/facets', { params });
+                setGenreFacets(response.data.genero || []);
+            } catch (error) {
+                console.error("Erro ao buscar gêneros:", error);
+            }
+        }, 300);
+        return () => clearTimeout(timer);
+    }, [searchTerm]);
+
+    const availableGenres = useMemo(() => genreFacets.map(facet => facet.valor), [genreFacets]);
+    const genreCounts = useMemo(
+        () => Object.fromEntries(genreFacets.map(facet => [facet.valor, facet.total])),
+        [genreFacets]
+    );
 
     // --- LÓGICA DE FILTRAGEM E PAGINAÇÃO ---
     const filteredData = useMemo(() => {
@@ -177,6 +197,26 @@ const DocumentList = () => {
         return filteredData.slice(startIndex, startIndex + itemsPerPage);
     }, [filteredData, currentPage]);
 
+    // Capas da página atual em uma única requisição (/documents/covers)
+    useEffect(() => {
+        const ids = currentItems.map(doc => doc.id);
+        if (ids.length === 0) return;
+        let cancelado = false;
+        carregarCapas(ids, versaoCatalogo)
+            .then((resultado) => {
+                if (!cancelado) setCovers(prev => ({ ...prev, ...Object.fromEntries(resultado) }));
+            })
+            .catch((err) => {
+                console.error("Erro ao carregar capas", err);
+                // Sem o lote, volta para uma requisição por capa
+                if (!cancelado) setCovers(prev => ({
+                    ...prev,
+                    ...Object.fromEntries(ids.map(id => [id, `${api.defaults.baseURL}/documents/${id}/cover`])),
+                }));
+            });
+        return () => { cancelado = true; };
+    }, [currentItems, versaoCatalogo]);
+
     const getGradient = (id) => {
         const gradients = [
             "from-blue-500 to-blue-700", "from-emerald-500 to-emerald-700",
@@ -295,6 +335,7 @@ const DocumentList = () => {
                                     }`}
                                 >
                                     {genre}
+                                    <span className="ml-1 opacity-70">({genreCounts[genre]})</span>
                                 </button>
                             ))}
                         </div>
@@ -322,7 +363,7 @@ const DocumentList = () => {
                                         {currentItems.map((doc, index) => {
                                             const isInMyList = myListIds.has(doc.id);
                                             const myListItem = myListData[doc.id];
-                                            const coverUrl = `${api.defaults.baseURL}/documents/${doc.id}/cover`;
+                                            const coverUrl = covers[doc.id]; // undefined = carregando, null = sem capa
                                             const delayStyle = { animationDelay: `${index * 50}ms` };
 
                                             return (
@@ -332,21 +373,26 @@ const DocumentList = () => {
                                                     style={delayStyle}
                                                 >
                                                     
-                                                    {/* CONTAINER DA CAPA */}
-                                                    <div className="h-36 sm:h-40 md:h-44 lg:h-48 relative overflow-hidden bg-gray-200 flex items-center justify-center shadow-inner">
-                                                        <img 
-                                                            src={coverUrl} 
-                                                            alt={doc.titulo}
-                                                            className="w-full h-full object-cover transition-transform duration-300 group-hover:scale-105"
-                                                            onError={(e) => { 
-                                                                e.target.style.display = 'none'; 
-                                                                e.target.nextSibling.classList.remove('hidden');
-                                                                e.target.nextSibling.classList.add('flex');
-                                                            }}
-                                                        />
+                                                    {/* CONTAINER DA CAPA (fundo = placeholder da capa enquanto a imagem carrega) */}
+                                                    <div
+                                                        className="h-36 sm:h-40 md:h-44 lg:h-48 relative overflow-hidden bg-gray-200 flex items-center justify-center shadow-inner"
+                                                        style={estiloPlaceholder(doc.capa_blurhash)}
+                                                    >
+                                                        {coverUrl && (
+                                                            <img 
+                                                                src={coverUrl} 
+                                                                alt={doc.titulo}
+                                                                className="w-full h-full object-cover transition-transform duration-300 group-hover:scale-105"
+                                                                onError={(e) => { 
+                                                                    e.target.style.display = 'none'; 
+                                                                    e.target.nextSibling.classList.remove('hidden');
+                                                                    e.target.nextSibling.classList.add('flex');
+                                                                }}
+                                                            />
+                                                        )}
                                                         
                                                         {/* Fallback (Gradiente) */}
-                                                        <div className={`hidden absolute inset-0 bg-gradient-to-br ${getGradient(doc.id)} items-center justify-center p-6 text-center`}>
+                                                        <div className={`${coverUrl === null ? 'flex' : 'hidden'} absolute inset-0 bg-gradient-to-br ${getGradient(doc.id)} items-center justify-center p-6 text-center`}>
                                                             <h3 className="text-white font-bold text-lg drop-shadow-md leading-tight">
                                                                 {doc.titulo}
                                                             </h3>
@@ -454,7 +500,7 @@ const DocumentList = () => {
                                         {currentItems.map((doc, index) => {
                                             const isInMyList = myListIds.has(doc.id);
                                             const myListItem = myListData[doc.id];
-                                            const coverUrl = `${api.defaults.baseURL}/documents/${doc.id}/cover`;
+                                            const coverUrl = covers[doc.id]; // undefined = carregando, null = sem capa
                                             const delayStyle = { animationDelay: `${index * 30}ms` };
 
                                             return (
@@ -464,18 +510,23 @@ const DocumentList = () => {
                                                     style={delayStyle}
                                                 >
                                                     {/* Capa mini */}
-                                                    <div className="w-16 h-24 flex-shrink-0 relative overflow-hidden bg-gray-200 rounded-md">
-                                                        <img 
-                                                            src={coverUrl} 
-                                                            alt={doc.titulo}
-                                                            className="w-full h-full object-cover"
-                                                            onError={(e) => { 
-                                                                e.target.style.display = 'none'; 
-                                                                e.target.nextSibling.classList.remove('hidden');
-                                                                e.target.nextSibling.classList.add('flex');
-                                                            }}
-                                                        />
-                                                        <div className={`hidden absolute inset-0 bg-gradient-to-br ${getGradient(doc.id)} items-center justify-center`}>
+                                                    <div
+                                                        className="w-16 h-24 flex-shrink-0 relative overflow-hidden bg-gray-200 rounded-md"
+                                                        style={estiloPlaceholder(doc.capa_blurhash)}
+                                                    >
+                                                        {coverUrl && (
+                                                            <img 
+                                                                src={coverUrl} 
+                                                                alt={doc.titulo}
+                                                                className="w-full h-full object-cover"
+                                                                onError={(e) => { 
+                                                                    e.target.style.display = 'none'; 
+                                                                    e.target.nextSibling.classList.remove('hidden');
+                                                                    e.target.nextSibling.classList.add('flex');
+                                                                }}
+                                                            />
+                                                        )}
+                                                        <div className={`${coverUrl === null ? 'flex' : 'hidden'} absolute inset-0 bg-gradient-to-br ${getGradient(doc.id)} items-center justify-center`}>
                                                             <BookOpen size={20} className="text-white opacity-80" />
                                                         </div>
                                                     </div>
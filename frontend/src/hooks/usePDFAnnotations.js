@@ -1,5 +1,6 @@
 import { useState, useEffect, useRef } from 'react';
 import api from '../services/api';
+import { agendarSync, registrarVersao } from '../services/annotationSync';
 
 export const usePDFAnnotations = (docId) => {
     const [bookmarks, setBookmarks] = useState([]);
@@ -21,6 +22,7 @@ export const usePDFAnnotations = (docId) => {
                 setHighlights(response.data.highlights || {});
                 setLastPage(response.data.lastPage || 1);
                 setTotalPages(response.data.totalPages || null);
+                registrarVersao(docId, response.data.versao, response.data);
             } catch (err) {
                 console.error("Erro ao carregar anotações", err);
             }
@@ -31,14 +33,20 @@ export const usePDFAnnotations = (docId) => {
     const sync = async (updated) => {
         setIsSaving(true);
         try {
-            // Esta chamada envia o objeto JSON completo para o campo 'dados_json' no banco
-            await api.post(`/documents/${docId}/annotations`, {
+            // Envia o objeto JSON completo; a fila junta os livros alterados num único /annotations/sync
+            const resultado = await agendarSync(docId, {
                 bookmarks: updated.bookmarks ?? bookmarks,
                 notes: updated.notes ?? notes,
                 highlights: updated.highlights ?? highlights,
                 lastPage: updated.lastPage ?? lastPage,
                 totalPages: updated.totalPages ?? totalPages
             });
+            if (resultado.mesclado) {
+                // Outra aba/dispositivo gravou antes: mostra o estado mesclado que foi salvo
+                setBookmarks(resultado.dados.bookmarks);
+                setNotes(resultado.dados.notes);
+                setHighlights(resultado.dados.highlights);
+            }
         } catch (err) {
             console.error("Erro ao sincronizar com o banco:", err);
         } finally {
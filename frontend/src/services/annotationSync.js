@@ -0,0 +1,170 @@
+import api from './api';
+
+// Fila de sincronização das anotações: junta os livros alterados (várias abas/leitores)
+// e envia tudo num único POST /annotations/sync. Cada livro leva a versão do servidor em
+// que a edição se baseou; em conflito, é feita uma mescla de três vias (base conhecida,
+// servidor e local) e o resultado é reenviado na rodada seguinte.
+const ATRASO_MS = 800;
+const MAX_CONFLITOS = 3;
+// Falha do lote inteiro (rede, 429, 5xx como deadlock no banco): reenvia com espera crescente
+const MAX_FALHAS = 5;
+const MAX_ESPERA_MS = 30000;
+
+const bases = new Map();    // docId -> { versao, dados } último estado conhecido do servidor (versão 0 = sem anotações)
+const sujos = new Map();    // docId -> { dados, local, ouvintes, conflitos, falhas }
+let timer = null;
+let emAndamento = false;
+
+export const registrarVersao = (docId, versao, dados = {}) => {
+    bases.set(String(docId), { versao: versao ?? 0, dados });
+};
+
+const mesmo = (a, b) => JSON.stringify(a) === JSON.stringify(b);
+
+// Valor simples: a edição local vence só se mudou em relação à base
+const mesclarValor = (base, servidor, local) => (mesmo(local, base) ? servidor : local);
+
+const mesclarDestaques = (base = [], servidor = [], local = []) => {
+    const naBase = new Map(base.map(h => [h.id, h]));
+    const noLocal = new Map(local.map(h => [h.id, h]));
+    const doServidor = new Set(servidor.map(h => h.id));
+    return [
+        // Do servidor, menos o que foi removido aqui; alterados aqui ficam com a versão local
+        ...servidor
+            .filter(h => !(naBase.has(h.id) && !noLocal.has(h.id)))
+            .map(h => (noLocal.has(h.id) && naBase.has(h.id) && !mesmo(noLocal.get(h.id), naBase.get(h.id)) ? noLocal.get(h.id) : h)),
+        // Criados aqui
+        ...local.filter(h => !naBase.has(h.id) && !doServidor.has(h.id)),
+    ];
+};
+
+// Mescla de três vias: aplica sobre os dados do servidor só o que mudou localmente desde
+// `base` (adições, alterações e remoções). Remoções feitas em qualquer lado não voltam.
+export const mesclarAnotacoes = (base, servidor, local) => {
+    base = base || {};
+    servidor = servidor || {};
+    local = local || {};
+
+    const marcadosBase = new Set(base.bookmarks || []);
+    const marcadosLocal = new Set(local.bookmarks || []);
+    const bookmarks = [
+        ...(servidor.bookmarks || []).filter(p => !(marcadosBase.has(p) && !marcadosLocal.has(p))),
+        ...(local.bookmarks || []).filter(p => !marcadosBase.has(p) && !(servidor.bookmarks || []).includes(p)),
+    ];
+
+    const notes = {};
+    const paginasNotas = new Set([...Object.keys(servidor.notes || {}), ...Object.keys(local.notes || {})]);
+    paginasNotas.forEach((pagina) => {
+        const valor = mesclarValor((base.notes || {})[pagina], (servidor.notes || {})[pagina], (local.notes || {})[pagina]);
+        if (valor !== undefined) notes[pagina] = valor;
+    });
+
+    const highlights = {};
+    const paginasDestaques = new Set([...Object.keys(servidor.highlights || {}), ...Object.keys(local.highlights || {})]);
+    paginasDestaques.forEach((pagina) => {
+        const lista = mesclarDestaques(
+            (base.highlights || {})[pagina], (servidor.highlights || {})[pagina], (local.highlights || {})[pagina],
+        );
+        if (lista.length || (servidor.highlights || {})[pagina]) highlights[pagina] = lista;
+    });
+
+    return {
+        bookmarks,
+        notes,
+        highlights,
+        lastPage: mesclarValor(base.lastPage ?? null, servidor.lastPage ?? null, local.lastPage ?? null),
+        totalPages: mesclarValor(base.totalPages ?? null, servidor.totalPages ?? null, local.totalPages ?? null),
+    };
+};
+
+// `anterior` foi enviado e seus dados finais diferem do que a tela tinha (houve mescla):
+// a edição mais nova, feita sobre o estado da tela, recebe o que veio do servidor
+const rebasear = (novo, anterior, dadosFinais) => {
+    if (dadosFinais !== anterior.local) novo.dados = mesclarAnotacoes(anterior.local, dadosFinais, novo.dados);
+};
+
+const agendarEnvio = (atraso = ATRASO_MS) => {
+    if (!timer) timer = setTimeout(enviar, atraso);
+};
+
+const vaiRepetir = (err) => !err.response || err.response.status === 429 || err.response.status >= 500;
+
+const reenfileirar = (docId, item) => {
+    const novo = sujos.get(docId);
+    if (novo) {
+        // Chegou edição mais nova enquanto o lote estava no ar: ela já é o estado completo da tela
+        rebasear(novo, item, item.dados);
+        novo.ouvintes.push(...item.ouvintes);
+        novo.conflitos = Math.max(novo.conflitos, item.conflitos);
+        novo.falhas = Math.max(novo.falhas, item.falhas);
+    } else {
+        sujos.set(docId, item);
+    }
+};
+
+const enviar = async () => {
+    timer = null;
+    if (emAndamento || sujos.size === 0) return;
+    emAndamento = true;
+
+    const lote = new Map(sujos);
+    sujos.clear();
+    const itens = [...lote].map(([docId, item]) => ({
+        livro_id: Number(docId),
+        versao: bases.get(docId)?.versao ?? 0,
+        dados: item.dados,
+    }));
+
+    try {
+        const { data } = await api.post('/annotations/sync', { itens });
+        data.resultados.forEach((resultado) => {
+            const docId = String(resultado.livro_id);
+            const item = lote.get(docId);
+            if (resultado.status === 'aceito') {
+                bases.set(docId, { versao: resultado.versao, dados: item.dados });
+                const novo = sujos.get(docId);
+                if (novo) rebasear(novo, item, item.dados);
+                item.ouvintes.forEach(({ resolve }) => resolve({ ...resultado, dados: item.dados, mesclado: item.conflitos > 0 }));
+            } else if (resultado.status === 'conflito' && item.conflitos < MAX_CONFLITOS) {
+                const base = bases.get(docId)?.dados;
+                bases.set(docId, { versao: resultado.versao, dados: resultado.dados || {} });
+                reenfileirar(docId, {
+                    ...item,
+                    dados: mesclarAnotacoes(base, resultado.dados, item.dados),
+                    conflitos: item.conflitos + 1,
+                });
+            } else {
+                item.ouvintes.forEach(({ reject }) => reject(resultado));
+            }
+        });
+    } catch (err) {
+        // Nada do lote foi gravado: volta para a fila (junto com edições mais novas)
+        // em vez de descartar; desiste após MAX_FALHAS ou em erro que não muda ao repetir
+        lote.forEach((item, docId) => {
+            if (vaiRepetir(err) && item.falhas < MAX_FALHAS) {
+                reenfileirar(docId, { ...item, falhas: item.falhas + 1 });
+            } else {
+                item.ouvintes.forEach(({ reject }) => reject(err));
+            }
+        });
+    } finally {
+        emAndamento = false;
+        if (sujos.size) {
+            const falhas = Math.max(...[...sujos.values()].map(item => item.falhas));
+            agendarEnvio(falhas ? Math.min(MAX_ESPERA_MS, ATRASO_MS * 2 ** falhas) : ATRASO_MS);
+        }
+    }
+};
+
+// Marca o livro como alterado com o estado completo das anotações. A promessa resolve
+// quando o servidor aceita; `dados` traz o resultado final (mesclado, se houve conflito).
+export const agendarSync = (docId, dados) => new Promise((resolve, reject) => {
+    const chave = String(docId);
+    const item = sujos.get(chave) || { ouvintes: [], conflitos: 0, falhas: 0 };
+    // Se o pendente já foi mesclado com o servidor, aplica sobre ele só o que mudou na tela
+    item.dados = item.dados !== undefined && item.dados !== item.local ? mesclarAnotacoes(item.local, item.dados, dados) : dados;
+    item.local = dados;
+    item.ouvintes.push({ resolve, reject });
+    sujos.set(chave, item);
+    agendarEnvio();
+});
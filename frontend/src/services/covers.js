@@ -0,0 +1,48 @@
+import api from './api';
+
+// Capas do grid em lote: uma chamada a /documents/covers por página em vez de uma por card.
+// A resposta é NDJSON (uma linha por livro, imagem em base64); o resultado fica em memória
+// como data URL (null = livro sem capa, para mostrar o fallback sem nova tentativa).
+// O cache é um LRU por (versão do catálogo, id): capa regerada muda a versão e é buscada de novo.
+const capas = new Map();
+const MAX_IDS = 100;
+const MAX_CAPAS = 500;
+
+const chave = (versao, id) => `${versao}|${id}`;
+
+const guardar = (versao, id, url) => {
+    const k = chave(versao, id);
+    capas.delete(k);
+    capas.set(k, url);
+    while (capas.size > MAX_CAPAS) capas.delete(capas.keys().next().value);
+};
+
+// `versao` identifica o catálogo carregado (ETag de /documents)
+export const carregarCapas = async (ids, versao = '') => {
+    const resultado = new Map();
+    const faltando = [];
+    [...new Set(ids)].forEach((id) => {
+        const k = chave(versao, id);
+        if (capas.has(k)) {
+            resultado.set(id, capas.get(k));
+            guardar(versao, id, capas.get(k));  // mais recente no LRU
+        } else {
+            faltando.push(id);
+        }
+    });
+
+    for (let inicio = 0; inicio < faltando.length; inicio += MAX_IDS) {
+        const lote = faltando.slice(inicio, inicio + MAX_IDS);
+        const response = await api.get('/documents/covers', {
+            params: { ids: lote.join(',') },
+            responseType: 'text',
+        });
+        response.data.split('\n').filter(Boolean).forEach((linha) => {
+            const item = JSON.parse(linha);
+            const url = item.hash ? `data:${item.tipo};base64,${item.dados}` : null;
+            guardar(versao, item.id, url);
+            resultado.set(item.id, url);
+        });
+    }
+    return new Map(ids.map(id => [id, resultado.get(id)]));
+};
@@ -0,0 +1,93 @@
+// Decodificador de BlurHash (https://blurha.sh) para os placeholders das capas.
+// O catálogo traz `capa_blurhash` (gerado em backend/lqip.py); aqui vira uma imagem
+// minúscula (data URL) usada como fundo do card até a capa real carregar.
+const ALFABETO = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~';
+const LARGURA = 16;
+const ALTURA = 24;
+
+const decode83 = (texto) => [...texto].reduce((valor, c) => valor * 83 + ALFABETO.indexOf(c), 0);
+
+const srgbParaLinear = (valor) => {
+    const v = valor / 255;
+    return v <= 0.04045 ? v / 12.92 : Math.pow((v + 0.055) / 1.055, 2.4);
+};
+
+const linearParaSrgb = (valor) => {
+    const v = Math.max(0, Math.min(1, valor));
+    return v <= 0.0031308 ? Math.round(v * 12.92 * 255) : Math.round((1.055 * Math.pow(v, 1 / 2.4) - 0.055) * 255);
+};
+
+const potenciaComSinal = (valor, expoente) => Math.sign(valor) * Math.pow(Math.abs(valor), expoente);
+
+const decodificar = (hash, largura, altura) => {
+    const tamanho = decode83(hash[0]);
+    const componentesX = (tamanho % 9) + 1;
+    const componentesY = Math.floor(tamanho / 9) + 1;
+    if (hash.length !== 4 + 2 * componentesX * componentesY) return null;
+
+    const maximo = (decode83(hash[1]) + 1) / 166;
+    const cores = [];
+    const dc = decode83(hash.slice(2, 6));
+    cores.push([srgbParaLinear(dc >> 16), srgbParaLinear((dc >> 8) & 255), srgbParaLinear(dc & 255)]);
+    for (let i = 1; i < componentesX * componentesY; i++) {
+        const ac = decode83(hash.slice(4 + i * 2, 6 + i * 2));
+        cores.push([
+            potenciaComSinal((Math.floor(ac / (19 * 19)) - 9) / 9, 2) * maximo,
+            potenciaComSinal(((Math.floor(ac / 19) % 19) - 9) / 9, 2) * maximo,
+            potenciaComSinal(((ac % 19) - 9) / 9, 2) * maximo,
+        ]);
+    }
+
+    const pixels = new Uint8ClampedArray(largura * altura * 4);
+    for (let y = 0; y < altura; y++) {
+        for (let x = 0; x < largura; x++) {
+            let r = 0, g = 0, b = 0;
+            for (let j = 0; j < componentesY; j++) {
+                for (let i = 0; i < componentesX; i++) {
+                    const base = Math.cos((Math.PI * x * i) / largura) * Math.cos((Math.PI * y * j) / altura);
+                    const cor = cores[i + j * componentesX];
+                    r += cor[0] * base;
+                    g += cor[1] * base;
+                    b += cor[2] * base;
+                }
+            }
+            const p = 4 * (x + y * largura);
+            pixels[p] = linearParaSrgb(r);
+            pixels[p + 1] = linearParaSrgb(g);
+            pixels[p + 2] = linearParaSrgb(b);
+            pixels[p + 3] = 255;
+        }
+    }
+    return pixels;
+};
+
+const cache = new Map();
+
+// Data URL do placeholder (memorizado por hash); null se o hash for inválido ou vazio
+export const blurhashParaDataURL = (hash) => {
+    if (!hash || hash.length < 6) return null;
+    if (cache.has(hash)) return cache.get(hash);
+
+    let url = null;
+    try {
+        const pixels = decodificar(hash, LARGURA, ALTURA);
+        if (pixels) {
+            const canvas = document.createElement('canvas');
+            canvas.width = LARGURA;
+            canvas.height = ALTURA;
+            const contexto = canvas.getContext('2d');
+            contexto.putImageData(new ImageData(pixels, LARGURA, ALTURA), 0, 0);
+            url = canvas.toDataURL();
+        }
+    } catch (err) {
+        console.error('BlurHash inválido', err);
+    }
+    cache.set(hash, url);
+    return url;
+};
+
+// Estilo de fundo para o container da capa
+export const estiloPlaceholder = (hash) => {
+    const url = blurhashParaDataURL(hash);
+    return url ? { backgroundImage: `url(${url})`, backgroundSize: 'cover', backgroundPosition: 'center' } : undefined;
+};